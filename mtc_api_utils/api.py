@@ -4,28 +4,25 @@
 from __future__ import annotations
 
 import inspect
+from datetime import timedelta
 from enum import Enum
 from http import HTTPStatus
 from typing import Callable, Type, Tuple, Union, Awaitable, TypeVar, Optional, AsyncContextManager
 
 from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.openapi.models import Response
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.cors import CORSMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Scope, Receive, Send
 
 from mtc_api_utils.api_types import ApiStatus, StandardTags
 from mtc_api_utils.config import Config
+from mtc_api_utils.readiness import ReadinessState, IsReady, IsReadyAsync
 
 service_unavailable_exception = HTTPException(
     status_code=HTTPStatus.SERVICE_UNAVAILABLE,
     detail="The api is currently not ready to accept requests. It may still be initializing",
 )
 
-IsReady = Callable[[], bool]
-IsReadyAsync = Callable[[], Awaitable[bool]]
-
 Res = TypeVar("Res")
 SyncFunc = Callable[..., Res]
 AsyncFunc = Callable[..., Awaitable[Res]]
@@ -49,7 +46,7 @@ class DefaultRoute(Enum):
 class BaseApi(FastAPI):
     def __init__(
             self,
-            is_ready: Union[IsReady, IsReadyAsync],
+            is_ready: Union[IsReady, IsReadyAsync, ReadinessState],
             config: Type[Config],
             index_message: str = "Welcome to the MTC Api",
             liveness_message: str = "liveness check: [ok]",
@@ -57,14 +54,16 @@ class BaseApi(FastAPI):
             tags: Tuple[str] = (StandardTags.demo.value,),
             lifespan: Optional[Callable[[BaseApi], AsyncContextManager]] = None,
             global_readiness_middleware_enabled: bool = True,
+            readiness_cache_ttl: Optional[timedelta] = None,
     ):
         """
             Parameters:
-                * is_ready: Accepts either a function or coroutine which return whether the service is ready to accept requests or not.
+                * is_ready: Accepts either a function or coroutine which return whether the service is ready to accept requests or not. Alternatively, accepts a ReadinessState, e.g. MLBaseModel.readiness, which is updated by the model once it is initialized.
                 * config: The Config object. This is used to configure various variables such as CORS & GPU settings
                 * tags: Returned as part of the /status call in order to determine the kind of service that is responding, e.g. demo/dashboard, etc.
                 * lifespan: The lifespan callback that is executed before starting / after stopping the api server.
                 * global_readiness_middleware_enabled: If true, evaluates the is_ready function before accepting any request to routes defined in the app. Base Operation calls such as /liveness, /readiness & /status are excepted. Set to false if more granular control is required and add the ReadinessMiddleware to each route/router/subapp manually.
+                * readiness_cache_ttl: How long the result of the is_ready function is cached. Defaults to config.readiness_cache_ttl_seconds.
 
         """
         super().__init__(
@@ -74,7 +73,14 @@ class BaseApi(FastAPI):
             lifespan=lifespan,
         )
 
-        self._is_ready = is_ready
+        if isinstance(is_ready, ReadinessState):
+            self.readiness = is_ready
+        else:
+            if readiness_cache_ttl is None:
+                readiness_cache_ttl = timedelta(seconds=config.readiness_cache_ttl_seconds)
+
+            self.readiness = ReadinessState(probe=is_ready, ttl=readiness_cache_ttl)
+
         self.config = config
 
         self.index_message = index_message
@@ -105,11 +111,21 @@ class BaseApi(FastAPI):
             return func()
 
     async def is_ready(self) -> bool:
-        return await self.maybe_await(self._is_ready)
+        return await self.readiness.is_ready()
+
+    def mark_ready(self) -> None:
+        self.readiness.mark_ready()
+
+    def mark_not_ready(self) -> None:
+        self.readiness.mark_not_ready()
 
     @property
     async def readiness_message(self):
-        return f"Service readiness: [{await self.is_ready()}]"
+        return self._readiness_message(await self.is_ready())
+
+    @staticmethod
+    def _readiness_message(is_ready: bool) -> str:
+        return f"Service readiness: [{is_ready}]"
 
     def create_base_router(self):
         base_router = APIRouter(tags=["Base Operations"])
@@ -124,8 +140,9 @@ class BaseApi(FastAPI):
 
         @base_router.get(path=DefaultRoute.readiness.value)
         async def readiness() -> str:
-            if await self.is_ready():
-                return await self.readiness_message
+            is_ready = await self.is_ready()
+            if is_ready:
+                return self._readiness_message(is_ready)
             else:
                 raise HTTPException(
                     detail="Service is not yet ready",
@@ -148,24 +165,35 @@ class BaseApi(FastAPI):
             raise service_unavailable_exception
 
 
-class ReadinessMiddleware(BaseHTTPMiddleware):
+class ReadinessMiddleware:
+    """
+    Pure ASGI middleware which answers with 503 SERVICE UNAVAILABLE until the api is ready. Default routes such as /liveness, /readiness & /status are always
+    passed through. Unlike a BaseHTTPMiddleware, this does not wrap the downstream app in a separate task or re-stream response bodies, so streaming responses
+    and background tasks are unaffected.
+    """
+
+    _default_route_prefixes = tuple(route.value for route in DefaultRoute)
 
     def __init__(self, app: ASGIApp, base_api: BaseApi):
-        super().__init__(app)
+        self.app = app
         self.base_api = base_api
 
-    async def dispatch(self, request, call_next) -> Union[Response, JSONResponse]:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # If route is default route or api is ready, perform call
-        if any([request.url.path.startswith(route.value) for route in DefaultRoute]) or await self.base_api.is_ready():
-            return await call_next(request)
+        if scope["path"].startswith(self._default_route_prefixes) or await self.base_api.is_ready():
+            await self.app(scope, receive, send)
 
-        # If route is demo specific and model is not ready, raise error
+        # If route is demo specific and model is not ready, return error
         else:
-            if not await self.base_api.is_ready():
-                return JSONResponse(
-                    content=service_unavailable_exception.detail,
-                    status_code=service_unavailable_exception.status_code,
-                )
+            response = JSONResponse(
+                content=service_unavailable_exception.detail,
+                status_code=service_unavailable_exception.status_code,
+            )
+            await response(scope, receive, send)
 
     async def raise_if_not_ready(self) -> None:
         if not await self.base_api.is_ready():
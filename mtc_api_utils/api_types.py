@@ -53,6 +53,45 @@ class ApiStatus(ApiType):
     )
 
 
+class ServiceStatus(ApiType):
+    name: str = Field(description="The name of the service within its ServiceGroup")
+    backend_url: str = Field(description="The backend url of the service")
+    is_live: bool = Field(default=False, description="True if the service responded to the last probe")
+    is_ready: bool = Field(default=False, description="True if the service reported to be ready in the last probe")
+    latency_ms: Optional[float] = Field(default=None, description="The duration of the last probe")
+    num_probes: int = Field(default=0, description="The number of probes sent to the service")
+
+
+class ServiceGroupStatus(ApiType):
+    services: Dict[str, ServiceStatus] = Field(description="Maps service names to their latest status")
+
+    @property
+    def num_ready(self) -> int:
+        return sum(status.is_ready for status in self.services.values())
+
+    @property
+    def not_ready(self) -> List[str]:
+        return [name for name, status in self.services.items() if not status.is_ready]
+
+
+class BatchingMetrics(ApiType):
+    num_batches: int = Field(default=0, description="Number of batches that have been processed")
+    num_items: int = Field(default=0, description="Number of items that have been processed across all batches")
+    max_batch_size: int = Field(default=0, description="Largest batch that has been processed")
+    mean_batch_size: float = Field(default=0, description="Average number of items per batch")
+    mean_queue_wait_ms: float = Field(default=0, description="Average time an item waited in the queue before its batch was started")
+    max_queue_wait_ms: float = Field(default=0, description="Longest time an item waited in the queue before its batch was started")
+    batch_size_histogram: Dict[int, int] = Field(default={}, description="Maps each batch size to the number of batches processed with that size")
+
+
+class ResponseCacheMetrics(ApiType):
+    hits: int = Field(default=0, description="Number of requests answered from the cache")
+    misses: int = Field(default=0, description="Number of requests which ran the endpoint")
+    coalesced: int = Field(default=0, description="Number of requests which awaited an identical request already running the endpoint")
+    num_entries: int = Field(default=0, description="Number of cached responses")
+    num_bytes: int = Field(default=0, description="Total size of the cached responses, serialized as JSON")
+
+
 class ApiRoute(ApiType):
     name: str
     path: str
@@ -111,3 +150,10 @@ class FirebaseUser(ApiType):
 
 class FirebaseUserList(ApiType):
     users: List[FirebaseUser]
+
+
+class BulkUserResult(ApiType):
+    uid: Optional[str] = Field(default=None, description="The Firebase user ID")
+    email: Optional[str] = Field(default=None, example="mail@inf.ethz.ch", description="The user email, if known")
+    success: bool = Field(description="Whether the operation succeeded for this user")
+    error: Optional[str] = Field(default=None, description="The reason why the operation failed for this user")
@@ -0,0 +1,253 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+A content addressed, node local cache for artifacts downloaded by init_api. Several APIs running on the same node can share one cache directory, e.g. a
+hostPath volume, in order to keep a single copy of commonly used models. Artifacts are materialized into each service's download_dir using hard links for
+files and symlinks for directories.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from os import path
+from typing import Dict, List, NamedTuple, Optional, Iterator
+
+
+class CacheEntry(NamedTuple):
+    key: str
+    url: str
+    version: Optional[str]
+    object_path: str
+    size_bytes: int
+    last_access: float
+    links: List[str] = []
+
+
+class ArtifactCache:
+    """
+    Stores artifacts keyed by their url and version (ETag, Last-Modified or checksum) and evicts the least recently used entries once the total size exceeds
+    max_size_bytes. Entries are recorded in a manifest file in cache_dir, which is protected by a file lock so that several processes can share the cache.
+
+    Example usage:
+        cache = ArtifactCache(cache_dir="/var/cache/mtc-artifacts", max_size_bytes=50 * 2 ** 30)
+        model_path = download_if_not_exists(artifact_url, download_dir="/models", polybox_auth=auth, cache=cache)
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+
+        self.objects_dir = path.join(cache_dir, "objects")
+        self.manifest_path = path.join(cache_dir, "manifest.json")
+        self._lock_path = path.join(cache_dir, ".lock")
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    @staticmethod
+    def cache_key(url: str, version: Optional[str]) -> str:
+        return hashlib.sha256(f"{url}\n{version or ''}".encode("utf-8")).hexdigest()
+
+    def object_dir(self, key: str) -> str:
+        """ The directory in which the artifact with the given key is stored """
+        return path.join(self.objects_dir, key)
+
+    @contextmanager
+    def lock_key(self, key: str) -> Iterator[None]:
+        """ Holds an exclusive lock on a single key, e.g. while downloading it, without blocking access to other entries """
+        with self._file_lock(path.join(self.objects_dir, f"{key}.lock")):
+            yield
+
+    @property
+    def entries(self) -> Dict[str, CacheEntry]:
+        with self._file_lock(self._lock_path):
+            return self._load_manifest()
+
+    @property
+    def total_size_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self.entries.values())
+
+    def lookup(self, key: str) -> Optional[str]:
+        """ Returns the object path of a cached artifact and marks it as recently used, or None if the artifact is not cached """
+        with self._file_lock(self._lock_path):
+            entries = self._load_manifest()
+            entry = entries.get(key)
+
+            if entry is None:
+                return None
+
+            if not path.exists(entry.object_path):
+                del entries[key]
+                self._save_manifest(entries)
+                return None
+
+            entries[key] = entry._replace(last_access=time.time())
+            self._save_manifest(entries)
+
+            return entry.object_path
+
+    def add(self, key: str, url: str, version: Optional[str], object_path: str) -> CacheEntry:
+        """ Records an artifact which has been stored at object_path inside object_dir(key) and evicts old entries if the cache is full """
+        entry = CacheEntry(
+            key=key,
+            url=url,
+            version=version,
+            object_path=object_path,
+            size_bytes=self._size_on_disk(object_path),
+            last_access=time.time(),
+            links=[],
+        )
+
+        with self._file_lock(self._lock_path):
+            entries = self._load_manifest()
+            entries[key] = entry
+            self._evict(entries, keep_key=key)
+            self._save_manifest(entries)
+
+        return entry
+
+    def materialize(self, key: str, target_path: str) -> str:
+        """
+        Makes a cached artifact available at target_path. Files are hard linked, falling back to a symlink across file systems, directories are symlinked.
+        Any existing file, link or directory at target_path is replaced. Hold lock_key(key) from lookup until materialize returns, such that the artifact is
+        not evicted in between. Raises a FileNotFoundError if the artifact is not cached.
+        """
+        with self._file_lock(self._lock_path):
+            entries = self._load_manifest()
+            entry = entries.get(key)
+
+            if entry is None or not path.exists(entry.object_path):
+                raise FileNotFoundError(f"Artifact {key} is not cached in {self.cache_dir}")
+
+            if not self._links_to(target_path, entry.object_path):
+                self._remove(target_path)
+                os.makedirs(path.dirname(path.abspath(target_path)), exist_ok=True)
+
+                if path.isdir(entry.object_path):
+                    os.symlink(entry.object_path, target_path, target_is_directory=True)
+                else:
+                    try:
+                        os.link(entry.object_path, target_path)
+                    except OSError:
+                        os.symlink(entry.object_path, target_path)
+
+            links = [link for link in entry.links if link != target_path] + [target_path]
+            entries[key] = entry._replace(links=links, last_access=time.time())
+            self._save_manifest(entries)
+
+        return target_path
+
+    def evict(self) -> List[str]:
+        """ Evicts least recently used entries until the cache fits into max_size_bytes. Returns the keys of evicted entries """
+        with self._file_lock(self._lock_path):
+            entries = self._load_manifest()
+            evicted = self._evict(entries)
+            self._save_manifest(entries)
+
+        return evicted
+
+    def _evict(self, entries: Dict[str, CacheEntry], keep_key: Optional[str] = None) -> List[str]:
+        if self.max_size_bytes is None:
+            return []
+
+        total_size = sum(entry.size_bytes for entry in entries.values())
+        evicted = []
+
+        for entry in sorted(entries.values(), key=lambda e: e.last_access):
+            if total_size <= self.max_size_bytes:
+                break
+
+            # Symlinked entries are still in use, whereas hard linked files remain available to their services after eviction
+            if entry.key == keep_key or self._is_symlinked(entry):
+                continue
+
+            # Entries whose key is locked are being looked up, downloaded or materialized by another caller
+            with self._try_file_lock(path.join(self.objects_dir, f"{entry.key}.lock")) as locked:
+                if not locked:
+                    continue
+
+                print(f"Evicting cached artifact {entry.url} ({entry.size_bytes} bytes)")
+                shutil.rmtree(self.object_dir(entry.key), ignore_errors=True)
+
+            del entries[entry.key]
+            total_size -= entry.size_bytes
+            evicted.append(entry.key)
+
+        return evicted
+
+    @staticmethod
+    def _is_symlinked(entry: CacheEntry) -> bool:
+        return any(path.islink(link) and path.realpath(link) == path.realpath(entry.object_path) for link in entry.links)
+
+    @staticmethod
+    def _links_to(target_path: str, object_path: str) -> bool:
+        if path.islink(target_path):
+            return path.realpath(target_path) == path.realpath(object_path)
+
+        return path.isfile(target_path) and path.samefile(target_path, object_path)
+
+    @staticmethod
+    def _remove(target_path: str) -> None:
+        if path.islink(target_path) or path.isfile(target_path):
+            os.remove(target_path)
+        elif path.isdir(target_path):
+            shutil.rmtree(target_path)
+
+    @staticmethod
+    def _size_on_disk(object_path: str) -> int:
+        if path.isfile(object_path):
+            return path.getsize(object_path)
+
+        return sum(
+            path.getsize(path.join(dir_path, file_name))
+            for dir_path, _, file_names in os.walk(object_path)
+            for file_name in file_names
+        )
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(lock_path: str) -> Iterator[None]:
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    @contextmanager
+    def _try_file_lock(lock_path: str) -> Iterator[bool]:
+        """ Acquires the lock without blocking, yielding whether it was acquired """
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_manifest(self) -> Dict[str, CacheEntry]:
+        try:
+            with open(self.manifest_path, "r") as manifest_file:
+                return {key: CacheEntry(**entry) for key, entry in json.load(manifest_file).items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError) as e:
+            print(f"Artifact cache manifest {self.manifest_path} is corrupt and will be reset: {e}")
+            return {}
+
+    def _save_manifest(self, entries: Dict[str, CacheEntry]) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as manifest_file:
+            json.dump({key: entry._asdict() for key, entry in entries.items()}, manifest_file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
@@ -5,14 +5,64 @@ import warnings
 from abc import ABC, abstractmethod
 from threading import Thread
 from time import sleep
+from typing import List, Any, Optional, Type
+
+from mtc_api_utils.batching import MicroBatcher
+from mtc_api_utils.executor import InferenceExecutor
+from mtc_api_utils.readiness import ReadinessState
+
+# Per worker process state of process based executors, set by _init_worker
+_worker_model: Optional["MLBaseModel"] = None
+
+
+def _init_worker(model_cls: Type["MLBaseModel"]) -> None:
+    global _worker_model
+    model = model_cls.__new__(model_cls)
+    model.init_model()
+    _worker_model = model
+
+
+def _worker_inference(*args, **kwargs) -> Any:
+    return _worker_model.inference(*args, **kwargs)
+
+
+def _worker_batch_inference(batch: list) -> list:
+    return _worker_model.batch_inference(batch)
 
 
 class MLBaseModel(ABC):
-    def __init__(self):
+    """
+    Base class for models served by a BaseApi. init_model() is called asynchronously on construction, inference() is run on a dedicated executor.
+
+    Models cannot be sent to worker processes. If the executor uses processes, each worker therefore creates its own instance of the model once, without calling
+    __init__(), and calls init_model() on it. init_model() has to set all attributes required by inference(). Use a SharedWeightsModel in order to avoid loading
+    one copy of the weights per worker process.
+    """
+
+    batcher: Optional[MicroBatcher] = None
+
+    def __init__(self, executor: Optional[InferenceExecutor] = None):
+        # Dedicated, bounded executor for inference calls, see run_inference()
+        self.executor = executor if executor is not None else InferenceExecutor()
+
+        if self.executor.use_processes:
+            if self.executor.initializer is not None:
+                raise ValueError("Process based executors of a model are initialized by the model itself and must not define an initializer")
+
+            self.executor.initializer = _init_worker
+            self.executor.initargs = (type(self),)
+
+        # Push based readiness state which can be passed to BaseApi(is_ready=model.readiness) in order to avoid probing the model on every request
+        self.readiness = ReadinessState()
+
         print("Initializing model asynchronously")
-        self.init_thread = Thread(target=self.init_model)
+        self.init_thread = Thread(target=self._init_model_and_mark_ready)
         self.init_thread.start()
 
+    def _init_model_and_mark_ready(self):
+        self.init_model()
+        self.readiness.mark_ready()
+
     def __wait_until_ready__(self):
         """Only use this method for testing as it negates the benefits of having an asynchronous initialization"""
         warnings.warn("Waiting for model to be ready. Only use this method for testing as it negates the benefits of having an asynchronous initialization")
@@ -30,3 +80,28 @@ class MLBaseModel(ABC):
     @abstractmethod
     def inference(self, *args, **kwargs):
         raise NotImplemented
+
+    async def run_inference(self, *args, **kwargs) -> Any:
+        """
+        Runs inference() on the model's dedicated executor instead of Starlette's shared threadpool. Use this from async routes.
+        Raises a 503 HTTPException with a Retry-After header if the executor's queue is full.
+        """
+        inference = _worker_inference if self.executor.use_processes else self.inference
+        return await self.executor.run(inference, *args, **kwargs)
+
+    def batch_inference(self, batch: List[Any]) -> List[Any]:
+        """ Performs inference on a batch of inputs and returns one result per input. Override this method with a vectorized implementation to benefit from batching """
+        return [self.inference(item) for item in batch]
+
+    def enable_batching(self, max_batch_size: int = 32, max_wait_ms: float = 5.0) -> MicroBatcher:
+        """ Opt in to dynamic micro-batching: Concurrent calls to batched_inference() are collected and passed to batch_inference() together """
+        batch_fn = _worker_batch_inference if self.executor.use_processes else self.batch_inference
+        self.batcher = MicroBatcher(batch_fn=batch_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, executor=self.executor)
+        return self.batcher
+
+    async def batched_inference(self, item: Any) -> Any:
+        """ Adds an input to the next batch and returns its result once the batch has been processed. Requires enable_batching() to be called beforehand """
+        if self.batcher is None:
+            raise RuntimeError("Batching is not enabled for this model. Call enable_batching() first")
+
+        return await self.batcher.submit(item)
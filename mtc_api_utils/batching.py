@@ -0,0 +1,160 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, TypeVar, Generic, Optional, Tuple, Union, Awaitable
+
+from mtc_api_utils.api_types import BatchingMetrics
+from mtc_api_utils.executor import InferenceExecutor
+
+In = TypeVar("In")
+Out = TypeVar("Out")
+
+BatchFunc = Callable[[List[In]], List[Out]]
+AsyncBatchFunc = Callable[[List[In]], Awaitable[List[Out]]]
+
+
+class MicroBatcher(Generic[In, Out]):
+    """
+    Collects concurrent inference calls into batches and scatters the batch results back to the awaiting callers.
+
+    A batch is flushed as soon as it contains max_batch_size items or once the oldest item has waited for max_wait_ms. Only one batch is processed at a time,
+    items submitted while a batch is running are collected into the next batch. Synchronous batch functions are executed on the given InferenceExecutor or on
+    a dedicated worker thread, so that inference does not block the event loop.
+
+    Example usage:
+        batcher = MicroBatcher(batch_fn=model.batch_inference, max_batch_size=32, max_wait_ms=5)
+
+        @api.post("/api/inference")
+        async def inference(body: InferenceRequest):
+            return await batcher.submit(body.text)
+    """
+
+    def __init__(
+            self,
+            batch_fn: Union[BatchFunc, AsyncBatchFunc],
+            max_batch_size: int = 32,
+            max_wait_ms: float = 5.0,
+            executor: Optional[InferenceExecutor] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+
+        self.executor = executor
+        self._thread: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[In, asyncio.Future, float]] = []
+        self._batch_full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self._metrics = BatchingMetrics()
+        self._total_queue_wait_seconds = 0.0
+
+    @property
+    def metrics(self) -> BatchingMetrics:
+        return self._metrics.copy(deep=True)
+
+    def reset_metrics(self) -> None:
+        self._metrics = BatchingMetrics()
+        self._total_queue_wait_seconds = 0.0
+
+    async def submit(self, item: In) -> Out:
+        """ Adds an item to the next batch and returns its result once the batch has been processed """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._bind_to_loop(loop)
+
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._process_batches())
+
+        return await future
+
+    def _bind_to_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._pending and self._loop is not None and not self._loop.is_closed():
+            raise RuntimeError("MicroBatcher cannot be shared across event loops while items are pending")
+
+        self._loop = loop
+        self._pending = []
+        self._batch_full = asyncio.Event()
+        self._worker = None
+
+    async def _process_batches(self) -> None:
+        while self._pending:
+            oldest_enqueued_at = self._pending[0][2]
+            remaining_wait = self.max_wait_seconds - (time.perf_counter() - oldest_enqueued_at)
+
+            if len(self._pending) < self.max_batch_size and remaining_wait > 0:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=remaining_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if len(self._pending) < self.max_batch_size:
+                self._batch_full.clear()
+
+            # Skip items whose callers have been cancelled in the meantime
+            batch = [(item, future, enqueued_at) for item, future, enqueued_at in batch if not future.done()]
+            if batch:
+                await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[Tuple[In, asyncio.Future, float]]) -> None:
+        started_at = time.perf_counter()
+        self._record_metrics(batch_size=len(batch), queue_waits=[started_at - enqueued_at for _, _, enqueued_at in batch])
+
+        items = [item for item, _, _ in batch]
+        try:
+            results = await self._call_batch_fn(items)
+
+            if len(results) != len(items):
+                raise ValueError(f"batch_fn returned {len(results)} results for a batch of {len(items)} items")
+
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _call_batch_fn(self, items: List[In]) -> List[Out]:
+        if inspect.iscoroutinefunction(self.batch_fn):
+            return await self.batch_fn(items)
+
+        if self.executor is not None:
+            return await self.executor.run(self.batch_fn, items)
+
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batcher")
+
+        return await asyncio.get_running_loop().run_in_executor(self._thread, self.batch_fn, items)
+
+    def _record_metrics(self, batch_size: int, queue_waits: List[float]) -> None:
+        metrics = self._metrics
+        metrics.num_batches += 1
+        metrics.num_items += batch_size
+        metrics.max_batch_size = max(metrics.max_batch_size, batch_size)
+        metrics.mean_batch_size = metrics.num_items / metrics.num_batches
+        metrics.batch_size_histogram[batch_size] = metrics.batch_size_histogram.get(batch_size, 0) + 1
+
+        self._total_queue_wait_seconds += sum(queue_waits)
+        metrics.mean_queue_wait_ms = self._total_queue_wait_seconds / metrics.num_items * 1000
+        metrics.max_queue_wait_ms = max(metrics.max_queue_wait_ms, max(queue_waits) * 1000)
@@ -1,18 +1,26 @@
 #  SPDX-License-Identifier: Apache-2.0
 #  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
 import asyncio
+import functools
 import time
 from asyncio import sleep
 from datetime import datetime, timedelta
 from enum import Enum
 from http import HTTPStatus
-from typing import Tuple, Optional, List, Dict
+from typing import Any, Tuple, Optional, List, Dict, Callable, Awaitable
 
 import httpx
 from fastapi import HTTPException
 from httpx import Client, Response, AsyncClient
 
 from mtc_api_utils.api_types import ApiStatus
+from mtc_api_utils.clients.backoff import ExponentialBackoff
+from mtc_api_utils.clients.hedging import Hedger, HedgingPolicy, rewrite_url
+from mtc_api_utils.clients.http_cache import BODY_KWARGS, HttpCache, request_url
+from mtc_api_utils.clients.http_pool import HttpClientPool, default_client_pool
+from mtc_api_utils.clients.load_balancing import ReplicaSet
+from mtc_api_utils.clients.parallel import ParallelRequester, ParallelResults, RequestSpec
+from mtc_api_utils.clients.resilience import CircuitBreaker, CircuitBreakerRegistry, RetryPolicy
 
 
 class ContentType(Enum):
@@ -28,16 +36,244 @@ class ApiBaseRoutes(Enum):
 
 
 class ApiClient:
-    def __init__(self, backend_url: str, base_route_timeout_seconds: int = 2, http_client=Client(), async_client=AsyncClient()):
+    """
+    Unless http_client or async_client are passed, requests are sent using the clients of client_pool, which are shared by all ApiClients calling the same
+    backend and keep their connections alive.
+
+    Endpoints of subclasses should send their requests using request() or request_async(), which apply retry_policy and the backend's circuit breaker from
+    circuit_breakers. Both are disabled by default. The base route probes bypass them, since they are used to determine whether a backend is available.
+
+    If the backend is deployed as several replicas, pass their urls as replica_urls and a HedgingPolicy as hedging in order to hedge idempotent requests sent
+    using request_async to urls starting with backend_url: a slow request is duplicated to another replica and the first response is used. Pass a ReplicaSet
+    as replica_set instead of replica_urls in order to balance these requests across the replicas based on their load.
+
+    Pass an HttpCache as http_cache in order to cache the responses to GET requests sent using request(), request_async() and parallel_get().
+    """
+
+    def __init__(
+            self,
+            backend_url: str,
+            base_route_timeout_seconds: int = 2,
+            http_client: Optional[Client] = None,
+            async_client: Optional[AsyncClient] = None,
+            client_pool: HttpClientPool = default_client_pool,
+            retry_policy: Optional[RetryPolicy] = None,
+            circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+            replica_urls: Optional[List[str]] = None,
+            hedging: Optional[HedgingPolicy] = None,
+            replica_set: Optional[ReplicaSet] = None,
+            http_cache: Optional[HttpCache] = None,
+    ):
         self._backend_url = backend_url
         self._base_route_timeout_seconds = base_route_timeout_seconds
-        self.http_client = http_client
-        self.async_client = async_client
+        self._http_client = http_client
+        self._async_client = async_client
+        self.client_pool = client_pool
+        self.retry_policy = retry_policy
+        self.circuit_breakers = circuit_breakers
+        self.http_cache = http_cache
+        self.replica_set = replica_set
+        if replica_set is not None:
+            self.replica_urls = replica_set.urls
+        else:
+            self.replica_urls = list(replica_urls) if replica_urls else [backend_url]
+        self.hedger = Hedger(replica_urls=self.replica_urls, policy=hedging, replica_set=replica_set) if hedging is not None else None
 
         self._liveness_route = backend_url + ApiBaseRoutes.liveness.value
         self._readiness_route = backend_url + ApiBaseRoutes.readiness.value
         self._status_route = backend_url + ApiBaseRoutes.status.value
 
+    @property
+    def backend_url(self) -> str:
+        return self._backend_url
+
+    @property
+    def base_route_timeout_seconds(self) -> float:
+        return self._base_route_timeout_seconds
+
+    @property
+    def http_client(self) -> Client:
+        if self._http_client is not None:
+            return self._http_client
+
+        return self.client_pool.client(self._backend_url)
+
+    @http_client.setter
+    def http_client(self, http_client: Optional[Client]) -> None:
+        """ Overrides the pooled client. Set to None in order to use client_pool again """
+        self._http_client = http_client
+
+    @property
+    def async_client(self) -> AsyncClient:
+        """ The async client of the running event loop. Outside of an event loop, a new client is returned, see HttpClientPool.async_client """
+        if self._async_client is not None:
+            return self._async_client
+
+        return self.client_pool.async_client(self._backend_url)
+
+    @async_client.setter
+    def async_client(self, async_client: Optional[AsyncClient]) -> None:
+        """ Overrides the pooled client. Set to None in order to use client_pool again """
+        self._async_client = async_client
+
+    def replica_http_client(self, replica_url: str) -> Client:
+        if self._http_client is not None:
+            return self._http_client
+
+        return self.client_pool.client(replica_url)
+
+    def replica_async_client(self, replica_url: str) -> AsyncClient:
+        if self._async_client is not None:
+            return self._async_client
+
+        return self.client_pool.async_client(replica_url)
+
+    @property
+    def circuit_breaker(self) -> Optional[CircuitBreaker]:
+        if self.circuit_breakers is None:
+            return None
+
+        return self.circuit_breakers.breaker(self._backend_url)
+
+    def _send(self, method: str, url: str, **kwargs) -> Response:
+        if self.replica_set is None or not url.startswith(self._backend_url):
+            return self.http_client.request(method=method, url=url, **kwargs)
+
+        return self.replica_set.send(
+            lambda replica_url: self.replica_http_client(replica_url).request(method=method, url=rewrite_url(url, self._backend_url, replica_url), **kwargs)
+        )
+
+    async def _send_async(self, method: str, url: str, idempotent: Optional[bool], **kwargs) -> Response:
+        if not url.startswith(self._backend_url) or (self.hedger is None and self.replica_set is None):
+            return await self.async_client.request(method=method, url=url, **kwargs)
+
+        def send(replica_url: str) -> Awaitable[Response]:
+            return self.replica_async_client(replica_url).request(method=method, url=rewrite_url(url, self._backend_url, replica_url), **kwargs)
+
+        if self.hedger is not None and self.hedger.policy.should_hedge(method, idempotent):
+            return await self.hedger.request(send)
+        if self.replica_set is not None:
+            return await self.replica_set.send_async(send)
+
+        return await self.async_client.request(method=method, url=url, **kwargs)
+
+    def _is_cacheable(self, method: str, kwargs: Dict[str, Any]) -> bool:
+        # Requests with a body are not cached, since the body is not part of the cache key
+        return self.http_cache is not None and method.upper() == "GET" and not any(kwargs.get(name) is not None for name in BODY_KWARGS)
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> Response:
+        """
+        Sends a request using http_client, retrying it according to retry_policy. Raises a CircuitOpenError if the backend's circuit breaker is open, or the
+        last TransportError if all attempts failed. Pass idempotent in order to override whether the request may be retried based on its method.
+        If replica_set is given, urls starting with backend_url are rewritten to the replica it chooses. If http_cache is given, GET requests are answered
+        from the cache while fresh. kwargs are passed to httpx.Client.request
+        """
+        if self._is_cacheable(method, kwargs):
+            return self.http_cache.send(
+                request_url(url, kwargs.get("params")),
+                kwargs.pop("headers", None),
+                lambda headers: self._request(method, url, idempotent, headers=headers, **kwargs),
+            )
+
+        return self._request(method, url, idempotent, **kwargs)
+
+    def _request(self, method: str, url: str, idempotent: Optional[bool], **kwargs) -> Response:
+        breaker = self.circuit_breaker
+        delays = self.retry_policy.delays() if self.retry_policy is not None else None
+
+        if self.retry_policy is not None:
+            self.retry_policy.record_request()
+
+        attempt = 0
+        while True:
+            response, error = None, None
+
+            if breaker is not None:
+                breaker.before_request(url)
+
+            try:
+                response = self._send(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(None, e)
+                raise
+            except BaseException:
+                # Cancellation by the caller, e.g. by asyncio.wait_for, says nothing about the backend's health
+                if breaker is not None:
+                    breaker.release()
+                raise
+
+            if breaker is not None:
+                breaker.record(response, error)
+
+            if self.retry_policy is None or not self.retry_policy.should_retry(method, attempt, response, error, idempotent):
+                break
+
+            time.sleep(next(delays))
+            attempt += 1
+
+        if error is not None:
+            raise error
+
+        return response
+
+    async def request_async(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> Response:
+        """
+        Sends a request using async_client without blocking the event loop, hedging it across replica_urls if hedging is enabled. See request
+        """
+        if self._is_cacheable(method, kwargs):
+            return await self.http_cache.send_async(
+                request_url(url, kwargs.get("params")),
+                kwargs.pop("headers", None),
+                lambda headers: self._request_async(method, url, idempotent, headers=headers, **kwargs),
+            )
+
+        return await self._request_async(method, url, idempotent, **kwargs)
+
+    async def _request_async(self, method: str, url: str, idempotent: Optional[bool], **kwargs) -> Response:
+        breaker = self.circuit_breaker
+        delays = self.retry_policy.delays() if self.retry_policy is not None else None
+
+        if self.retry_policy is not None:
+            self.retry_policy.record_request()
+
+        attempt = 0
+        while True:
+            response, error = None, None
+
+            if breaker is not None:
+                breaker.before_request(url)
+
+            try:
+                response = await self._send_async(method, url, idempotent, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(None, e)
+                raise
+            except BaseException:
+                # Cancellation by the caller, e.g. by asyncio.wait_for, says nothing about the backend's health
+                if breaker is not None:
+                    breaker.release()
+                raise
+
+            if breaker is not None:
+                breaker.record(response, error)
+
+            if self.retry_policy is None or not self.retry_policy.should_retry(method, attempt, response, error, idempotent):
+                break
+
+            await sleep(next(delays))
+            attempt += 1
+
+        if error is not None:
+            raise error
+
+        return response
+
     def get_liveness(self) -> Tuple[Optional[Response], bool]:
         """
         Asserts backend availability.
@@ -87,6 +323,67 @@ class ApiClient:
 
         return resp, status
 
+    async def get_liveness_async(self, timeout_seconds: Optional[float] = None) -> Tuple[Optional[Response], bool]:
+        """
+        Asserts backend availability without blocking the event loop. See get_liveness
+        """
+        try:
+            resp = await self.async_client.get(url=self._liveness_route, timeout=timeout_seconds or self._base_route_timeout_seconds)
+        except httpx.TransportError:
+            return None, False
+
+        return resp, resp.status_code == HTTPStatus.OK
+
+    async def get_readiness_async(self, timeout_seconds: Optional[float] = None) -> Tuple[Optional[Response], bool]:
+        """
+        Asserts project readiness without blocking the event loop. See get_readiness
+        """
+        try:
+            resp = await self.async_client.get(url=self._readiness_route, timeout=timeout_seconds or self._base_route_timeout_seconds)
+        except httpx.TransportError:
+            return None, False
+
+        return resp, resp.status_code == HTTPStatus.OK
+
+    async def get_status_async(self, timeout_seconds: Optional[float] = None) -> Tuple[Optional[Response], ApiStatus]:
+        """
+        Returns project status without blocking the event loop. See get_status
+        """
+        try:
+            resp = await self.async_client.get(url=self._status_route, timeout=timeout_seconds or self._base_route_timeout_seconds)
+        except httpx.TransportError:
+            return None, ApiStatus(readiness=False, gpu_supported=False, gpu_enabled=False)
+
+        resp.raise_for_status()
+
+        return resp, ApiStatus.parse_obj(resp.json())
+
+    async def refresh_replicas_async(self, timeout_seconds: Optional[float] = None) -> Dict[str, Optional[ApiStatus]]:
+        """
+        Requests /api/status from all replicas of replica_set concurrently, updating their weights and ejecting replicas which are not ready or unreachable.
+        Returns the status of each replica, or None if it could not be reached
+        """
+        if self.replica_set is None:
+            raise ValueError("refresh_replicas_async requires a replica_set")
+
+        async def get_replica_status(replica_url: str) -> Optional[ApiStatus]:
+            try:
+                resp = await self.replica_async_client(replica_url).get(
+                    url=replica_url + ApiBaseRoutes.status.value,
+                    timeout=timeout_seconds or self._base_route_timeout_seconds,
+                )
+                resp.raise_for_status()
+                return ApiStatus.parse_obj(resp.json())
+            except httpx.HTTPError:
+                return None
+
+        statuses = await asyncio.gather(*[get_replica_status(url) for url in self.replica_set.urls])
+
+        for url, status in zip(self.replica_set.urls, statuses):
+            self.replica_set.update_status(url, status)
+
+        return dict(zip(self.replica_set.urls, statuses))
+
     def wait_for_service_liveness(self, timeout: timedelta = timedelta(minutes=1)) -> None:
         start = datetime.now()
         err: Optional[Exception] = None
@@ -130,45 +427,41 @@ class ApiClient:
 
         raise HTTPException(detail=message, status_code=HTTPStatus.SERVICE_UNAVAILABLE)
 
-    async def wait_for_service_liveness_async(self, timeout: timedelta = timedelta(minutes=1)) -> None:
-        start = datetime.now()
-        err: Optional[Exception] = None
-
-        while datetime.now() - start <= timeout:
-            try:
-                _, is_live = self.get_liveness()
-                if is_live:
-                    return
-            except httpx.HTTPStatusError as err:
-                pass
-
-            await sleep(2)
-
-        message = f"Service did not become live before timeout: {timeout}"
-        if err is not None:
-            message += f". The following exception was raised while waiting: {err}"
+    async def wait_for_service_liveness_async(self, timeout: timedelta = timedelta(minutes=1), backoff: Optional[ExponentialBackoff] = None) -> None:
+        """
+        Waits for a given service to be live without blocking the event loop. Probes are retried using exponential backoff with jitter
+        """
+        await self._wait_async(self.get_liveness_async, condition="live", timeout=timeout, backoff=backoff)
 
-        raise HTTPException(detail=message, status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+    async def wait_for_service_readiness_async(self, timeout: timedelta = timedelta(minutes=3), backoff: Optional[ExponentialBackoff] = None) -> None:
+        """
+        Waits for a given service to be ready without blocking the event loop. Probes are retried using exponential backoff with jitter
+        """
+        await self._wait_async(self.get_readiness_async, condition="ready", timeout=timeout, backoff=backoff)
 
-    async def wait_for_service_readiness_async(self, timeout: timedelta = timedelta(minutes=3)) -> None:
-        start = datetime.now()
-        err: Optional[Exception] = None
+    async def _wait_async(
+            self,
+            probe: Callable[[Optional[float]], Awaitable[Tuple[Optional[Response], bool]]],
+            condition: str,
+            timeout: timedelta,
+            backoff: Optional[ExponentialBackoff],
+    ) -> None:
+        deadline = time.monotonic() + timeout.total_seconds()
+        delays = (backoff or ExponentialBackoff()).delays()
 
-        while datetime.now() - start <= timeout:
-            try:
-                _, is_ready = self.get_readiness()
-                if is_ready:
-                    return
-            except httpx.HTTPStatusError as err:
-                pass
+        while True:
+            remaining = deadline - time.monotonic()
+            _, success = await probe(max(min(self._base_route_timeout_seconds, remaining), 0.001))
+            if success:
+                return
 
-            await sleep(3)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
 
-        message = f"Service did not become ready before timeout: {timeout}"
-        if err is not None:
-            message += f". The following exception was raised while waiting: {err}"
+            await sleep(min(next(delays), remaining))
 
-        raise HTTPException(detail=f"Service did not become ready before timeout: {timeout}", status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+        raise HTTPException(detail=f"Service did not become {condition} before timeout: {timeout}", status_code=HTTPStatus.SERVICE_UNAVAILABLE)
 
     @staticmethod
     def get_headers(access_token: str = None, content_type: ContentType = None) -> dict:
@@ -181,47 +474,66 @@ class ApiClient:
 
         return auth_header
 
+    def parallel_requester(
+            self,
+            max_concurrency: int = 16,
+            timeout_seconds: Optional[float] = None,
+            retries: int = 0,
+            follow_redirects: bool = False,
+            raise_for_status: bool = False,
+    ) -> ParallelRequester:
+        """
+        Returns a ParallelRequester sending requests like request_async, i.e. using retry_policy & the backend's circuit breaker. Its retries are sent in
+        addition to those of retry_policy. timeout_seconds defaults to base_route_timeout_seconds
+        """
+        return ParallelRequester(
+            client=self.async_client,
+            max_concurrency=max_concurrency,
+            timeout_seconds=timeout_seconds if timeout_seconds is not None else self._base_route_timeout_seconds,
+            retries=retries,
+            follow_redirects=follow_redirects,
+            raise_for_status=raise_for_status,
+            http_cache=self.http_cache,
+            send=functools.partial(self._request_async, idempotent=None),
+        )
+
     async def parallel_get(
             self,
             urls: List[str],
             access_token: Optional[str] = None,
             follow_redirects: bool = False,
             raise_for_status: bool = False,
+            max_concurrency: int = 16,
+            retries: int = 0,
     ) -> Dict[str, Optional[Response]]:
-        """ Gets all passed urls in parallel asynchronously. If a timeout occurs, the response will be None """
-
-        url_map: Dict[str, Response] = {url: None for url in urls}
+        """
+        Gets all passed urls in parallel asynchronously, with at most max_concurrency requests in flight. If a request fails, e.g. due to a timeout, its
+        response will be None. If raise_for_status is set, the first error is raised instead, once all requests have completed.
+        """
+        headers = self.get_headers(access_token=access_token)
+        requester = self.parallel_requester(max_concurrency=max_concurrency, retries=retries, follow_redirects=follow_redirects, raise_for_status=raise_for_status)
 
-        await asyncio.gather(
-            *[
-                self._make_async_get_request(
-                    url=url,
-                    url_map=url_map,
-                    access_token=access_token,
-                    follow_redirects=follow_redirects,
-                )
-                for url in urls
-            ],
-            return_exceptions=True)
+        results = await requester.run([RequestSpec(url=url, headers=headers) for url in urls])
 
         if raise_for_status:
-            for url, res in url_map.items():
-                res.raise_for_status()
+            results.raise_first_error()
 
-        return url_map
+        return results.responses
 
-    async def _make_async_get_request(
+    async def parallel_post(
             self,
             url: str,
-            url_map: Dict[str, Response],
+            bodies: List[Any],
             access_token: Optional[str] = None,
-            follow_redirects: bool = False
-    ) -> None:
-        resp = await self.async_client.get(
-            url=url,
-            headers=self.get_headers(access_token=access_token),
-            follow_redirects=follow_redirects,
-            timeout=self._base_route_timeout_seconds,
-        )
+            timeout_seconds: Optional[float] = None,
+            max_concurrency: int = 16,
+            raise_for_status: bool = False,
+    ) -> ParallelResults:
+        """
+        Posts each of the JSON bodies to url in parallel asynchronously, with at most max_concurrency requests in flight. The results are in the order of
+        bodies, with the error of each failed request. POST requests are not retried, since they are not idempotent
+        """
+        headers = self.get_headers(access_token=access_token)
+        requester = self.parallel_requester(max_concurrency=max_concurrency, timeout_seconds=timeout_seconds, raise_for_status=raise_for_status)
 
-        url_map[url] = resp
+        return await requester.run([RequestSpec(url=url, method="POST", json=body, headers=headers) for body in bodies])
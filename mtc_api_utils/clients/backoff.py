@@ -0,0 +1,55 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import random
+from datetime import timedelta
+from typing import Callable, Iterator
+
+
+class ExponentialBackoff:
+    """
+    Computes delays between retries, which grow exponentially from initial_delay up to max_delay.
+
+    With jitter enabled, each delay is drawn uniformly from [0, delay] ("full jitter"), such that many clients waiting for the same backend do not retry in
+    lockstep.
+
+    Example usage:
+        for delay in ExponentialBackoff(initial_delay=timedelta(milliseconds=100)).delays():
+            if probe():
+                break
+            await asyncio.sleep(delay)
+    """
+
+    def __init__(
+            self,
+            initial_delay: timedelta = timedelta(milliseconds=100),
+            max_delay: timedelta = timedelta(seconds=5),
+            multiplier: float = 2.0,
+            jitter: bool = True,
+            random_fn: Callable[[], float] = random.random,
+    ):
+        if multiplier < 1:
+            raise ValueError(f"multiplier must be at least 1, got {multiplier}")
+
+        self.initial_delay = initial_delay.total_seconds()
+        self.max_delay = max_delay.total_seconds()
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+        self._random_fn = random_fn
+
+    def delay(self, attempt: int) -> float:
+        """ Returns the delay in seconds after the given attempt, counting from 0 """
+        # Cap the exponent in order to avoid overflows for long running loops
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** min(attempt, 64))
+
+        if self.jitter:
+            delay *= self._random_fn()
+
+        return delay
+
+    def delays(self) -> Iterator[float]:
+        attempt = 0
+        while True:
+            yield self.delay(attempt)
+            attempt += 1
@@ -1,27 +1,66 @@
 #  SPDX-License-Identifier: Apache-2.0
 #  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
 
+import asyncio
+import hashlib
+import os
+import time
+import uuid
 from abc import ABC, abstractmethod
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from http import HTTPStatus
-from typing import Iterable, Optional, List, Type
+from typing import Iterable, Optional, List, Type, FrozenSet, Iterator, AsyncIterator, Mapping, Tuple, Dict
 
 import firebase_admin
 import firebase_admin.auth as firebase_auth
 from fastapi import HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from firebase_admin.auth import UserRecord
 from firebase_admin.credentials import Certificate
 from httpx import post
 
-from mtc_api_utils.api_types import FirebaseUser, AuthenticationRole
+from mtc_api_utils.api_types import FirebaseUser, AuthenticationRole, BulkUserResult
+from mtc_api_utils.clients.firebase_keys import FirebasePublicKeys, default_public_keys
 from mtc_api_utils.config import Config
 from mtc_api_utils.init_api import download_if_not_exists
+from mtc_api_utils.ttl_cache import TTLCache
+
+# The maximum number of users per import_users & delete_users call supported by firebase
+BULK_BATCH_SIZE = 1000
+
+# The maximum number of identifiers per get_users call supported by firebase
+GET_USERS_BATCH_SIZE = 100
+
+# The token cache used by verify_token unless another cache is passed
+default_token_cache: TTLCache[str, FirebaseUser] = TTLCache(
+    max_entries=Config.token_cache_max_entries,
+    ttl=timedelta(seconds=Config.token_cache_ttl_seconds),
+)
+
+# PBKDF2 rounds used to hash passwords of imported users. Firebase rehashes passwords using its own scrypt parameters on first sign in
+PASSWORD_HASH_ROUNDS = 100_000
 
 
 class FirebaseClient:
-    def __init__(self, config: Type[Config]):
+    """
+    Verified access tokens are cached for config.token_cache_ttl_seconds, but never beyond their expiry, in order to avoid verifying the same token's
+    signature on every request. If config.token_check_revoked is set, tokens are additionally checked for revocation, such that a revoked token is rejected
+    at the latest once its cache entry expires.
+
+    verify_token_async verifies tokens locally using Google's cached public keys instead of calling firebase_admin, such that it does not block the event loop.
+    """
+
+    def __init__(self, config: Type[Config], public_keys: FirebasePublicKeys = default_public_keys):
         self.enabled = config.auth_enabled
+        self.public_keys = public_keys
+        self.check_revoked = config.token_check_revoked
+        self.token_cache: TTLCache[str, FirebaseUser] = TTLCache(
+            max_entries=config.token_cache_max_entries,
+            ttl=timedelta(seconds=config.token_cache_ttl_seconds),
+        )
 
         if self.enabled and not firebase_admin._apps:
             # Init firebase credentials
@@ -46,13 +85,74 @@ class FirebaseClient:
 
     def list_users(self) -> firebase_auth.ListUsersPage:
         """
-        Retrieves all users from firebase service
+        Retrieves the first page of up to 1000 users from firebase service. Use iter_users or iter_users_async in order to retrieve all users
         """
-        if not self.enabled:
-            raise HTTPException(detail="Firebase auth disabled", status_code=HTTPStatus.UNAUTHORIZED)
+        self._assert_enabled()
 
         return firebase_auth.list_users()
 
+    def iter_users(self, page_size: int = 1000) -> Iterator[FirebaseUser]:
+        """
+        Iterates over all users of the firebase service. The next page is fetched on a background thread while the current page is being consumed
+        """
+        self._assert_enabled()
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="firebase-list-users") as executor:
+            page = firebase_auth.list_users(max_results=page_size)
+
+            while page is not None:
+                next_page = executor.submit(page.get_next_page) if page.has_next_page else None
+
+                for user in page.users:
+                    yield FirebaseUser.from_user_record(user)
+
+                page = next_page.result() if next_page is not None else None
+
+    async def iter_users_async(self, page_size: int = 1000) -> AsyncIterator[FirebaseUser]:
+        """
+        Asynchronously iterates over all users of the firebase service. Pages are fetched in the threadpool and the next page is fetched while the current
+        page is being consumed
+        """
+        self._assert_enabled()
+
+        next_page: Optional[asyncio.Future] = None
+        try:
+            page = await run_in_threadpool(firebase_auth.list_users, max_results=page_size)
+
+            while page is not None:
+                next_page = asyncio.ensure_future(run_in_threadpool(page.get_next_page)) if page.has_next_page else None
+
+                for user in page.users:
+                    yield FirebaseUser.from_user_record(user)
+
+                page = await next_page if next_page is not None else None
+
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+    def stream_users(self, page_size: int = 1000) -> StreamingResponse:
+        """
+        Returns a response streaming all users as newline delimited JSON, such that large user lists are neither held in memory nor delayed until all pages
+        have been fetched
+
+        Example usage:
+            @api.get("/api/users", dependencies=[Depends(user_auth.admin_only())])
+            def list_users():
+                return firebase_client.stream_users()
+        """
+        self._assert_enabled()
+
+        async def ndjson_lines() -> AsyncIterator[str]:
+            async for user in self.iter_users_async(page_size=page_size):
+                yield f"{user.json()}\n"
+
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    def _assert_enabled(self) -> None:
+        if not self.enabled:
+            raise HTTPException(detail="Firebase auth disabled", status_code=HTTPStatus.UNAUTHORIZED)
+
     def create_user(self, email: str, password: str, roles: Optional[Iterable[str]] = None) -> Optional[UserRecord]:
         """
         Creates a new user using the firebase service
@@ -68,6 +168,125 @@ class FirebaseClient:
             print("Firebase auth disabled -> skipping user creation")
             return None
 
+    def create_users(self, users: Iterable[FirebaseUser], max_workers: int = 8) -> List[BulkUserResult]:
+        """
+        Creates several users, including their passwords & roles, using firebase's batch import instead of three requests per user.
+        Passwords are hashed locally using PBKDF2-SHA256 on up to max_workers threads. Returns one result per user, in the order of users.
+
+        Since firebase's batch import does not check whether emails are unique, users whose email already exists, or occurs earlier in users, are not imported
+        and fail with an error instead, as they would using create_user
+        """
+        if not self.enabled:
+            print("Firebase auth disabled -> skipping user creation")
+            return []
+
+        users = list(users)
+        duplicate_errors = self._duplicate_email_errors(users)
+        new_users = [user for index, user in enumerate(users) if index not in duplicate_errors]
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firebase-hash-passwords") as executor:
+            records = list(executor.map(self._import_user_record, new_users))
+
+        hash_alg = firebase_auth.UserImportHash.pbkdf2_sha256(rounds=PASSWORD_HASH_ROUNDS)
+
+        import_results = []
+        for batch_start in range(0, len(records), BULK_BATCH_SIZE):
+            batch = records[batch_start:batch_start + BULK_BATCH_SIZE]
+            try:
+                errors = {error.index: error.reason for error in firebase_auth.import_users(batch, hash_alg=hash_alg).errors}
+            except Exception as e:
+                errors = {index: str(e) for index in range(len(batch))}
+
+            import_results.extend(
+                BulkUserResult(uid=record.uid, email=record.email, success=index not in errors, error=errors.get(index))
+                for index, record in enumerate(batch)
+            )
+
+        import_results = iter(import_results)
+        return [
+            BulkUserResult(email=user.email, success=False, error=duplicate_errors[index]) if index in duplicate_errors else next(import_results)
+            for index, user in enumerate(users)
+        ]
+
+    @staticmethod
+    def _duplicate_email_errors(users: List[FirebaseUser]) -> Dict[int, str]:
+        """ Maps the index of each user whose email already exists in firebase, or occurs earlier in users, to an error """
+        emails = [user.email.lower() for user in users]
+        unique_emails = list(dict.fromkeys(emails))
+
+        existing_emails = set()
+        for batch_start in range(0, len(unique_emails), GET_USERS_BATCH_SIZE):
+            batch = unique_emails[batch_start:batch_start + GET_USERS_BATCH_SIZE]
+            result = firebase_auth.get_users([firebase_auth.EmailIdentifier(email) for email in batch])
+            existing_emails.update(user.email.lower() for user in result.users if user.email is not None)
+
+        errors, seen_emails = {}, set()
+        for index, email in enumerate(emails):
+            if email in existing_emails:
+                errors[index] = f"A user with email {email} already exists"
+            elif email in seen_emails:
+                errors[index] = f"Email {email} occurs more than once"
+            seen_emails.add(email)
+
+        return errors
+
+    @staticmethod
+    def _import_user_record(user: FirebaseUser) -> firebase_auth.ImportUserRecord:
+        password_hash, password_salt = None, None
+        if user.password is not None:
+            password_salt = os.urandom(16)
+            password_hash = hashlib.pbkdf2_hmac("sha256", user.password.encode("utf-8"), password_salt, PASSWORD_HASH_ROUNDS)
+
+        return firebase_auth.ImportUserRecord(
+            uid=uuid.uuid4().hex,
+            email=user.email,
+            password_hash=password_hash,
+            password_salt=password_salt,
+            custom_claims={role: True for role in user.roles} or None,
+        )
+
+    def update_users_roles(self, roles_by_uid: Mapping[str, Iterable[str]], max_workers: int = 8) -> List[BulkUserResult]:
+        """
+        Sets the roles of several users using up to max_workers concurrent requests, since firebase provides no batch API for custom claims.
+        Returns one result per user, in the order of roles_by_uid
+        """
+        if not self.enabled:
+            print("Firebase auth disabled -> skipping user update")
+            return []
+
+        def update_roles(uid_and_roles: Tuple[str, Iterable[str]]) -> BulkUserResult:
+            uid, roles = uid_and_roles
+            try:
+                firebase_auth.set_custom_user_claims(uid, {role: True for role in roles})
+                return BulkUserResult(uid=uid, success=True)
+            except Exception as e:
+                return BulkUserResult(uid=uid, success=False, error=str(e))
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firebase-update-users") as executor:
+            return list(executor.map(update_roles, roles_by_uid.items()))
+
+    def delete_users(self, uids: Iterable[str]) -> List[BulkUserResult]:
+        """
+        Deletes several users using firebase's batch delete. Returns one result per user, in the order of uids
+        """
+        if not self.enabled:
+            print("Firebase auth disabled -> skipping user deletion")
+            return []
+
+        uids = list(uids)
+
+        results = []
+        for batch_start in range(0, len(uids), BULK_BATCH_SIZE):
+            batch = uids[batch_start:batch_start + BULK_BATCH_SIZE]
+            try:
+                errors = {error.index: error.reason for error in firebase_auth.delete_users(batch).errors}
+            except Exception as e:
+                errors = {index: str(e) for index in range(len(batch))}
+
+            results.extend(BulkUserResult(uid=uid, success=index not in errors, error=errors.get(index)) for index, uid in enumerate(batch))
+
+        return results
+
     def update_user_roles(self, uid: str, roles: Iterable[str]) -> Optional[UserRecord]:
         """
         Updates a user using the firebase service by setting the provided user roles
@@ -90,17 +309,66 @@ class FirebaseClient:
             print("Firebase auth disabled -> skipping user creation")
 
     @staticmethod
-    def verify_token(access_token: str) -> FirebaseUser:
+    def verify_token(
+            access_token: str,
+            cache: Optional[TTLCache[str, FirebaseUser]] = None,
+            check_revoked: Optional[bool] = None,
+    ) -> FirebaseUser:
+        """
+        Verifies an access token against the firebase service, unless it has been verified recently. Uses default_token_cache & Config.token_check_revoked
+        unless cache or check_revoked are passed, e.g. a client's token_cache & check_revoked
+        """
+        if cache is None:
+            cache = default_token_cache
+        if check_revoked is None:
+            check_revoked = Config.token_check_revoked
+
+        if access_token is None:
+            raise HTTPException(detail="Parameter access_token was not passed", status_code=HTTPStatus.UNAUTHORIZED)
+
+        cache_key = FirebaseClient.token_cache_key(access_token)
+        cached_user = cache.get(cache_key)
+        if cached_user is not None:
+            return cached_user.copy(deep=True)
+
+        try:
+            user_dict = firebase_auth.verify_id_token(access_token, check_revoked=check_revoked)
+
+            user = FirebaseUser(
+                email=user_dict["email"],
+                access_token=access_token,
+                roles=FirebaseClient.get_user_roles(user_dict)
+            )
+
+        except Exception as e:
+            print(e)
+            raise HTTPException(detail="Parameter access_token is not valid", status_code=HTTPStatus.UNAUTHORIZED)
+
+        if "exp" in user_dict:
+            cache.set(cache_key, user.copy(deep=True), ttl=timedelta(seconds=user_dict["exp"] - time.time()))
+
+        return user
+
+    async def verify_token_async(self, access_token: str) -> FirebaseUser:
         """
-        Verifies an access token against the firebase service
+        Verifies an access token locally, unless it has been verified recently. Only the revocation check, if enabled, requires a call to the firebase service,
+        which is run in the threadpool
         """
+        if access_token is None:
+            raise HTTPException(detail="Parameter access_token was not passed", status_code=HTTPStatus.UNAUTHORIZED)
+
+        cache_key = self.token_cache_key(access_token)
+        cached_user = self.token_cache.get(cache_key)
+        if cached_user is not None:
+            return cached_user.copy(deep=True)
+
         try:
-            if access_token is None:
-                raise HTTPException(detail="Parameter access_token was not passed", status_code=HTTPStatus.UNAUTHORIZED)
+            user_dict = await self.public_keys.verify_id_token(access_token, project_id=self.project_id)
 
-            user_dict = firebase_auth.verify_id_token(access_token)
+            if self.check_revoked:
+                await run_in_threadpool(self.assert_not_revoked, user_dict)
 
-            return FirebaseUser(
+            user = FirebaseUser(
                 email=user_dict["email"],
                 access_token=access_token,
                 roles=FirebaseClient.get_user_roles(user_dict)
@@ -110,6 +378,37 @@ class FirebaseClient:
             print(e)
             raise HTTPException(detail="Parameter access_token is not valid", status_code=HTTPStatus.UNAUTHORIZED)
 
+        self.token_cache.set(cache_key, user.copy(deep=True), ttl=timedelta(seconds=user_dict["exp"] - time.time()))
+
+        return user
+
+    @staticmethod
+    def assert_not_revoked(claims: dict) -> None:
+        """
+        Checks the claims of a verified token for revocation, as firebase_auth.verify_id_token does if check_revoked is set, but without verifying the token
+        again. Requires a single call to the firebase service in order to fetch the token's user
+        """
+        user = firebase_auth.get_user(claims["sub"])
+
+        if user.disabled:
+            raise firebase_auth.UserDisabledError("The user record is disabled.")
+        if claims["iat"] * 1000 < (user.tokens_valid_after_timestamp or 0):
+            raise firebase_auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+
+    @property
+    def project_id(self) -> str:
+        return firebase_admin.get_app().project_id
+
+    @staticmethod
+    def token_cache_key(access_token: str) -> str:
+        return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+    def invalidate_token(self, access_token: str) -> None:
+        """
+        Removes a token from the verification cache, e.g. after revoking a user's tokens, such that it is verified again on its next use
+        """
+        self.token_cache.pop(self.token_cache_key(access_token))
+
     @staticmethod
     def get_user_roles(user: dict) -> List[str]:
         """
@@ -164,19 +463,31 @@ class UserAuth(ABC):
         pass
 
 
-def firebase_user_auth(config: Type[Config]) -> UserAuth:
+def firebase_user_auth(config: Type[Config], use_async: bool = False) -> UserAuth:
     """
-    UserAuth factory for FirebaseUserAuth class allowing auth to be enabled/disabled
+    UserAuth factory for FirebaseUserAuth class allowing auth to be enabled/disabled.
+    If use_async is set, the returned dependency verifies tokens on the event loop using cached public keys instead of blocking a threadpool thread
     """
     # Only require Bearer token Authorization header if auth_enabled
     bearer = HTTPBearer() if config.auth_enabled else lambda: None
 
     class FirebaseUserAuth(UserAuth):
-        def __init__(self, config: Type[config]):
-            self.firebase_client = FirebaseClient(config=config)
+        """
+        An immutable auth dependency. with_roles() and admin_only() return role scoped views, which share the FirebaseClient, and thereby its token cache,
+        with the instance they were created from.
+        """
+        firebase_client: FirebaseClient
+        auth_enabled: bool
+        roles: FrozenSet[str]
+
+        def __init__(self, config: Type[config], firebase_client: Optional[FirebaseClient] = None, roles: Iterable[str] = ()):
+            object.__setattr__(self, "config", config)
+            object.__setattr__(self, "firebase_client", firebase_client if firebase_client is not None else FirebaseClient(config=config))
+            object.__setattr__(self, "auth_enabled", config.auth_enabled)
+            object.__setattr__(self, "roles", frozenset(roles))
 
-            self.roles: Iterable[str] = []
-            self.auth_enabled = config.auth_enabled
+        def __setattr__(self, name: str, value) -> None:
+            raise AttributeError(f"{type(self).__name__} is immutable, use with_roles() in order to create a view with different roles")
 
         def with_roles(self, roles: Iterable[str], include_special_rules: bool = True):
             roles = set(roles)
@@ -184,33 +495,41 @@ def firebase_user_auth(config: Type[Config]) -> UserAuth:
             if include_special_rules:
                 roles = roles.union(AuthenticationRole.special_roles_with_access_privileges())
 
-            client_with_roles = deepcopy(self)
-            client_with_roles.roles = roles
-            return client_with_roles
+            return type(self)(config=self.config, firebase_client=self.firebase_client, roles=roles)
 
         def admin_only(self):
-            client_with_roles = deepcopy(self)
-            client_with_roles.roles = [AuthenticationRole.admin.value]
-
-            return client_with_roles
+            return type(self)(config=self.config, firebase_client=self.firebase_client, roles=[AuthenticationRole.admin.value])
 
         def __call__(self, token: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> Optional[FirebaseUser]:  # roles: List[str],
             if not self.auth_enabled:
                 # If auth is disabled, return a default user
                 return FirebaseUser.default()
 
-            user = self.firebase_client.verify_token(token.credentials)
+            user = self.firebase_client.verify_token(
+                token.credentials,
+                cache=self.firebase_client.token_cache,
+                check_revoked=self.firebase_client.check_revoked,
+            )
+            return self.authorize(user)
 
-            if not self.roles:
+        def authorize(self, user: FirebaseUser) -> FirebaseUser:
+            if not self.roles or not self.roles.isdisjoint(user.roles):
                 return user
 
-            for role in self.roles:
-                if role in user.roles:
-                    return user
-
             raise HTTPException(
-                detail=f"Unauthorized: User does not have any of the required roles: {self.roles}",
+                detail=f"Unauthorized: User does not have any of the required roles: {sorted(self.roles)}",
                 status_code=HTTPStatus.FORBIDDEN
             )
 
+    class AsyncFirebaseUserAuth(FirebaseUserAuth):
+        async def __call__(self, token: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> Optional[FirebaseUser]:
+            if not self.auth_enabled:
+                return FirebaseUser.default()
+
+            user = await self.firebase_client.verify_token_async(token.credentials)
+            return self.authorize(user)
+
+    if use_async:
+        return AsyncFirebaseUserAuth(config=config)
+
     return FirebaseUserAuth(config=config)
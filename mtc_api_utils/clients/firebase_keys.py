@@ -0,0 +1,129 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+Local verification of Firebase ID tokens. The public keys used to sign ID tokens are fetched from Google and cached for as long as their Cache-Control
+max-age allows, such that verifying a token only requires a local signature check and never waits for the network once the keys have been fetched.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import re
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from google.auth import jwt
+from httpx import AsyncClient
+
+ID_TOKEN_CERT_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+_max_age_pattern = re.compile(r"max-age=(\d+)")
+
+
+def parse_max_age(cache_control: Optional[str]) -> Optional[int]:
+    match = _max_age_pattern.search(cache_control or "")
+    return int(match.group(1)) if match else None
+
+
+def token_key_id(token: str) -> Optional[str]:
+    """ Returns the kid of a JWT's header without verifying the token """
+    header_segment = token.split(".")[0]
+    header = json.loads(base64.urlsafe_b64decode(header_segment + "=" * (-len(header_segment) % 4)))
+    return header.get("kid")
+
+
+class FirebasePublicKeys:
+    """
+    Caches the x509 certificates which Google uses to sign Firebase ID tokens.
+
+    Certificates are fetched on first use and refreshed in the background once they are about to expire according to the Cache-Control max-age of the last
+    response, while the current certificates keep being used. Only a token signed by an unknown key, e.g. right after a key rotation, waits for a refresh,
+    which is performed at most once per min_refresh_interval. Concurrent refreshes are coalesced into a single request.
+    """
+
+    def __init__(
+            self,
+            cert_url: str = ID_TOKEN_CERT_URL,
+            refresh_margin: timedelta = timedelta(minutes=5),
+            min_refresh_interval: timedelta = timedelta(seconds=30),
+            default_max_age: timedelta = timedelta(hours=1),
+            http_client: Optional[AsyncClient] = None,
+            timer: Callable[[], float] = time.monotonic,
+    ):
+        self.cert_url = cert_url
+        self.refresh_margin = refresh_margin.total_seconds()
+        self.min_refresh_interval = min_refresh_interval.total_seconds()
+        self.default_max_age = default_max_age.total_seconds()
+
+        self.certs: Dict[str, str] = {}
+        self.expires_at = 0.0
+
+        self._http_client = http_client
+        self._timer = timer
+        self._last_attempt: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get_certs(self, key_id: Optional[str] = None) -> Dict[str, str]:
+        """ Returns the current certificates, waiting for a refresh only if there are none yet or if key_id is unknown """
+        now = self._timer()
+        may_refresh = self._last_attempt is None or now - self._last_attempt >= self.min_refresh_interval
+
+        if not self.certs or (key_id is not None and key_id not in self.certs and may_refresh):
+            await self.refresh()
+
+        elif now >= self.expires_at - self.refresh_margin and may_refresh:
+            self._start_refresh()
+
+        return self.certs
+
+    async def refresh(self) -> None:
+        await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        if self._refresh_task is None or self._refresh_task.done() or self._refresh_task.get_loop() is not loop:
+            self._last_attempt = self._timer()
+            self._refresh_task = loop.create_task(self._fetch())
+
+        return self._refresh_task
+
+    async def _fetch(self) -> None:
+        try:
+            if self._http_client is not None:
+                response = await self._http_client.get(self.cert_url)
+            else:
+                async with AsyncClient(timeout=10) as client:
+                    response = await client.get(self.cert_url)
+
+            response.raise_for_status()
+            certs = response.json()
+
+        except Exception as e:
+            print(f"Could not refresh Firebase public keys from {self.cert_url}: {e}")
+            if not self.certs:
+                raise
+            return
+
+        max_age = parse_max_age(response.headers.get("Cache-Control"))
+        self.certs = certs
+        self.expires_at = self._timer() + (max_age if max_age is not None else self.default_max_age)
+
+    async def verify_id_token(self, token: str, project_id: str) -> dict:
+        """ Verifies the signature & claims of a Firebase ID token and returns its claims. Raises ValueError if the token is not valid """
+        certs = await self.get_certs(token_key_id(token))
+        claims = jwt.decode(token, certs=certs, audience=project_id)
+
+        if claims.get("iss") != f"{ID_TOKEN_ISSUER_PREFIX}{project_id}":
+            raise ValueError(f"Token has an invalid issuer: {claims.get('iss')}")
+        if not claims.get("sub"):
+            raise ValueError("Token has no subject")
+
+        return claims
+
+
+default_public_keys = FirebasePublicKeys()
@@ -0,0 +1,199 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+Hedged requests: if a replica does not respond within its usual latency, a duplicate request is sent to another replica and the first response is used.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import time
+from collections import deque
+from datetime import timedelta
+from threading import Lock
+from typing import Awaitable, Callable, Deque, Dict, FrozenSet, List, Optional, Tuple
+
+from httpx import Response
+
+from mtc_api_utils.clients.http_pool import backend_key
+from mtc_api_utils.clients.load_balancing import ReplicaSet
+from mtc_api_utils.clients.resilience import IDEMPOTENT_METHODS, RetryBudget
+
+
+def rewrite_url(url: str, backend_url: str, replica_url: str) -> str:
+    """ Replaces the backend_url prefix of url by replica_url. Urls of other backends are returned unchanged """
+    if not url.startswith(backend_url):
+        return url
+
+    return replica_url + url[len(backend_url):]
+
+
+class LatencyHistogram:
+    """ Tracks a sliding window of the most recent request latencies in seconds, in order to estimate latency percentiles """
+
+    def __init__(self, window_size: int = 1000):
+        self._latencies: Deque[float] = deque(maxlen=window_size)
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """ Returns the given percentile (0 - 100) of the recorded latencies, or None if no latencies were recorded """
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        if not latencies:
+            return None
+
+        index = max(math.ceil(percentile / 100 * len(latencies)) - 1, 0)
+        return latencies[index]
+
+
+class HedgingPolicy:
+    """
+    Configures when requests are hedged.
+
+    Parameters:
+        * percentile: A duplicate request is sent if the replica did not respond within this percentile of its recent latencies.
+        * default_delay: The hedge delay used until min_samples latencies were recorded for a replica.
+        * min_delay, max_delay: Bounds of the hedge delay.
+        * max_hedge_ratio: The maximum fraction of requests which are hedged, such that hedging cannot overload the replicas when all of them are slow.
+        * hedge_methods: Only requests using these methods are hedged, unless overridden using the idempotent parameter of ApiClient.request_async.
+    """
+
+    def __init__(
+            self,
+            percentile: float = 95,
+            default_delay: timedelta = timedelta(milliseconds=100),
+            min_delay: timedelta = timedelta(milliseconds=5),
+            max_delay: timedelta = timedelta(seconds=2),
+            max_hedge_ratio: float = 0.05,
+            min_samples: int = 20,
+            window_size: int = 1000,
+            hedge_methods: FrozenSet[str] = IDEMPOTENT_METHODS,
+    ):
+        if not 0 < percentile <= 100:
+            raise ValueError(f"percentile must be in (0, 100], got {percentile}")
+
+        self.percentile = percentile
+        self.default_delay = default_delay.total_seconds()
+        self.min_delay = min_delay.total_seconds()
+        self.max_delay = max_delay.total_seconds()
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.hedge_methods = hedge_methods
+
+    def should_hedge(self, method: str, idempotent: Optional[bool] = None) -> bool:
+        return idempotent if idempotent is not None else method.upper() in self.hedge_methods
+
+
+class Hedger:
+    """
+    Sends requests to replicas of the same backend, hedging slow requests according to policy. Primary replicas are chosen round robin, the hedge is sent to
+    the next replica. If a ReplicaSet is passed, both are chosen by the ReplicaSet instead, which also tracks their outstanding requests & failures.
+    Tracks a LatencyHistogram per replica, as well as the number of requests, hedges & hedges which responded first.
+
+    Example usage:
+        hedger = Hedger(replica_urls=["http://model-api-0:5000", "http://model-api-1:5000"], policy=HedgingPolicy(percentile=90))
+        response = await hedger.request(lambda replica_url: client.get(f"{replica_url}/api/inference"))
+    """
+
+    def __init__(
+            self,
+            replica_urls: List[str],
+            policy: HedgingPolicy,
+            timer: Callable[[], float] = time.monotonic,
+            replica_set: Optional[ReplicaSet] = None,
+    ):
+        if not replica_urls:
+            raise ValueError("Hedger requires at least one replica")
+
+        self.replica_urls = list(replica_urls)
+        self.policy = policy
+        self.histograms: Dict[str, LatencyHistogram] = {backend_key(url): LatencyHistogram(policy.window_size) for url in self.replica_urls}
+        self.budget = RetryBudget(ratio=policy.max_hedge_ratio, min_retries=0)
+        self.replica_set = replica_set
+
+        self.num_requests = 0
+        self.num_hedges = 0
+        self.num_hedge_wins = 0
+
+        self._timer = timer
+        self._counter = itertools.count()
+
+    def delay(self, replica_url: str) -> float:
+        """ Returns the hedge delay in seconds for requests sent to replica_url """
+        histogram = self.histograms[backend_key(replica_url)]
+
+        delay = histogram.percentile(self.policy.percentile) if len(histogram) >= self.policy.min_samples else None
+        if delay is None:
+            delay = self.policy.default_delay
+
+        return min(max(delay, self.policy.min_delay), self.policy.max_delay)
+
+    def _pick_replicas(self) -> Tuple[str, Optional[str]]:
+        if self.replica_set is not None:
+            primary = self.replica_set.choose().url
+            secondary = self.replica_set.choose(exclude={primary}).url if len(self.replica_urls) > 1 else None
+            return primary, secondary
+
+        index = next(self._counter) % len(self.replica_urls)
+        primary = self.replica_urls[index]
+        secondary = self.replica_urls[(index + 1) % len(self.replica_urls)] if len(self.replica_urls) > 1 else None
+
+        return primary, secondary
+
+    async def _timed(self, replica_url: str, send: Callable[[str], Awaitable[Response]]) -> Response:
+        start = self._timer()
+        try:
+            if self.replica_set is not None:
+                return await self.replica_set.send_async(send, self.replica_set.replicas[replica_url])
+            return await send(replica_url)
+        finally:
+            # Requests cancelled in favour of a hedge record their latency until cancellation, which keeps slow replicas from appearing fast
+            self.histograms[backend_key(replica_url)].record(self._timer() - start)
+
+    async def request(self, send: Callable[[str], Awaitable[Response]]) -> Response:
+        """ Calls send with the url of the primary replica, and with the url of another replica if the primary is slow. Returns the first response """
+        primary, secondary = self._pick_replicas()
+        self.num_requests += 1
+        self.budget.record_request()
+
+        primary_task = asyncio.ensure_future(self._timed(primary, send))
+        hedge_task: Optional[asyncio.Future] = None
+
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.delay(primary))
+            if done or secondary is None or not self.budget.try_acquire_retry():
+                return await primary_task
+
+            hedge_task = asyncio.ensure_future(self._timed(secondary, send))
+            self.num_hedges += 1
+
+            pending = {primary_task, hedge_task}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.num_hedge_wins += 1
+                        return task.result()
+
+                    error = task.exception()
+
+            raise error
+        finally:
+            for task in (primary_task, hedge_task):
+                if task is not None:
+                    task.cancel()
@@ -0,0 +1,400 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+A private HTTP cache for GET requests, which honors Cache-Control, Expires, ETag & Last-Modified and revalidates stale responses using conditional requests.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from httpx import Headers, Request, Response, URL
+
+from mtc_api_utils.ttl_cache import TTLCache
+
+CACHEABLE_STATUS_CODES = frozenset({
+    HTTPStatus.OK,
+    HTTPStatus.NON_AUTHORITATIVE_INFORMATION,
+    HTTPStatus.MOVED_PERMANENTLY,
+    HTTPStatus.PERMANENT_REDIRECT,
+    HTTPStatus.NOT_FOUND,
+    HTTPStatus.GONE,
+})
+
+# Headers describing the transfer rather than the content, which must not be replayed from the cache, since cached content is stored decoded
+UNCACHED_HEADERS = frozenset({"connection", "content-encoding", "content-length", "keep-alive", "transfer-encoding"})
+
+
+# Request arguments of httpx.Client.request carrying a body
+BODY_KWARGS = ("content", "data", "files", "json")
+
+# Subdirectory of cache_dir holding the persisted entries, such that other files in cache_dir are never counted, evicted or cleared
+DISK_ENTRIES_DIR = "http-cache"
+
+
+def request_url(url: str, params: Optional[Any] = None) -> str:
+    """ Returns the url a request is sent to, including params merged into its query as httpx would, such that it can be used as part of a cache key """
+    if params is None:
+        return str(URL(url))
+
+    return str(URL(url).copy_merge_params(params))
+
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Optional[str]]:
+    """ Parses a Cache-Control header into a dict of lower case directives and their values, e.g. {"max-age": "60", "no-cache": None} """
+    directives: Dict[str, Optional[str]] = {}
+
+    for directive in (header or "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') if value else None
+
+    return directives
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    """ Parses an HTTP date into a timestamp, or returns None if the date is missing or invalid """
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_seconds(value: Optional[str]) -> Optional[int]:
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CachedResponse(NamedTuple):
+    """ A cached response. Stored on disk as a JSON sidecar holding everything but the content, next to a file holding the content """
+    url: str
+    status_code: int
+    headers: List[Tuple[str, str]]
+    content: bytes
+    stored_at: float
+    expires_at: float
+
+    @property
+    def etag(self) -> Optional[str]:
+        return Headers(self.headers).get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return Headers(self.headers).get("last-modified")
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.content) + sum(len(name) + len(value) for name, value in self.headers)
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def to_response(self, request: Optional[Request] = None) -> Response:
+        return Response(self.status_code, headers=self.headers, content=self.content, request=request)
+
+    @staticmethod
+    def load(meta_path: str, content_path: str) -> Optional[CachedResponse]:
+        try:
+            with open(meta_path, 'r') as meta_file:
+                meta = json.load(meta_file)
+            with open(content_path, 'rb') as content_file:
+                content = content_file.read()
+
+            return CachedResponse(**{**meta, "headers": [tuple(header) for header in meta["headers"]], "content": content})
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def save(self, meta_path: str, content_path: str) -> None:
+        # The content is written first, such that a complete sidecar always refers to complete content
+        for path, mode, write in [
+            (content_path, 'wb', lambda f: f.write(self.content)),
+            (meta_path, 'w', lambda f: json.dump({k: v for k, v in self._asdict().items() if k != "content"}, f)),
+        ]:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, mode) as file:
+                write(file)
+            os.replace(tmp_path, path)
+
+
+class CacheLookup(NamedTuple):
+    """ The result of HttpCache.begin: either a fresh cached response, or the headers to send, including validators of a stale entry """
+    key: str
+    entry: Optional[CachedResponse]
+    response: Optional[Response]
+    headers: Headers
+    store: bool
+
+
+class HttpCache:
+    """
+    A private cache for GET responses, bounded to max_bytes in memory using a least recently used TTLCache, and optionally persisted to a dedicated
+    subdirectory of cache_dir. The disk store is bounded to max_disk_bytes by removing the least recently written or loaded entries.
+
+    Responses are fresh for their Cache-Control max-age, until their Expires date or, lacking both, for heuristic_fraction of the time since they were last
+    modified. Fresh responses are returned without a request. Stale responses are revalidated using If-None-Match & If-Modified-Since, such that unchanged
+    resources are not transferred again. Responses with Cache-Control no-store or a Vary header are not cached. Requests with different Authorization headers
+    use separate entries.
+
+    Counters: hits (fresh responses), revalidated (304 Not Modified responses) and misses (full responses).
+
+    Example usage:
+        client = ApiClient(backend_url="http://model-api:5000", http_cache=HttpCache(max_bytes=32 * 1024 * 1024, cache_dir="/tmp/http-cache"))
+        response = client.request("GET", f"{client.backend_url}/api/languages")
+    """
+
+    def __init__(
+            self,
+            max_bytes: int = 64 * 1024 * 1024,
+            max_entries: int = 4096,
+            cache_dir: Optional[str] = None,
+            max_disk_bytes: int = 256 * 1024 * 1024,
+            heuristic_fraction: float = 0.1,
+            max_heuristic_lifetime: timedelta = timedelta(days=1),
+            timer: Callable[[], float] = time.time,
+    ):
+        self.cache_dir = cache_dir
+        self.entries_dir = os.path.join(cache_dir, DISK_ENTRIES_DIR) if cache_dir is not None else None
+        self.max_disk_bytes = max_disk_bytes
+        self.heuristic_fraction = heuristic_fraction
+        self.max_heuristic_lifetime = max_heuristic_lifetime.total_seconds()
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._memory: TTLCache[str, CachedResponse] = TTLCache(max_entries=max_entries, max_bytes=max_bytes, size_fn=lambda entry: entry.size_bytes)
+        self._timer = timer
+        self._lock = Lock()
+
+        self._disk_bytes = 0
+        self._disk_lock = Lock()
+
+        if cache_dir is not None:
+            os.makedirs(self.entries_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    @staticmethod
+    def cache_key(url: str, headers: Headers) -> str:
+        return hashlib.sha256(f"GET {url} {headers.get('authorization', '')}".encode("utf-8")).hexdigest()
+
+    def _disk_paths(self, key: str) -> Tuple[str, str]:
+        return os.path.join(self.entries_dir, f"{key}.json"), os.path.join(self.entries_dir, f"{key}.content")
+
+    def _disk_entries(self) -> List[Tuple[str, float, int]]:
+        """ Returns the key, last write or load time & size of each entry in entries_dir, ignoring temporary files """
+        entries = []
+
+        for file_name in os.listdir(self.entries_dir):
+            key, extension = os.path.splitext(file_name)
+            if extension != ".json":
+                continue
+
+            try:
+                entries.append((key, os.path.getmtime(self._disk_paths(key)[0]), sum(os.path.getsize(path) for path in self._disk_paths(key))))
+            except OSError:
+                continue
+
+        return entries
+
+    def _disk_size(self, key: str) -> int:
+        return sum(os.path.getsize(path) for path in self._disk_paths(key) if os.path.exists(path))
+
+    def _remove_from_disk(self, key: str) -> None:
+        with self._disk_lock:
+            self._disk_bytes -= self._disk_size(key)
+
+            for path in self._disk_paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _evict_from_disk(self) -> None:
+        """ Removes the least recently written or loaded entries until the disk store fits into max_disk_bytes """
+        with self._disk_lock:
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            # Rescan, since other processes may share entries_dir
+            entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+            self._disk_bytes = sum(size for _, _, size in entries)
+
+            for key, _, size in entries:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+
+                for path in self._disk_paths(key):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._disk_bytes -= size
+
+    def lookup(self, key: str) -> Optional[CachedResponse]:
+        entry = self._memory.get(key)
+
+        if entry is None and self.cache_dir is not None:
+            entry = CachedResponse.load(*self._disk_paths(key))
+            if entry is not None:
+                self._memory.set(key, entry)
+                try:
+                    os.utime(self._disk_paths(key)[0])
+                except OSError:
+                    pass
+
+        return entry
+
+    def store(self, key: str, entry: CachedResponse) -> None:
+        self._memory.set(key, entry)
+
+        if self.cache_dir is not None:
+            with self._disk_lock:
+                previous_size = self._disk_size(key)
+                entry.save(*self._disk_paths(key))
+                self._disk_bytes += self._disk_size(key) - previous_size
+
+            self._evict_from_disk()
+
+    def remove(self, key: str) -> None:
+        self._memory.pop(key)
+
+        if self.cache_dir is not None:
+            self._remove_from_disk(key)
+
+    def clear(self) -> None:
+        """ Removes all entries. Files in cache_dir outside of entries_dir are left untouched """
+        self._memory.clear()
+
+        if self.cache_dir is not None:
+            with self._disk_lock:
+                for file_name in os.listdir(self.entries_dir):
+                    try:
+                        os.remove(os.path.join(self.entries_dir, file_name))
+                    except FileNotFoundError:
+                        pass
+
+                self._disk_bytes = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def freshness_lifetime(self, headers: Headers, now: float) -> float:
+        """ Returns the number of seconds a response with the given headers is fresh for, from now """
+        cache_control = parse_cache_control(headers.get("cache-control"))
+        if "no-cache" in cache_control:
+            return 0.0
+
+        date = parse_http_date(headers.get("date")) or now
+        age = parse_seconds(headers.get("age")) or 0
+
+        max_age = parse_seconds(cache_control.get("max-age"))
+        if max_age is not None:
+            return max_age - age
+
+        expires = parse_http_date(headers.get("expires"))
+        if expires is not None:
+            return expires - date - age
+        if "expires" in headers:
+            # Invalid dates, e.g. "0", represent a time in the past
+            return 0.0
+
+        last_modified = parse_http_date(headers.get("last-modified"))
+        if last_modified is not None:
+            return min(self.heuristic_fraction * max(date - last_modified, 0), self.max_heuristic_lifetime) - age
+
+        return 0.0
+
+    def _entry(self, url: str, status_code: int, headers: Headers, content: bytes) -> Optional[CachedResponse]:
+        """ Creates a cache entry from a response, or returns None if it must not be cached """
+        cache_control = parse_cache_control(headers.get("cache-control"))
+        vary = {value.strip().lower() for value in headers.get("vary", "").split(",") if value.strip()}
+
+        if status_code not in CACHEABLE_STATUS_CODES or "no-store" in cache_control or vary - {"accept-encoding"}:
+            return None
+
+        now = self._timer()
+        lifetime = self.freshness_lifetime(headers, now)
+        if lifetime <= 0 and "etag" not in headers and "last-modified" not in headers:
+            return None
+
+        return CachedResponse(
+            url=url,
+            status_code=status_code,
+            headers=[(name, value) for name, value in headers.items() if name.lower() not in UNCACHED_HEADERS],
+            content=content,
+            stored_at=now,
+            expires_at=now + lifetime,
+        )
+
+    def begin(self, url: str, headers: Optional[Mapping[str, str]] = None) -> CacheLookup:
+        """ Looks up url before sending a request. If the lookup holds a response, it is fresh and no request needs to be sent """
+        headers = Headers(headers)
+        key = self.cache_key(url, headers)
+        request_cache_control = parse_cache_control(headers.get("cache-control"))
+
+        if "no-store" in request_cache_control:
+            return CacheLookup(key=key, entry=None, response=None, headers=headers, store=False)
+
+        entry = self.lookup(key)
+        if entry is None:
+            return CacheLookup(key=key, entry=None, response=None, headers=headers, store=True)
+
+        if entry.is_fresh(self._timer()) and "no-cache" not in request_cache_control and request_cache_control.get("max-age") != "0":
+            self._count("hits")
+            return CacheLookup(key=key, entry=entry, response=entry.to_response(Request("GET", url, headers=headers)), headers=headers, store=True)
+
+        if entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        return CacheLookup(key=key, entry=entry, response=None, headers=headers, store=True)
+
+    def complete(self, lookup: CacheLookup, url: str, response: Response) -> Response:
+        """ Stores the response to a request prepared using begin. Returns the cached response, refreshed by the new headers, if it was not modified """
+        if response.status_code == HTTPStatus.NOT_MODIFIED and lookup.entry is not None:
+            self._count("revalidated")
+
+            headers = Headers(lookup.entry.headers)
+            headers.update({name: value for name, value in response.headers.items() if name.lower() not in UNCACHED_HEADERS})
+
+            entry = self._entry(url, lookup.entry.status_code, headers, lookup.entry.content)
+            if entry is not None:
+                self.store(lookup.key, entry)
+            else:
+                self.remove(lookup.key)
+
+            return Response(lookup.entry.status_code, headers=headers, content=lookup.entry.content, request=response.request)
+
+        self._count("misses")
+
+        if lookup.store:
+            entry = self._entry(url, response.status_code, response.headers, response.content)
+            if entry is not None:
+                self.store(lookup.key, entry)
+
+        return response
+
+    def send(self, url: str, headers: Optional[Mapping[str, str]], send: Callable[[Headers], Response]) -> Response:
+        """ Returns a fresh cached response for url, or calls send with the headers to send and caches its response """
+        lookup = self.begin(url, headers)
+        if lookup.response is not None:
+            return lookup.response
+
+        return self.complete(lookup, url, send(lookup.headers))
+
+    async def send_async(self, url: str, headers: Optional[Mapping[str, str]], send: Callable[[Headers], Awaitable[Response]]) -> Response:
+        """ See send """
+        lookup = self.begin(url, headers)
+        if lookup.response is not None:
+            return lookup.response
+
+        return self.complete(lookup, url, await send(lookup.headers))
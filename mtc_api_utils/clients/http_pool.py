@@ -0,0 +1,133 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+from datetime import timedelta
+from threading import Lock
+from typing import Dict, Optional
+from weakref import WeakKeyDictionary
+
+from httpx import AsyncClient, Client, Limits, Timeout, URL
+
+
+def backend_key(backend_url: str) -> str:
+    """ Identifies a backend by the scheme, host & port of its url, such that all clients for the same backend share one connection pool """
+    url = URL(backend_url)
+    return f"{url.scheme}://{url.netloc.decode('ascii')}"
+
+
+class HttpClientPool:
+    """
+    Creates & caches one httpx client per backend, such that connections to a backend are kept alive & reused across ApiClient instances.
+
+    Sync clients are shared by all threads, async clients are created per event loop, since httpx connections cannot be shared across event loops. Use the
+    pool as a (async) context manager or call close() / aclose() in order to close its clients. The default_client_pool is closed on interpreter exit.
+
+    Parameters:
+        * max_connections: The maximum number of concurrent connections per backend.
+        * max_keepalive_connections: The maximum number of idle connections kept alive per backend.
+        * keepalive_expiry: Idle connections are closed after this duration.
+        * timeout: The default timeout of requests, which can be overridden per request.
+        * http2: Use HTTP/2 where supported by the backend. Requires the h2 package: pip install httpx[http2]
+
+    Example usage:
+        async with HttpClientPool(max_connections=50, http2=True) as pool:
+            client = ApiClient(backend_url="http://model-api:5000", client_pool=pool)
+    """
+
+    def __init__(
+            self,
+            max_connections: Optional[int] = 100,
+            max_keepalive_connections: Optional[int] = 20,
+            keepalive_expiry: Optional[timedelta] = timedelta(seconds=30),
+            timeout: Optional[float] = 5.0,
+            http2: bool = False,
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise ImportError("HTTP/2 support requires the h2 package: pip install httpx[http2]")
+
+        self.limits = Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry.total_seconds() if keepalive_expiry is not None else None,
+        )
+        self.timeout = Timeout(timeout)
+        self.http2 = http2
+
+        self._clients: Dict[str, Client] = {}
+        self._async_clients: WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncClient]] = WeakKeyDictionary()
+        self._lock = Lock()
+
+    def client(self, backend_url: str) -> Client:
+        """ Returns the sync client for backend_url's backend """
+        key = backend_key(backend_url)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = Client(limits=self.limits, timeout=self.timeout, http2=self.http2)
+                self._clients[key] = client
+
+        return client
+
+    def async_client(self, backend_url: str) -> AsyncClient:
+        """
+        Returns the async client for backend_url's backend and the running event loop. If no event loop is running, e.g. while setting up a client, a new
+        client is returned, which is not pooled and has to be closed by the caller
+        """
+        key = backend_key(backend_url)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+
+        with self._lock:
+            loop_clients = self._async_clients.setdefault(loop, {})
+
+            client = loop_clients.get(key)
+            if client is None or client.is_closed:
+                client = AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+                loop_clients[key] = client
+
+        return client
+
+    def close(self) -> None:
+        """ Closes all sync clients. Async clients are closed by aclose(), they are released along with their event loop otherwise """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """ Closes all sync clients and the async clients of the running event loop """
+        with self._lock:
+            async_clients = list(self._async_clients.pop(asyncio.get_running_loop(), {}).values())
+
+        for client in async_clients:
+            await client.aclose()
+
+        self.close()
+
+    def __enter__(self) -> HttpClientPool:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    async def __aenter__(self) -> HttpClientPool:
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+
+default_client_pool = HttpClientPool()
+atexit.register(default_client_pool.close)
@@ -0,0 +1,177 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+Client-side load balancing across the replicas of a backend, based on the number of outstanding requests per replica.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from enum import Enum
+from threading import Lock
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set
+
+import httpx
+from httpx import Response
+
+from mtc_api_utils.api_types import ApiStatus
+from mtc_api_utils.clients.resilience import is_failure
+
+
+class BalancingStrategy(Enum):
+    value: str
+
+    least_outstanding = "least_outstanding"
+    power_of_two = "power_of_two"
+
+
+class Replica:
+    """ The load balancing state of a single replica """
+
+    def __init__(self, url: str, weight: float = 1.0):
+        self.url = url
+        self.weight = weight
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def load(self) -> float:
+        """ The outstanding requests relative to the replica's weight, including the request about to be sent """
+        return (self.outstanding + 1) / self.weight
+
+    def __repr__(self) -> str:
+        return f"Replica(url={self.url}, weight={self.weight}, outstanding={self.outstanding})"
+
+
+class ReplicaSet:
+    """
+    Chooses a replica for each request, either the replica with the least outstanding requests relative to its weight, or the less loaded one of two random
+    replicas (power of two choices), which avoids all clients sending their requests to the same idle replica.
+
+    Replicas are ejected passively: after ejection_threshold consecutive failed requests, or if their /api/status reports them as not ready, replicas receive no
+    requests for ejection_duration. If all replicas are ejected, requests are balanced across all of them. Weights are updated from /api/status using
+    update_status, such that e.g. replicas with a GPU receive gpu_weight times as many requests as CPU replicas.
+
+    Example usage:
+        replica_set = ReplicaSet(["http://model-api-0:5000", "http://model-api-1:5000"], strategy=BalancingStrategy.least_outstanding)
+        client = ApiClient(backend_url="http://model-api:5000", replica_set=replica_set)
+        await client.refresh_replicas_async()
+    """
+
+    def __init__(
+            self,
+            replica_urls: List[str],
+            strategy: BalancingStrategy = BalancingStrategy.power_of_two,
+            gpu_weight: float = 4.0,
+            cpu_weight: float = 1.0,
+            ejection_threshold: int = 3,
+            ejection_duration: timedelta = timedelta(seconds=30),
+            timer: Callable[[], float] = time.monotonic,
+            rng: Optional[random.Random] = None,
+    ):
+        if not replica_urls:
+            raise ValueError("ReplicaSet requires at least one replica")
+
+        self.replicas: Dict[str, Replica] = {url: Replica(url) for url in replica_urls}
+        self.strategy = strategy
+        self.gpu_weight = gpu_weight
+        self.cpu_weight = cpu_weight
+        self.ejection_threshold = ejection_threshold
+        self.ejection_duration = ejection_duration.total_seconds()
+
+        self._timer = timer
+        self._rng = rng or random.Random()
+        self._lock = Lock()
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self.replicas)
+
+    def available(self) -> List[Replica]:
+        """ Returns the replicas which are not ejected """
+        now = self._timer()
+        return [replica for replica in self.replicas.values() if replica.ejected_until <= now]
+
+    def choose(self, exclude: Optional[Set[str]] = None) -> Replica:
+        """ Chooses a replica according to strategy, excluding the given urls unless no other replica exists """
+        with self._lock:
+            candidates = self.available() or list(self.replicas.values())
+            candidates = [replica for replica in candidates if replica.url not in (exclude or set())] or candidates
+
+            if self.strategy == BalancingStrategy.power_of_two and len(candidates) > 2:
+                candidates = self._rng.sample(candidates, 2)
+
+            min_load = min(replica.load for replica in candidates)
+            return self._rng.choice([replica for replica in candidates if replica.load == min_load])
+
+    @contextmanager
+    def track(self, replica: Replica) -> Iterator[Replica]:
+        """ Counts a request to replica as outstanding while the context is active """
+        with self._lock:
+            replica.outstanding += 1
+
+        try:
+            yield replica
+        finally:
+            with self._lock:
+                replica.outstanding -= 1
+
+    def _eject(self, replica: Replica) -> None:
+        replica.ejected_until = self._timer() + self.ejection_duration
+
+    def record(self, replica: Replica, response: Optional[Response], error: Optional[Exception]) -> None:
+        """ Records the outcome of a request to replica, ejecting it after ejection_threshold consecutive failures """
+        with self._lock:
+            if not is_failure(response, error):
+                replica.consecutive_failures = 0
+                return
+
+            replica.consecutive_failures += 1
+            if replica.consecutive_failures >= self.ejection_threshold:
+                self._eject(replica)
+
+    def update_status(self, replica_url: str, status: Optional[ApiStatus]) -> None:
+        """ Updates a replica's weight from its status, or ejects it if it is not ready. Pass None if the replica could not be reached """
+        replica = self.replicas[replica_url]
+
+        with self._lock:
+            if status is None or not status.readiness:
+                self._eject(replica)
+                return
+
+            replica.weight = self.gpu_weight if status.gpu_enabled else self.cpu_weight
+            replica.consecutive_failures = 0
+            replica.ejected_until = 0.0
+
+    def send(self, send: Callable[[str], Response], replica: Optional[Replica] = None) -> Response:
+        """ Calls send with the url of the chosen replica, tracking the request & recording its outcome """
+        replica = replica or self.choose()
+
+        with self.track(replica):
+            try:
+                response = send(replica.url)
+            except httpx.TransportError as e:
+                self.record(replica, None, e)
+                raise
+
+        self.record(replica, response, None)
+        return response
+
+    async def send_async(self, send: Callable[[str], Awaitable[Response]], replica: Optional[Replica] = None) -> Response:
+        """ See send """
+        replica = replica or self.choose()
+
+        with self.track(replica):
+            try:
+                response = await send(replica.url)
+            except httpx.TransportError as e:
+                self.record(replica, None, e)
+                raise
+
+        self.record(replica, response, None)
+        return response
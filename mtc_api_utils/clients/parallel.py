@@ -0,0 +1,172 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+A request engine for fanning out many HTTP requests concurrently, while bounding the number of requests in flight.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+
+import httpx
+from httpx import AsyncClient, Response
+
+from mtc_api_utils.clients.backoff import ExponentialBackoff
+from mtc_api_utils.clients.http_cache import HttpCache
+from mtc_api_utils.clients.resilience import CircuitOpenError, IDEMPOTENT_METHODS, RETRY_STATUS_CODES
+
+
+class RequestSpec(NamedTuple):
+    url: str
+    method: str = "GET"
+    json: Optional[Any] = None
+    headers: Optional[Dict[str, str]] = None
+
+
+class RequestResult(NamedTuple):
+    """ The outcome of a single request. error is set if the request failed after all retries, or if raise_for_status is set and the status is not 2xx """
+    index: int
+    request: RequestSpec
+    response: Optional[Response]
+    error: Optional[Exception]
+    attempts: int
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.response is not None
+
+
+class ParallelResults(NamedTuple):
+    """ The results of a parallel run, in the order of the requests """
+    results: List[RequestResult]
+
+    @property
+    def responses(self) -> Dict[str, Optional[Response]]:
+        """ Maps each url to its response, or None if it failed. If a url was requested several times, the last request's response is returned """
+        return {result.request.url: result.response for result in self.results}
+
+    @property
+    def errors(self) -> Dict[str, Exception]:
+        """ Maps the url of each failed request to its error """
+        return {result.request.url: result.error for result in self.results if result.error is not None}
+
+    def raise_first_error(self) -> None:
+        for result in self.results:
+            if result.error is not None:
+                raise result.error
+
+
+class ParallelRequester:
+    """
+    Sends requests concurrently using a shared AsyncClient, with at most max_concurrency requests in flight.
+
+    Each request is retried up to retries times on transport errors and on retry_status_codes, using exponential backoff with jitter, given its method is
+    one of retry_methods. By default only idempotent methods are retried. If http_cache is given, GET requests are answered from the cache while fresh,
+    without waiting for the semaphore. Pass send in order to send requests through e.g. an ApiClient's retry policy & circuit breaker, instead of
+    client.request.
+
+    Example usage:
+        requester = ParallelRequester(client=api_client.async_client, max_concurrency=32, timeout_seconds=5, retries=2)
+
+        async for result in requester.iter_results([RequestSpec(url) for url in urls]):
+            print(result.request.url, result.response.status_code if result.ok else result.error)
+    """
+
+    def __init__(
+            self,
+            client: AsyncClient,
+            max_concurrency: int = 16,
+            timeout_seconds: Optional[float] = None,
+            retries: int = 0,
+            backoff: Optional[ExponentialBackoff] = None,
+            retry_methods: FrozenSet[str] = IDEMPOTENT_METHODS,
+            retry_status_codes: FrozenSet[int] = RETRY_STATUS_CODES,
+            follow_redirects: bool = False,
+            raise_for_status: bool = False,
+            http_cache: Optional[HttpCache] = None,
+            send: Optional[Callable[..., Awaitable[Response]]] = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.retries = retries
+        self.backoff = backoff or ExponentialBackoff()
+        self.retry_methods = retry_methods
+        self.retry_status_codes = retry_status_codes
+        self.follow_redirects = follow_redirects
+        self.raise_for_status = raise_for_status
+        self.http_cache = http_cache
+        self.send = send if send is not None else client.request
+
+    async def iter_results(self, requests: Iterable[RequestSpec]) -> AsyncIterator[RequestResult]:
+        """ Yields results as requests complete. Pending requests are cancelled if the iteration is stopped early """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = [asyncio.ensure_future(self._send(index, request, semaphore)) for index, request in enumerate(requests)]
+
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run(self, requests: Iterable[RequestSpec]) -> ParallelResults:
+        """ Sends all requests and returns their results in the order of the requests """
+        results = [result async for result in self.iter_results(requests)]
+        return ParallelResults(results=sorted(results, key=lambda result: result.index))
+
+    async def _send(self, index: int, request: RequestSpec, semaphore: asyncio.Semaphore) -> RequestResult:
+        retries = self.retries if request.method.upper() in self.retry_methods else 0
+        delays = self.backoff.delays()
+
+        lookup = self.http_cache.begin(request.url, request.headers) if self.http_cache is not None and request.method.upper() == "GET" else None
+        if lookup is not None and lookup.response is not None:
+            return RequestResult(index=index, request=request, response=lookup.response, error=None, attempts=0)
+
+        response: Optional[Response] = None
+        error: Optional[Exception] = None
+
+        attempt = 0
+        while True:
+            attempt += 1
+            response, error = None, None
+
+            async with semaphore:
+                try:
+                    response = await self.send(
+                        method=request.method,
+                        url=request.url,
+                        json=request.json,
+                        headers=lookup.headers if lookup is not None else request.headers,
+                        timeout=self.timeout_seconds,
+                        follow_redirects=self.follow_redirects,
+                    )
+                except (httpx.HTTPError, httpx.InvalidURL) as e:
+                    error = e
+
+            if error is not None:
+                retryable = isinstance(error, httpx.TransportError) and not isinstance(error, CircuitOpenError)
+            else:
+                retryable = response.status_code in self.retry_status_codes
+
+            if not retryable or attempt > retries:
+                break
+
+            # Sleep outside of the semaphore, such that waiting retries do not block other requests
+            await asyncio.sleep(next(delays))
+
+        if lookup is not None and response is not None:
+            response = self.http_cache.complete(lookup, request.url, response)
+
+        if error is None and self.raise_for_status:
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                error = e
+
+        return RequestResult(index=index, request=request, response=response, error=error, attempts=attempt)
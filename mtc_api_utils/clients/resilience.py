@@ -0,0 +1,279 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+Retry policies, retry budgets & circuit breakers, which protect overloaded backends from being flooded with retries & timeouts.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from datetime import timedelta
+from enum import Enum
+from http import HTTPStatus
+from threading import Lock
+from typing import Callable, Deque, Dict, FrozenSet, Iterator, Optional
+
+import httpx
+from httpx import Response
+
+from mtc_api_utils.clients.backoff import ExponentialBackoff
+from mtc_api_utils.clients.http_pool import backend_key
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUS_CODES = frozenset({HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.GATEWAY_TIMEOUT})
+
+
+class CircuitOpenError(httpx.TransportError):
+    """ Raised instead of sending a request to a backend whose circuit breaker is open. Subclasses TransportError, such that it is handled like an unreachable
+    backend by existing code """
+
+
+class CircuitState(Enum):
+    value: str
+
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+def is_failure(response: Optional[Response], error: Optional[Exception]) -> bool:
+    """ Whether the outcome of a request indicates that the backend is unavailable or overloaded """
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+
+    return response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR or response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the requests sent within a sliding window, such that retries cannot multiply the load on a failing backend.
+
+    Parameters:
+        * ratio: The number of retries allowed per request, e.g. 0.2 allows one retry for every five requests.
+        * min_retries: The number of retries allowed within window regardless of ratio, such that clients sending few requests can still retry.
+        * window: The duration over which requests & retries are counted.
+    """
+
+    def __init__(
+            self,
+            ratio: float = 0.2,
+            min_retries: int = 10,
+            window: timedelta = timedelta(seconds=10),
+            timer: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window.total_seconds()
+
+        self._timer = timer
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self._lock = Lock()
+
+    def _prune(self, now: float) -> None:
+        for timestamps in (self._requests, self._retries):
+            while timestamps and timestamps[0] <= now - self.window:
+                timestamps.popleft()
+
+    def record_request(self) -> None:
+        with self._lock:
+            now = self._timer()
+            self._prune(now)
+            self._requests.append(now)
+
+    def try_acquire_retry(self) -> bool:
+        """ Returns true and counts the retry if the budget allows another retry """
+        with self._lock:
+            now = self._timer()
+            self._prune(now)
+
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed request is retried & how long to wait before the retry.
+
+    Requests are retried on transport errors & retry_status_codes, given their method is one of retry_methods. Requests rejected by an open circuit breaker are
+    never retried. Pass idempotent=True to ApiClient.request in order to retry e.g. a side effect free inference POST.
+
+    Parameters:
+        * max_retries: The maximum number of retries per request.
+        * backoff: The delays between retries. Defaults to exponential backoff with full jitter.
+        * budget: An optional RetryBudget, which is shared by all requests using this policy.
+    """
+
+    def __init__(
+            self,
+            max_retries: int = 2,
+            backoff: Optional[ExponentialBackoff] = None,
+            retry_methods: FrozenSet[str] = IDEMPOTENT_METHODS,
+            retry_status_codes: FrozenSet[int] = RETRY_STATUS_CODES,
+            budget: Optional[RetryBudget] = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff or ExponentialBackoff()
+        self.retry_methods = retry_methods
+        self.retry_status_codes = retry_status_codes
+        self.budget = budget
+
+    def delays(self) -> Iterator[float]:
+        return self.backoff.delays()
+
+    def record_request(self) -> None:
+        if self.budget is not None:
+            self.budget.record_request()
+
+    def should_retry(
+            self,
+            method: str,
+            attempt: int,
+            response: Optional[Response],
+            error: Optional[Exception],
+            idempotent: Optional[bool] = None,
+    ) -> bool:
+        """ Whether to retry after the given attempt, counting from 0. Acquires a retry from the budget if the request is retried """
+        if attempt >= self.max_retries:
+            return False
+
+        if not (idempotent if idempotent is not None else method.upper() in self.retry_methods):
+            return False
+
+        if error is not None:
+            retryable = isinstance(error, httpx.TransportError) and not isinstance(error, CircuitOpenError)
+        else:
+            retryable = response.status_code in self.retry_status_codes
+
+        return retryable and (self.budget is None or self.budget.try_acquire_retry())
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a failing backend, such that requests fail fast instead of piling up as timeouts.
+
+    The breaker opens after failure_threshold consecutive failures. While open, requests are rejected with a CircuitOpenError. After reset_timeout, the breaker
+    becomes half open & lets up to half_open_max_calls probe requests through: it closes if a probe succeeds and opens again if a probe fails.
+    """
+
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            reset_timeout: timedelta = timedelta(seconds=30),
+            half_open_max_calls: int = 1,
+            timer: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout.total_seconds()
+        self.half_open_max_calls = half_open_max_calls
+
+        self._timer = timer
+        self._state = CircuitState.closed
+        self._num_failures = 0
+        self._num_probes = 0
+        self._opened_at = 0.0
+        self._lock = Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> CircuitState:
+        if self._state == CircuitState.open and self._timer() - self._opened_at >= self.reset_timeout:
+            self._state = CircuitState.half_open
+            self._num_probes = 0
+
+        return self._state
+
+    def _open(self) -> None:
+        self._state = CircuitState.open
+        self._opened_at = self._timer()
+        self._num_probes = 0
+
+    def allow_request(self) -> bool:
+        """ Returns true if a request may be sent. In the half open state, this counts the request as a probe """
+        with self._lock:
+            state = self._current_state()
+
+            if state == CircuitState.closed:
+                return True
+
+            if state == CircuitState.half_open and self._num_probes < self.half_open_max_calls:
+                self._num_probes += 1
+                return True
+
+            return False
+
+    def before_request(self, url: str = "") -> None:
+        """ Raises a CircuitOpenError if no request may be sent """
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit breaker is open, not sending request: {url}")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CircuitState.closed
+            self._num_failures = 0
+            self._num_probes = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            state = self._current_state()
+
+            if state == CircuitState.half_open:
+                self._open()
+            elif state == CircuitState.closed:
+                self._num_failures += 1
+                if self._num_failures >= self.failure_threshold:
+                    self._open()
+
+    def release(self) -> None:
+        """ Releases the probe slot of a request which was allowed but never completed, e.g. because it was cancelled, without recording an outcome """
+        with self._lock:
+            if self._current_state() == CircuitState.half_open and self._num_probes > 0:
+                self._num_probes -= 1
+
+    def record(self, response: Optional[Response], error: Optional[Exception]) -> None:
+        if isinstance(error, CircuitOpenError):
+            return
+
+        if is_failure(response, error):
+            self.record_failure()
+        else:
+            self.record_success()
+
+
+class CircuitBreakerRegistry:
+    """
+    Creates & caches one CircuitBreaker per backend, such that all ApiClients calling the same backend share its breaker.
+
+    Example usage:
+        breakers = CircuitBreakerRegistry(lambda: CircuitBreaker(failure_threshold=3, reset_timeout=timedelta(seconds=10)))
+        client = ApiClient(backend_url="http://model-api:5000", retry_policy=RetryPolicy(budget=RetryBudget()), circuit_breakers=breakers)
+    """
+
+    def __init__(self, breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker):
+        self.breaker_factory = breaker_factory
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = Lock()
+
+    def breaker(self, backend_url: str) -> CircuitBreaker:
+        key = backend_key(backend_url)
+
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = self.breaker_factory()
+
+            return self._breakers[key]
+
+    def states(self) -> Dict[str, CircuitState]:
+        with self._lock:
+            breakers = dict(self._breakers)
+
+        return {key: breaker.state for key, breaker in breakers.items()}
@@ -0,0 +1,137 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import timedelta
+from enum import Enum
+from http import HTTPStatus
+from typing import Dict, Mapping, Optional
+
+from fastapi import HTTPException
+
+from mtc_api_utils.api_types import ServiceStatus, ServiceGroupStatus
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.backoff import ExponentialBackoff
+
+
+class ReadinessPolicy(Enum):
+    value: str
+
+    all = "all"
+    any = "any"
+    at_least = "at_least"
+
+
+class ServiceGroup:
+    """
+    Probes a group of services concurrently, e.g. all model backends of a gateway, such that waiting for the group takes as long as the slowest service rather
+    than the sum of all services.
+
+    The latest status & probe latency of each service is available in statuses, which is updated as probes complete.
+
+    Example usage:
+        group = ServiceGroup.from_urls({"asr": "http://asr-api:5000", "translation": "http://translation-api:5000"})
+        await group.wait_until_ready(policy=ReadinessPolicy.all, timeout=timedelta(minutes=5))
+    """
+
+    def __init__(self, clients: Mapping[str, ApiClient]):
+        self.clients: Dict[str, ApiClient] = dict(clients)
+        self.statuses: Dict[str, ServiceStatus] = {
+            name: ServiceStatus(name=name, backend_url=client.backend_url) for name, client in self.clients.items()
+        }
+
+    @classmethod
+    def from_urls(cls, backend_urls: Mapping[str, str], **client_kwargs) -> ServiceGroup:
+        return cls({name: ApiClient(backend_url=backend_url, **client_kwargs) for name, backend_url in backend_urls.items()})
+
+    @property
+    def status(self) -> ServiceGroupStatus:
+        return ServiceGroupStatus(services={name: status.copy() for name, status in self.statuses.items()})
+
+    async def probe(self, name: str, timeout_seconds: Optional[float] = None) -> ServiceStatus:
+        """ Sends a single readiness probe to a service and records its status """
+        start = time.perf_counter()
+        response, is_ready = await self.clients[name].get_readiness_async(timeout_seconds)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        status = self.statuses[name].copy(update={
+            "is_live": response is not None,
+            "is_ready": is_ready,
+            "latency_ms": latency_ms,
+            "num_probes": self.statuses[name].num_probes + 1,
+        })
+        self.statuses[name] = status
+
+        return status
+
+    async def probe_all(self) -> ServiceGroupStatus:
+        """ Probes all services once, concurrently """
+        await asyncio.gather(*[self.probe(name) for name in self.clients])
+        return self.status
+
+    def required_ready(self, policy: ReadinessPolicy, min_ready: Optional[int] = None) -> int:
+        if policy == ReadinessPolicy.all:
+            return len(self.clients)
+        if policy == ReadinessPolicy.any:
+            return 1
+
+        if min_ready is None or not 1 <= min_ready <= len(self.clients):
+            raise ValueError(f"ReadinessPolicy.at_least requires 1 <= min_ready <= {len(self.clients)}, got {min_ready}")
+        return min_ready
+
+    async def wait_until_ready(
+            self,
+            policy: ReadinessPolicy = ReadinessPolicy.all,
+            min_ready: Optional[int] = None,
+            timeout: timedelta = timedelta(minutes=3),
+            backoff: Optional[ExponentialBackoff] = None,
+    ) -> ServiceGroupStatus:
+        """
+        Probes all services concurrently, each using its own exponential backoff, until the policy is satisfied: all services are ready, any service is ready,
+        or at least min_ready services are ready. Returns the group status as soon as the policy is satisfied. Raises 503 SERVICE UNAVAILABLE on timeout
+        """
+        if not self.clients:
+            raise ValueError("Cannot wait for an empty ServiceGroup")
+
+        required = self.required_ready(policy, min_ready)
+        deadline = time.monotonic() + timeout.total_seconds()
+        satisfied = asyncio.Event()
+
+        async def poll(name: str) -> None:
+            delays = (backoff or ExponentialBackoff()).delays()
+
+            while not satisfied.is_set():
+                remaining = deadline - time.monotonic()
+                client = self.clients[name]
+                status = await self.probe(name, max(min(client.base_route_timeout_seconds, remaining), 0.001))
+
+                if status.is_ready:
+                    if sum(s.is_ready for s in self.statuses.values()) >= required:
+                        satisfied.set()
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+
+                await asyncio.sleep(min(next(delays), remaining))
+
+        pollers = [asyncio.ensure_future(poll(name)) for name in self.clients]
+
+        try:
+            await asyncio.wait_for(satisfied.wait(), timeout=timeout.total_seconds())
+        except asyncio.TimeoutError:
+            status = self.status
+            raise HTTPException(
+                detail=f"Only {status.num_ready} of the required {required} services became ready before timeout: {timeout}. Not ready: {status.not_ready}",
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            )
+        finally:
+            for poller in pollers:
+                poller.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+
+        return self.status
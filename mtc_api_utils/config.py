@@ -114,10 +114,14 @@ class Config(ConfigBuilder):
     gpu_supported = ConfigBuilder.parse_env_var("GPU_SUPPORTED", convert_type=bool, default="False")
     gpu_enabled = ConfigBuilder.parse_env_var("GPU_ENABLED", convert_type=bool, default="False")
     backend_url: str = ConfigBuilder.parse_env_var("BACKEND_URL", default="http://localhost:5000")
+    readiness_cache_ttl_seconds: float = ConfigBuilder.parse_env_var("READINESS_CACHE_TTL_SECONDS", default="0", convert_type=float)
 
     # Auth
     cors_allow_origins: List[str] = ConfigBuilder.parse_env_var("CORS_ALLOW_ORIGINS", convert_type=list, default="http://localhost,http://localhost:80,http://localhost:8080")
     auth_enabled: bool = ConfigBuilder.parse_env_var("AUTH_ENABLED", convert_type=bool, default="False")
+    token_cache_ttl_seconds: float = ConfigBuilder.parse_env_var("TOKEN_CACHE_TTL_SECONDS", default="300", convert_type=float)
+    token_cache_max_entries: int = ConfigBuilder.parse_env_var("TOKEN_CACHE_MAX_ENTRIES", default="4096", convert_type=int)
+    token_check_revoked: bool = ConfigBuilder.parse_env_var("TOKEN_CHECK_REVOKED", default="False", convert_type=bool)
 
     # Firebase
     # Required for firebase auth verification
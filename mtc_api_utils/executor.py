@@ -0,0 +1,106 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from threading import Lock
+from typing import Callable, TypeVar, Optional, Tuple, Any
+
+from fastapi import HTTPException
+
+Res = TypeVar("Res")
+
+
+def inference_overloaded_exception(retry_after_seconds: int) -> HTTPException:
+    return HTTPException(
+        status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+        detail="The api is currently overloaded and cannot accept more inference requests. Please retry later",
+        headers={"Retry-After": str(retry_after_seconds)},
+    )
+
+
+class InferenceExecutor:
+    """
+    A dedicated, bounded executor for blocking inference calls.
+
+    At most max_concurrency calls are executed at the same time and at most max_queue_depth further calls wait for a free worker. Any call beyond that fails
+    fast with 503 SERVICE UNAVAILABLE and a Retry-After header instead of piling up, which keeps latency predictable under overload. Inference does not run on
+    Starlette's shared threadpool and therefore cannot starve other sync routes.
+
+    Parameters:
+        * max_concurrency: The number of worker threads/processes.
+        * max_queue_depth: The number of calls that may wait for a free worker before new calls are rejected.
+        * use_processes: Use a process pool instead of a thread pool, e.g. for CPU bound models that hold the GIL. Functions and arguments must be picklable.
+        * retry_after_seconds: The value of the Retry-After header sent along with rejected calls.
+        * initializer, initargs: Passed on to the underlying pool in order to initialize each worker.
+    """
+
+    def __init__(
+            self,
+            max_concurrency: int = 1,
+            max_queue_depth: int = 16,
+            use_processes: bool = False,
+            retry_after_seconds: int = 1,
+            initializer: Optional[Callable[..., Any]] = None,
+            initargs: Tuple[Any, ...] = (),
+    ):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        if max_queue_depth < 0:
+            raise ValueError(f"max_queue_depth must not be negative, got {max_queue_depth}")
+
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.use_processes = use_processes
+        self.retry_after_seconds = retry_after_seconds
+
+        self.initializer = initializer
+        self.initargs = initargs
+        self._pool: Optional[Executor] = None
+
+        self._num_pending = 0
+        self._lock = Lock()
+
+    @property
+    def num_pending(self) -> int:
+        """ The number of calls that are currently running or waiting for a free worker """
+        return self._num_pending
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            pool_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._pool = pool_cls(max_workers=self.max_concurrency, initializer=self.initializer, initargs=self.initargs)
+
+        return self._pool
+
+    async def run(self, func: Callable[..., Res], *args, **kwargs) -> Res:
+        """ Runs func on a worker and returns its result. Raises a 503 HTTPException if the executor is overloaded """
+        with self._lock:
+            if self._num_pending >= self.max_concurrency + self.max_queue_depth:
+                raise inference_overloaded_exception(self.retry_after_seconds)
+
+            self._num_pending += 1
+
+        try:
+            future = self.pool.submit(partial(func, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+
+        # Release the slot once the call has actually finished, even if the awaiting request is cancelled before that
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._num_pending -= 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
@@ -6,14 +6,219 @@ This module is used to generically initiate our APIs by downloading artifacts fr
 image build time or at startup time.
 """
 
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import shutil
 import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
 from os import error, makedirs, path, remove
 from pathlib import Path
-from typing import Tuple
+from threading import Lock
+from typing import Tuple, NamedTuple, List, Optional, Iterator, Sequence, Any
 
-from httpx import get, stream, Response
+from httpx import get, head, stream, Response, Client, Limits, HTTPError
 from tqdm import tqdm
 
+from mtc_api_utils.artifact_cache import ArtifactCache
+
+# Artifacts are split into parts of this size for parallel downloads
+RANGE_PART_BYTES = 16 * 2 ** 20
+
+
+PART_FILE_SUFFIX = ".part"
+MANIFEST_FILE_SUFFIX = ".json"
+DIGEST_FILE_SUFFIX = ".digest"
+
+HASH_CHUNK_BYTES = 2 ** 20
+
+
+class ArtifactInfo(NamedTuple):
+    url: str
+    total_bytes: Optional[int]
+    accepts_ranges: bool
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def validator(self) -> Optional[str]:
+        """ The value used for If-Range headers, which ensures that a resumed download still refers to the same artifact version """
+        return self.etag or self.last_modified
+
+
+class DownloadManifest(NamedTuple):
+    """
+    Sidecar file of a partial download, which allows to resume the download after an interruption.
+    mode is either "stream", in which case the size of the part file is the number of downloaded bytes, or "ranges", in which case completed_ranges lists
+    the byte ranges which have been written to the preallocated part file.
+    """
+    url: str
+    total_bytes: Optional[int]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    mode: str
+    part_bytes: int = RANGE_PART_BYTES
+    completed_ranges: List[Tuple[int, int]] = []
+
+    @staticmethod
+    def load(manifest_path: str) -> Optional[DownloadManifest]:
+        try:
+            with open(manifest_path, 'r') as manifest_file:
+                manifest_dict = json.load(manifest_file)
+            manifest_dict["completed_ranges"] = [tuple(byte_range) for byte_range in manifest_dict.get("completed_ranges", [])]
+            return DownloadManifest(**manifest_dict)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, manifest_path: str) -> None:
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump(self._asdict(), manifest_file)
+        os.replace(tmp_path, manifest_path)
+
+    def matches(self, info: ArtifactInfo) -> bool:
+        """ True if the partial download refers to the same artifact version and can therefore be resumed """
+        return (
+                info.accepts_ranges
+                and info.validator is not None
+                and (self.etag, self.last_modified, self.total_bytes) == (info.etag, info.last_modified, info.total_bytes)
+        )
+
+
+class Checksum(NamedTuple):
+    """
+    The expected digest of an artifact, parsed from strings of the form "<algorithm>:<hex digest>", e.g. "sha256:9f86d08...".
+    All hashlib algorithms are supported, e.g. sha256 or blake2b, as well as xxh64, xxh3_64 & xxh3_128 given the optional xxhash package is installed.
+    """
+    algorithm: str
+    digest: str
+
+    @staticmethod
+    def parse(checksum: str) -> Checksum:
+        algorithm, separator, digest = checksum.partition(":")
+        if not separator or not digest:
+            raise ValueError(f"Expected a checksum of the form '<algorithm>:<hex digest>', got '{checksum}'")
+
+        parsed = Checksum(algorithm=algorithm.strip().lower(), digest=digest.strip().lower())
+        parsed.new_hasher()  # Fail early on unsupported algorithms
+        return parsed
+
+    def new_hasher(self) -> Any:
+        if self.algorithm.startswith("xxh"):
+            try:
+                import xxhash
+            except ImportError:
+                raise ImportError(f"{self.algorithm} checksums require the xxhash package: pip install xxhash")
+
+            if not hasattr(xxhash, self.algorithm):
+                raise ValueError(f"Unsupported xxhash algorithm: {self.algorithm}")
+            return getattr(xxhash, self.algorithm)()
+
+        return hashlib.new(self.algorithm)
+
+
+class DigestRecord(NamedTuple):
+    """
+    Sidecar file storing the digest of a verified artifact along with the artifact's size & modification time. As long as size & mtime are unchanged, the
+    stored digest is trusted, which allows to verify large artifacts on startup without hashing them again.
+    """
+    algorithm: str
+    digest: str
+    size_bytes: int
+    mtime_ns: int
+
+    @staticmethod
+    def load(digest_path: str) -> Optional[DigestRecord]:
+        try:
+            with open(digest_path, 'r') as digest_file:
+                return DigestRecord(**json.load(digest_file))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, digest_path: str) -> None:
+        tmp_path = f"{digest_path}.tmp"
+        with open(tmp_path, 'w') as digest_file:
+            json.dump(self._asdict(), digest_file)
+        os.replace(tmp_path, digest_path)
+
+    def matches(self, stat: os.stat_result, algorithm: str) -> bool:
+        """ True if the record was computed using algorithm for the file described by stat """
+        return (self.algorithm, self.size_bytes, self.mtime_ns) == (algorithm, stat.st_size, stat.st_mtime_ns)
+
+
+class TransferMonitor:
+    """
+    Reports download progress to a single tqdm progress bar and optionally throttles downloads to max_bytes_per_second. A monitor can be shared by several
+    concurrent downloads, e.g. by download_all_if_not_exist, in order to display their aggregated progress and enforce a global bandwidth cap.
+    """
+
+    def __init__(self, max_bytes_per_second: Optional[float] = None, description: Optional[str] = None):
+        self.max_bytes_per_second = max_bytes_per_second
+
+        self._progress = tqdm(total=0, desc=description, unit_scale=True, unit_divisor=1024, unit="B")
+        self._lock = Lock()
+        self._available_at = time.monotonic()
+
+    def add_total(self, num_bytes: int) -> None:
+        """ Adds the size of a download to the total of the progress bar """
+        with self._lock:
+            self._progress.total += num_bytes
+            self._progress.refresh()
+
+    def discard(self, total_bytes: int, transferred_bytes: int) -> None:
+        """ Removes a download from the progress bar, e.g. before it is restarted, such that its bytes are not counted twice """
+        with self._lock:
+            self._progress.total -= total_bytes
+            self._progress.n -= transferred_bytes
+            self._progress.refresh()
+
+    def update(self, num_bytes: int, throttle: bool = True) -> None:
+        """ Reports transferred bytes and blocks the calling thread for as long as required to stay below max_bytes_per_second """
+        with self._lock:
+            self._progress.update(num_bytes)
+
+            if not throttle or not self.max_bytes_per_second:
+                return
+
+            now = time.monotonic()
+            self._available_at = max(self._available_at, now) + num_bytes / self.max_bytes_per_second
+            delay = self._available_at - now
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self._progress.close()
+
+    def __enter__(self) -> TransferMonitor:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class RangeNotSupportedError(Exception):
+    """
+    Raised if the server does not answer a range request with 206 PARTIAL CONTENT
+    """
+
+
+class ArtifactDownloadError(Exception):
+    """
+    Raised if a downloaded artifact does not pass verification. The partial download is discarded in this case
+    """
+
+
+class ArtifactIntegrityError(ArtifactDownloadError):
+    """
+    Raised if the digest of a downloaded artifact does not match the expected checksum
+    """
+
 
 def stem_tar_filename(file_path: str) -> str:
     return Path(file_path).stem.split('.')[0]
@@ -44,28 +249,318 @@ def download_artifact(artifact_url: str, file_path: str, polybox_auth: Tuple[str
     return file_path
 
 
-def download_artifact_with_progress(artifact_url: str, file_path: str, polybox_auth: Tuple[str, str]) -> str:
-    print(f"Downloading artifact {artifact_url} to {file_path}")
+def probe_artifact(artifact_url: str, polybox_auth: Tuple[str, str]) -> ArtifactInfo:
+    """ Sends a HEAD request in order to determine the artifact's size, version and whether the server supports range requests """
+    try:
+        response = head(url=artifact_url, follow_redirects=True, auth=polybox_auth)
+        response.raise_for_status()
+    except HTTPError as e:
+        print(f"Could not probe artifact {artifact_url}: {e}")
+        return ArtifactInfo(url=artifact_url, total_bytes=None, accepts_ranges=False)
 
-    with open(file_path, 'wb') as disk_file:
-        response: Response
-        with stream(url=artifact_url, method="GET", follow_redirects=True, auth=polybox_auth, timeout=None) as response:
-            response.raise_for_status()
-            total_bytes = int(response.headers["Content-Length"])
-            if total_bytes > 10 ** 9:
-                print(f"This could take a while, grab a ☕ ...")
+    content_length = response.headers.get("Content-Length")
+    return ArtifactInfo(
+        url=str(response.url),
+        total_bytes=int(content_length) if content_length is not None else None,
+        accepts_ranges=response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+def split_byte_ranges(total_bytes: int, part_bytes: int = RANGE_PART_BYTES) -> List[Tuple[int, int]]:
+    """ Splits [0, total_bytes) into inclusive (start, end) byte ranges of at most part_bytes """
+    return [(start, min(start + part_bytes, total_bytes) - 1) for start in range(0, total_bytes, part_bytes)]
+
+
+def part_file_paths(file_path: str) -> Tuple[str, str]:
+    """ Returns the paths of the part file and its sidecar manifest, to which an artifact is downloaded before being moved to file_path """
+    part_path = f"{file_path}{PART_FILE_SUFFIX}"
+    return part_path, f"{part_path}{MANIFEST_FILE_SUFFIX}"
+
+
+def digest_file_path(file_path: str) -> str:
+    return f"{file_path}{DIGEST_FILE_SUFFIX}"
+
+
+def hash_file(file_path: str, checksum: Checksum, length: Optional[int] = None, hasher: Optional[Any] = None) -> Any:
+    """ Feeds the first length bytes of a file, or the whole file, into hasher, which is created from checksum if not passed, and returns the hasher """
+    if hasher is None:
+        hasher = checksum.new_hasher()
+
+    remaining = length
+    with open(file_path, 'rb') as file:
+        while remaining is None or remaining > 0:
+            chunk = file.read(HASH_CHUNK_BYTES if remaining is None else min(HASH_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+    return hasher
+
+
+def record_digest(file_path: str, checksum: Checksum, digest: str) -> None:
+    stat = os.stat(file_path)
+    DigestRecord(algorithm=checksum.algorithm, digest=digest, size_bytes=stat.st_size, mtime_ns=stat.st_mtime_ns).save(digest_file_path(file_path))
+
+
+def verify_artifact(file_path: str, checksum: Checksum, full_verify: bool = False) -> bool:
+    """
+    Returns whether an existing artifact matches checksum.
+
+    Unless full_verify is set, the digest stored in the artifact's sidecar file is used as long as the artifact's size & mtime have not changed since it was
+    recorded, such that verification on startup is nearly free. Otherwise the artifact is hashed and the sidecar file is updated.
+    """
+    record = DigestRecord.load(digest_file_path(file_path))
+    if not full_verify and record is not None and record.matches(os.stat(file_path), checksum.algorithm):
+        return record.digest == checksum.digest
+
+    print(f"Verifying checksum of {file_path} ...")
+    digest = hash_file(file_path, checksum).hexdigest()
+    record_digest(file_path, checksum, digest)
+
+    return digest == checksum.digest
+
+
+def discard_partial_download(file_path: str) -> None:
+    for partial_path in part_file_paths(file_path):
+        if path.exists(partial_path):
+            remove(partial_path)
+
+
+def download_artifact_with_progress(
+        artifact_url: str,
+        file_path: str,
+        polybox_auth: Tuple[str, str],
+        num_connections: int = 1,
+        info: Optional[ArtifactInfo] = None,
+        monitor: Optional[TransferMonitor] = None,
+        checksum: Optional[Checksum] = None,
+) -> str:
+    """
+    Downloads an artifact while displaying its progress. Pass a shared TransferMonitor in order to aggregate the progress of several downloads.
+
+    If a checksum is passed, the artifact is hashed while it is streamed to disk and ArtifactIntegrityError is raised if it does not match. Parallel range
+    downloads arrive out of order and are therefore hashed in a separate pass once they are complete.
+
+    The artifact is downloaded to a part file next to file_path, which is only moved to file_path once it has been verified. If a previous download of the
+    same artifact version was interrupted, it is resumed using range requests instead of starting from scratch.
+    If num_connections > 1 and the server supports range requests, the artifact is downloaded in parallel byte ranges, otherwise using a single stream.
+    """
+    if monitor is None:
+        with TransferMonitor() as monitor:
+            return download_artifact_with_progress(artifact_url, file_path, polybox_auth, num_connections, info, monitor, checksum)
+
+    part_path, manifest_path = part_file_paths(file_path)
+
+    if info is None:
+        info = probe_artifact(artifact_url, polybox_auth)
+    manifest = DownloadManifest.load(manifest_path)
+
+    if manifest is not None and path.exists(part_path) and manifest.matches(info):
+        print(f"Resuming partial download of {artifact_url}")
+    else:
+        discard_partial_download(file_path)
+        manifest = None
+
+    if info.total_bytes is not None and info.total_bytes > 10 ** 9:
+        print(f"This could take a while, grab a ☕ ...")
+
+    use_ranges = num_connections > 1 and info.accepts_ranges and info.total_bytes is not None and info.total_bytes > RANGE_PART_BYTES
+    if num_connections > 1 and not info.accepts_ranges:
+        print(f"Server does not support range requests for {artifact_url}, falling back to a single stream")
+
+    hasher = None
+    if use_ranges:
+        try:
+            download_artifact_ranges(info, part_path, manifest_path, polybox_auth, num_connections, monitor, manifest)
+        except RangeNotSupportedError as e:
+            print(f"{e}, falling back to a single stream")
+            discard_partial_download(file_path)
+            use_ranges = False
+            manifest = None
+
+    if not use_ranges:
+        hasher = download_artifact_stream(info, part_path, manifest_path, polybox_auth, monitor, manifest, checksum)
+
+    verify_download(info, file_path)
+
+    if checksum is not None:
+        if hasher is None:
+            print(f"Verifying checksum of {part_path} ...")
+            hasher = hash_file(part_path, checksum)
+
+        digest = hasher.hexdigest()
+        if digest != checksum.digest:
+            discard_partial_download(file_path)
+            raise ArtifactIntegrityError(f"{checksum.algorithm} digest of {info.url} is {digest}, expected {checksum.digest}")
+
+    os.replace(part_path, file_path)
+    remove(manifest_path)
+
+    if checksum is not None:
+        record_digest(file_path, checksum, digest)
+
+    return file_path
+
+
+def download_artifact_stream(
+        info: ArtifactInfo,
+        part_path: str,
+        manifest_path: str,
+        polybox_auth: Tuple[str, str],
+        monitor: TransferMonitor,
+        manifest: Optional[DownloadManifest] = None,
+        checksum: Optional[Checksum] = None,
+) -> Optional[Any]:
+    """
+    Downloads an artifact using a single stream, resuming at the end of the part file if the manifest belongs to a previous stream download.
+    If a checksum is passed, returns a hasher which has been fed the whole artifact.
+    """
+    offset = path.getsize(part_path) if manifest is not None and manifest.mode == "stream" else 0
 
-            with tqdm(total=total_bytes, unit_scale=True, unit_divisor=1024, unit="B") as progress:
+    headers = {}
+    if offset > 0:
+        headers = {"Range": f"bytes={offset}-", "If-Range": info.validator}
+
+    if offset == 0 or manifest is None:
+        DownloadManifest(url=info.url, total_bytes=info.total_bytes, etag=info.etag, last_modified=info.last_modified, mode="stream").save(manifest_path)
+
+    print(f"Downloading artifact {info.url} to {part_path}")
+
+    response: Response
+    with stream(url=info.url, method="GET", headers=headers, follow_redirects=True, auth=polybox_auth, timeout=None) as response:
+        response.raise_for_status()
+
+        if response.status_code != HTTPStatus.PARTIAL_CONTENT:
+            # The server ignored the range request or the artifact changed, restart from scratch
+            offset = 0
+
+        total_bytes = info.total_bytes
+        if total_bytes is None and "Content-Length" in response.headers:
+            total_bytes = offset + int(response.headers["Content-Length"])
+
+        if total_bytes is not None:
+            monitor.add_total(total_bytes)
+        monitor.update(offset, throttle=False)
+
+        # Bytes downloaded before an interruption have to be hashed from disk, everything else is hashed as it arrives
+        hasher = None
+        if checksum is not None:
+            hasher = hash_file(part_path, checksum, length=offset) if offset > 0 else checksum.new_hasher()
+
+        with open(part_path, 'r+b' if offset > 0 else 'wb') as disk_file:
+            disk_file.seek(offset)
+            disk_file.truncate()
+
+            num_bytes_downloaded = response.num_bytes_downloaded
+            for chunk in response.iter_bytes():
+                disk_file.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                monitor.update(response.num_bytes_downloaded - num_bytes_downloaded)
                 num_bytes_downloaded = response.num_bytes_downloaded
+
+    return hasher
+
+
+def download_artifact_ranges(
+        info: ArtifactInfo,
+        part_path: str,
+        manifest_path: str,
+        polybox_auth: Tuple[str, str],
+        num_connections: int,
+        monitor: TransferMonitor,
+        manifest: Optional[DownloadManifest] = None,
+) -> None:
+    """
+    Downloads an artifact using num_connections concurrent range requests, writing each range directly to its offset in a preallocated part file.
+    Completed ranges are recorded in the manifest, so that only missing ranges are downloaded when resuming.
+    """
+    if manifest is None or manifest.mode != "ranges" or manifest.part_bytes != RANGE_PART_BYTES:
+        manifest = DownloadManifest(
+            url=info.url,
+            total_bytes=info.total_bytes,
+            etag=info.etag,
+            last_modified=info.last_modified,
+            mode="ranges",
+            part_bytes=RANGE_PART_BYTES,
+            completed_ranges=[],
+        )
+        with open(part_path, 'wb') as part_file:
+            part_file.truncate(info.total_bytes)
+        manifest.save(manifest_path)
+
+    completed_ranges = set(manifest.completed_ranges)
+    missing_ranges = [byte_range for byte_range in split_byte_ranges(info.total_bytes, RANGE_PART_BYTES) if byte_range not in completed_ranges]
+    completed_bytes = sum(end - start + 1 for start, end in completed_ranges)
+
+    print(f"Downloading artifact {info.url} to {part_path} using {num_connections} connections")
+
+    manifest_lock = Lock()
+    range_headers = {"If-Range": info.validator} if info.validator else {}
+
+    monitor.add_total(info.total_bytes)
+    monitor.update(completed_bytes, throttle=False)
+    reported_bytes = completed_bytes
+
+    with open(part_path, 'r+b') as disk_file, \
+            Client(auth=polybox_auth, follow_redirects=True, timeout=None, limits=Limits(max_connections=num_connections)) as client:
+        fd = disk_file.fileno()
+
+        def download_range(byte_range: Tuple[int, int]) -> None:
+            start, end = byte_range
+            response: Response
+            with client.stream(method="GET", url=info.url, headers={"Range": f"bytes={start}-{end}", **range_headers}) as response:
+                response.raise_for_status()
+                if response.status_code != HTTPStatus.PARTIAL_CONTENT:
+                    raise RangeNotSupportedError(f"Server answered range request with status {response.status_code}")
+
+                offset = start
                 for chunk in response.iter_bytes():
-                    disk_file.write(chunk)
-                    progress.update(response.num_bytes_downloaded - num_bytes_downloaded)
-                    num_bytes_downloaded = response.num_bytes_downloaded
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                    monitor.update(len(chunk))
 
-    return file_path
+                    nonlocal reported_bytes
+                    with manifest_lock:
+                        reported_bytes += len(chunk)
+
+            if offset != end + 1:
+                raise ArtifactDownloadError(f"Received {offset - start} bytes for range {start}-{end} of {info.url}")
+
+            with manifest_lock:
+                completed_ranges.add(byte_range)
+                manifest._replace(completed_ranges=sorted(completed_ranges)).save(manifest_path)
+
+        try:
+            with ThreadPoolExecutor(max_workers=num_connections) as executor:
+                # Consume results in order to raise the first exception
+                for _ in executor.map(download_range, missing_ranges):
+                    pass
+        except RangeNotSupportedError:
+            # The download is restarted using a single stream, which reports its progress again
+            monitor.discard(info.total_bytes, reported_bytes)
+            raise
+
+
+def verify_download(info: ArtifactInfo, file_path: str) -> None:
+    """ Asserts that the part file of a download is complete. Discards the part file otherwise, as it cannot be resumed """
+    part_path, _ = part_file_paths(file_path)
+
+    actual_bytes = path.getsize(part_path)
+    if info.total_bytes is not None and actual_bytes != info.total_bytes:
+        discard_partial_download(file_path)
+        raise ArtifactDownloadError(f"Downloaded {actual_bytes} bytes for {info.url}, expected {info.total_bytes} bytes")
 
 
 def unpack_tar_file(tar_filepath: str, download_dir: str) -> str:
+    """
+    Unpacks a tarball into download_dir and removes it along with its digest sidecar. The tarball is extracted to a temporary directory first and its top level entries are only moved to
+    download_dir once extraction is complete, such that an interrupted extraction does not leave a partial artifact behind
+    """
     print(f"unpacking {tar_filepath} to {download_dir} ...")
 
     def track_progress(members):
@@ -73,16 +568,160 @@ def unpack_tar_file(tar_filepath: str, download_dir: str) -> str:
             print(f"extracting {member.name} ...")
             yield member
 
-    with tarfile.open(f'{tar_filepath}', 'r') as tarball:
-        tarball.extractall(path=f'{download_dir}', members=track_progress(tarball))
+    tmp_dir = make_extraction_dir(download_dir, tar_filepath)
+    try:
+        with tarfile.open(f'{tar_filepath}', 'r') as tarball:
+            tarball.extractall(path=tmp_dir, members=track_progress(tarball))
+
+        move_extracted_entries(tmp_dir, download_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    if path.exists(tar_filepath):
-        remove(tar_filepath)
+    # The digest recorded for the tarball is meaningless once it has been removed
+    for file_path in (tar_filepath, digest_file_path(tar_filepath)):
+        if path.exists(file_path):
+            remove(file_path)
 
     return stem_tar_filename(tar_filepath)
 
 
-def download_if_not_exists(artifact_url: str, download_dir: str, polybox_auth: Tuple[str, str], is_tar: bool = False) -> str:
+def make_extraction_dir(download_dir: str, file_name: str) -> str:
+    """ Creates an empty, hidden directory inside download_dir to extract the given tarball to """
+    tmp_dir = path.join(download_dir, f".{stem_tar_filename(file_name)}.extracting")
+    if path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    makedirs(tmp_dir)
+
+    return tmp_dir
+
+
+def move_extracted_entries(tmp_dir: str, download_dir: str) -> None:
+    """ Moves the top level entries of a completed extraction into download_dir, replacing existing entries of the same name """
+    for entry in os.listdir(tmp_dir):
+        target_path = path.join(download_dir, entry)
+        if path.isdir(target_path) and not path.islink(target_path):
+            shutil.rmtree(target_path)
+        os.replace(path.join(tmp_dir, entry), target_path)
+
+
+class ChunkStreamReader(io.RawIOBase):
+    """ Exposes an iterator of byte chunks, e.g. an HTTP response body, as a readable file object """
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+
+        num_bytes = min(len(buffer), len(self._buffer))
+        buffer[:num_bytes] = self._buffer[:num_bytes]
+        self._buffer = self._buffer[num_bytes:]
+        return num_bytes
+
+
+def open_tar_stream(file_obj, file_name: str) -> tarfile.TarFile:
+    """ Opens a tar stream for sequential reading. gzip, bz2 & xz compression is detected automatically, zstd requires the optional zstandard package """
+    if file_name.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Streaming extraction of .tar.zst artifacts requires the zstandard package: pip install zstandard")
+
+        return tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(file_obj), mode="r|")
+
+    return tarfile.open(fileobj=file_obj, mode="r|*")
+
+
+def download_and_unpack_tar_stream(
+        artifact_url: str,
+        download_dir: str,
+        polybox_auth: Tuple[str, str],
+        monitor: Optional[TransferMonitor] = None,
+        checksum: Optional[Checksum] = None,
+) -> str:
+    """
+    Extracts a tar artifact while it is being downloaded, without writing the tarball to disk. This halves the required disk space and I/O compared to
+    downloading and unpacking separately, but the download cannot be resumed if it is interrupted.
+
+    The artifact is extracted to a temporary directory first and its top level entries are only moved to download_dir once extraction is complete and the
+    tarball matches checksum, if one is passed.
+    """
+    file_name = artifact_url.split("/")[-1]
+    tmp_dir = make_extraction_dir(download_dir, file_name)
+
+    print(f"Downloading and unpacking artifact {artifact_url} to {download_dir}")
+
+    def track_progress(members):
+        for member in members:
+            print(f"extracting {member.name} ...")
+            yield member
+
+    owns_monitor = monitor is None
+    if owns_monitor:
+        monitor = TransferMonitor()
+
+    try:
+        response: Response
+        with stream(url=artifact_url, method="GET", follow_redirects=True, auth=polybox_auth, timeout=None) as response:
+            response.raise_for_status()
+            if "Content-Length" in response.headers:
+                monitor.add_total(int(response.headers["Content-Length"]))
+
+            hasher = checksum.new_hasher() if checksum is not None else None
+
+            def chunks() -> Iterator[bytes]:
+                num_bytes_downloaded = response.num_bytes_downloaded
+                for chunk in response.iter_bytes():
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    monitor.update(response.num_bytes_downloaded - num_bytes_downloaded)
+                    num_bytes_downloaded = response.num_bytes_downloaded
+                    yield chunk
+
+            response_chunks = chunks()
+            reader = io.BufferedReader(ChunkStreamReader(response_chunks), buffer_size=2 ** 20)
+            with open_tar_stream(reader, file_name) as tarball:
+                tarball.extractall(path=tmp_dir, members=track_progress(tarball))
+
+            if hasher is not None:
+                # The tar reader stops at the end of archive marker, hash any trailing bytes as well
+                for _ in response_chunks:
+                    pass
+
+                digest = hasher.hexdigest()
+                if digest != checksum.digest:
+                    raise ArtifactIntegrityError(f"{checksum.algorithm} digest of {artifact_url} is {digest}, expected {checksum.digest}")
+
+        move_extracted_entries(tmp_dir, download_dir)
+
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if owns_monitor:
+            monitor.close()
+
+    return stem_tar_filename(file_name)
+
+
+def download_if_not_exists(
+        artifact_url: str,
+        download_dir: str,
+        polybox_auth: Tuple[str, str],
+        is_tar: bool = False,
+        num_connections: int = 1,
+        stream_extract: bool = False,
+        cache: Optional[ArtifactCache] = None,
+        monitor: Optional[TransferMonitor] = None,
+        checksum: Optional[str] = None,
+        full_verify: bool = False,
+) -> str:
     """ Download a file if not exists (currently only supported for files)
 
     Attributes
@@ -95,10 +734,24 @@ def download_if_not_exists(artifact_url: str, download_dir: str, polybox_auth: T
 
     is_tar: if tar is active a tar file will be downloaded and unpacked
 
+    num_connections: if > 1, the artifact is downloaded using this many parallel range requests, given the server supports them
+
+    stream_extract: if active, a tar file is extracted while it is downloaded instead of being written to disk first. Such downloads cannot be resumed
+
+    cache: if passed, the artifact is stored in this shared cache, keyed by its url & version, and linked into download_dir. Unlike the plain existence check,
+    this detects when the upstream artifact has changed
+
+    monitor: if passed, progress is reported to this shared TransferMonitor instead of a separate progress bar
+
+    checksum: if passed, e.g. "sha256:<hex digest>", the artifact is verified while it is downloaded. Existing files are verified as well and downloaded again
+    if they do not match. For tar artifacts, the checksum refers to the tarball and is only verified when it is downloaded
+
+    full_verify: by default, existing files are verified using the digest recorded after their download, as long as their size & mtime are unchanged. If
+    active, existing files are always hashed again
+
     """
     # If path does not exist (vol not attached), create it
-    if not path.exists(download_dir):
-        makedirs(download_dir)
+    makedirs(download_dir, exist_ok=True)
 
     # Expect dir, not file
     if path.isfile(download_dir):
@@ -106,18 +759,149 @@ def download_if_not_exists(artifact_url: str, download_dir: str, polybox_auth: T
 
     file_name = artifact_url.split("/")[-1]
     file_path = path.join(download_dir, file_name)
+    parsed_checksum = Checksum.parse(checksum) if checksum is not None else None
+
+    if cache is not None:
+        return download_to_cache(artifact_url, download_dir, polybox_auth, cache, is_tar, num_connections, stream_extract, monitor, parsed_checksum, full_verify)
 
     if is_tar:
         extracted_dir_name = file_path.split(".tar")[0]
         if artifact_exists(extracted_dir_name, is_tar=True):
             return extracted_dir_name
 
+        elif stream_extract:
+            download_and_unpack_tar_stream(artifact_url, download_dir, polybox_auth, monitor, parsed_checksum)
+            return extracted_dir_name
+
         else:
-            download_artifact_with_progress(artifact_url, file_path, polybox_auth)
+            download_artifact_with_progress(artifact_url, file_path, polybox_auth, num_connections, monitor=monitor, checksum=parsed_checksum)
             unpack_tar_file(file_path, download_dir)
             return extracted_dir_name
     else:
         if artifact_exists(file_path):
-            return file_path
+            if parsed_checksum is None or verify_artifact(file_path, parsed_checksum, full_verify):
+                return file_path
+
+            print(f"Existing artifact {file_path} does not match checksum {checksum}, downloading it again")
+            remove(file_path)
+
+        return download_artifact_with_progress(artifact_url, file_path, polybox_auth, num_connections, monitor=monitor, checksum=parsed_checksum)
+
+
+def download_to_cache(
+        artifact_url: str,
+        download_dir: str,
+        polybox_auth: Tuple[str, str],
+        cache: ArtifactCache,
+        is_tar: bool = False,
+        num_connections: int = 1,
+        stream_extract: bool = False,
+        monitor: Optional[TransferMonitor] = None,
+        checksum: Optional[Checksum] = None,
+        full_verify: bool = False,
+) -> str:
+    """
+    Downloads an artifact to the cache unless the same version is already cached and materializes it in download_dir.
+    If a checksum is passed, it identifies the artifact version instead of its ETag or Last-Modified header.
+    """
+    file_name = artifact_url.split("/")[-1]
+    target_path = path.join(download_dir, file_name.split(".tar")[0] if is_tar else file_name)
+
+    info = probe_artifact(artifact_url, polybox_auth)
+    if info.total_bytes is None and info.validator is None and path.exists(target_path):
+        print(f"Could not determine the current version of {artifact_url}, using existing artifact {target_path}")
+        return target_path
+
+    if info.validator is None:
+        print(f"Server does not provide an ETag or Last-Modified header for {artifact_url}, changes of the artifact cannot be detected")
+
+    version = f"{checksum.algorithm}:{checksum.digest}" if checksum is not None else info.validator
+    key = ArtifactCache.cache_key(artifact_url, version)
+
+    with cache.lock_key(key):
+        object_path = cache.lookup(key)
+
+        if object_path is not None and checksum is not None and path.isfile(object_path) and not verify_artifact(object_path, checksum, full_verify):
+            print(f"Cached artifact {object_path} does not match checksum, downloading it again")
+            remove(object_path)
+            object_path = None
+
+        if object_path is None:
+            object_dir = cache.object_dir(key)
+            makedirs(object_dir, exist_ok=True)
+
+            if not is_tar:
+                object_path = download_artifact_with_progress(artifact_url, path.join(object_dir, file_name), polybox_auth, num_connections, info, monitor, checksum)
+            elif stream_extract:
+                object_path = path.join(object_dir, download_and_unpack_tar_stream(artifact_url, object_dir, polybox_auth, monitor, checksum))
+            else:
+                tar_path = download_artifact_with_progress(artifact_url, path.join(object_dir, file_name), polybox_auth, num_connections, info, monitor, checksum)
+                object_path = path.join(object_dir, unpack_tar_file(tar_path, object_dir))
+
+            cache.add(key, url=artifact_url, version=version, object_path=object_path)
+
         else:
-            return download_artifact_with_progress(artifact_url, file_path, polybox_auth)
+            print(f"Using cached artifact {object_path}")
+
+        return cache.materialize(key, target_path)
+
+
+class ArtifactSpec(NamedTuple):
+    """ Describes an artifact to be downloaded by download_all_if_not_exist. See download_if_not_exists for a description of the attributes """
+    artifact_url: str
+    download_dir: str
+    is_tar: bool = False
+    num_connections: int = 1
+    stream_extract: bool = False
+    checksum: Optional[str] = None
+
+
+def download_all_if_not_exist(
+        artifacts: Sequence[ArtifactSpec],
+        polybox_auth: Tuple[str, str],
+        max_concurrency: int = 4,
+        max_bytes_per_second: Optional[float] = None,
+        cache: Optional[ArtifactCache] = None,
+) -> List[str]:
+    """
+    Downloads & unpacks several artifacts concurrently, e.g. a model, its tokenizer and a service account, such that startup time is bounded by the largest
+    artifact rather than by the sum of all artifacts. Progress is displayed by a single, aggregated progress bar.
+
+    Attributes
+    ----------
+    artifacts: the artifacts to be downloaded
+
+    polybox_auth: tuple of (polybox_usr, polybox_pwd)
+
+    max_concurrency: the maximum number of artifacts which are downloaded at the same time
+
+    max_bytes_per_second: if passed, the combined bandwidth of all downloads is capped to this value
+
+    cache: if passed, artifacts are downloaded to & materialized from this shared cache
+
+    Returns the paths returned by download_if_not_exists, in the order of artifacts. If any download fails, the first error is raised once all other downloads
+    have completed.
+    """
+    with TransferMonitor(max_bytes_per_second=max_bytes_per_second, description=f"Downloading {len(artifacts)} artifacts") as monitor, \
+            ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [
+            executor.submit(
+                download_if_not_exists,
+                artifact_url=artifact.artifact_url,
+                download_dir=artifact.download_dir,
+                polybox_auth=polybox_auth,
+                is_tar=artifact.is_tar,
+                num_connections=artifact.num_connections,
+                stream_extract=artifact.stream_extract,
+                cache=cache,
+                monitor=monitor,
+                checksum=artifact.checksum,
+            )
+            for artifact in artifacts
+        ]
+
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise errors[0]
+
+    return [future.result() for future in futures]
@@ -0,0 +1,85 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from datetime import timedelta
+from typing import Callable, Awaitable, Union, Optional
+
+IsReady = Callable[[], bool]
+IsReadyAsync = Callable[[], Awaitable[bool]]
+
+
+class ReadinessState:
+    """
+    Holds the readiness of a service and avoids evaluating expensive is_ready probes on every request.
+
+    The state can be driven in two ways:
+        * Pull: The probe is evaluated on demand. Its result is cached for `ttl` and concurrent callers share a single in-flight evaluation.
+        * Push: mark_ready() / mark_not_ready() pin the state, e.g. once a model has finished initializing. The probe is not evaluated while the state is pinned.
+          Call invalidate() to drop the pinned state and fall back to the probe.
+
+    If no probe is passed, the state is purely push based and starts out as not ready.
+    """
+
+    def __init__(self, probe: Optional[Union[IsReady, IsReadyAsync]] = None, ttl: timedelta = timedelta(seconds=0)):
+        self._probe = probe
+        self._ttl_seconds = ttl.total_seconds()
+
+        self._pinned: Optional[bool] = None if probe is not None else False
+        self._cached: Optional[bool] = None
+        self._cached_until = 0.0
+        self._in_flight: Optional[asyncio.Future] = None
+
+    @property
+    def ttl(self) -> timedelta:
+        return timedelta(seconds=self._ttl_seconds)
+
+    def mark_ready(self) -> None:
+        """ Pins the state to ready. Safe to call from any thread, e.g. at the end of MLBaseModel.init_model() """
+        self._pinned = True
+
+    def mark_not_ready(self) -> None:
+        """ Pins the state to not ready. Safe to call from any thread """
+        self._pinned = False
+
+    def invalidate(self) -> None:
+        """ Drops the pinned state as well as any cached probe result, so that the next call evaluates the probe again """
+        if self._probe is not None:
+            self._pinned = None
+        self._cached = None
+        self._cached_until = 0.0
+
+    async def is_ready(self) -> bool:
+        if self._pinned is not None:
+            return self._pinned
+
+        if self._cached is not None and time.monotonic() < self._cached_until:
+            return self._cached
+
+        # Single flight: Concurrent callers on the same event loop await the same probe evaluation. The probe runs in its own task, such that a cancelled
+        # caller, e.g. one whose client disconnected, does not cancel the evaluation for the callers coalesced with it
+        loop = asyncio.get_running_loop()
+        if self._in_flight is None or self._in_flight.done() or self._in_flight.get_loop() is not loop:
+            self._in_flight = loop.create_task(self._evaluate_and_cache())
+            # Mark exceptions as retrieved in case all callers have been cancelled
+            self._in_flight.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+        return await asyncio.shield(self._in_flight)
+
+    async def _evaluate_and_cache(self) -> bool:
+        ready = bool(await self._evaluate_probe())
+
+        self._cached = ready
+        self._cached_until = time.monotonic() + self._ttl_seconds
+
+        return ready
+
+    async def _evaluate_probe(self) -> bool:
+        if inspect.iscoroutinefunction(self._probe):
+            return await self._probe()
+        else:
+            return self._probe()
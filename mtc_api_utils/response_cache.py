@@ -0,0 +1,158 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import time
+import typing
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from mtc_api_utils.api_types import FirebaseUser, ResponseCacheMetrics
+from mtc_api_utils.ttl_cache import TTLCache
+
+# The name of the parameter added to the signature of cached endpoints, through which FastAPI passes the request
+REQUEST_PARAM = "_response_cache_request"
+
+# Returned by the entry cache on a miss, since cached values may legitimately be None
+_MISSING = object()
+
+
+def _is_user_annotation(annotation: Any) -> bool:
+    if inspect.isclass(annotation) and issubclass(annotation, FirebaseUser):
+        return True
+
+    return any(_is_user_annotation(arg) for arg in typing.get_args(annotation))
+
+
+class ResponseCache:
+    """
+    Caches the return values of deterministic routes, e.g. embedding or classification endpoints, keyed by a hash of the request's method, path, query &
+    canonicalized JSON body. Entries expire after ttl and the least recently used entries are evicted once the cache exceeds max_bytes, measured as the size of
+    the serialized responses. Concurrent identical requests are coalesced, such that only one of them runs the endpoint while the others await its result.
+
+    With per_user=True, entries are scoped to the FirebaseUser passed to the endpoint, e.g. by a firebase_user_auth dependency. Endpoints returning a Response
+    object and endpoints raising exceptions are not cached. Synchronous endpoints are run in the threadpool, as FastAPI would run them.
+
+    Example usage:
+        cache = ResponseCache(ttl=timedelta(minutes=10), max_bytes=64 * 1024 * 1024)
+
+        @api.post("/api/embedding")
+        @cache.cached()
+        async def embedding(body: EmbeddingRequest) -> EmbeddingResponse:
+            return model.embed(body.text)
+    """
+
+    def __init__(
+            self,
+            ttl: Optional[timedelta] = timedelta(minutes=10),
+            max_bytes: int = 64 * 1024 * 1024,
+            max_entries: int = 4096,
+            timer: Callable[[], float] = time.monotonic,
+    ):
+        self._entries: TTLCache[str, Any] = TTLCache(
+            max_entries=max_entries,
+            ttl=ttl,
+            timer=timer,
+            max_bytes=max_bytes,
+            size_fn=lambda value: len(json.dumps(jsonable_encoder(value))),
+        )
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._metrics = ResponseCacheMetrics()
+
+    @property
+    def metrics(self) -> ResponseCacheMetrics:
+        return self._metrics.copy(update={"num_entries": len(self._entries), "num_bytes": self._entries.num_bytes})
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @staticmethod
+    async def request_key(request: Request, user: Optional[FirebaseUser] = None) -> str:
+        """ Hashes the request's method, path, sorted query parameters & body. JSON bodies are canonicalized, such that key order & whitespace do not matter """
+        body = await request.body()
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+
+        digest = hashlib.sha256()
+        for part in [request.method, request.url.path, str(sorted(request.query_params.multi_items())), user.email if user is not None else ""]:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(body)
+
+        return digest.hexdigest()
+
+    def cached(self, per_user: bool = False) -> Callable[[Callable], Callable]:
+        """ Decorates a route, such that its return values are cached. Apply it below the route decorator """
+
+        def decorator(endpoint: Callable) -> Callable:
+            signature = inspect.signature(endpoint)
+            type_hints = typing.get_type_hints(endpoint)
+
+            # Resolve annotations, since FastAPI would otherwise resolve postponed annotations against this module
+            parameters = [parameter.replace(annotation=type_hints.get(name, parameter.annotation)) for name, parameter in signature.parameters.items()]
+
+            if per_user and not any(_is_user_annotation(parameter.annotation) for parameter in parameters):
+                raise ValueError(f"Caching {endpoint.__name__} per user requires a parameter of type FirebaseUser")
+
+            parameters.append(inspect.Parameter(REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                request: Request = kwargs.pop(REQUEST_PARAM)
+                user = next((value for value in kwargs.values() if isinstance(value, FirebaseUser)), None) if per_user else None
+
+                key = await self.request_key(request, user)
+                return await self._get_or_run(key, endpoint, args, kwargs)
+
+            wrapper.__signature__ = signature.replace(
+                parameters=sorted(parameters, key=lambda parameter: parameter.kind),
+                return_annotation=type_hints.get("return", signature.return_annotation),
+            )
+            return wrapper
+
+        return decorator
+
+    async def _get_or_run(self, key: str, endpoint: Callable, args: tuple, kwargs: dict) -> Any:
+        value = self._entries.get(key, _MISSING)
+        if value is not _MISSING:
+            self._metrics.hits += 1
+            return value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._metrics.coalesced += 1
+            return await asyncio.shield(in_flight)
+
+        self._metrics.misses += 1
+
+        # Run the endpoint in its own task, such that a cancelled request does not cancel the requests coalesced with it
+        task = asyncio.ensure_future(self._run(key, endpoint, args, kwargs))
+        self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, endpoint: Callable, args: tuple, kwargs: dict) -> Any:
+        try:
+            if inspect.iscoroutinefunction(endpoint):
+                result = await endpoint(*args, **kwargs)
+            else:
+                result = await run_in_threadpool(endpoint, *args, **kwargs)
+
+            if not isinstance(result, Response):
+                self._entries.set(key, result)
+
+            return result
+        finally:
+            self._in_flight.pop(key, None)
@@ -0,0 +1,244 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+"""
+This module allows CPU bound models to scale across cores without holding one copy of the model weights per process. The model is loaded once, its weights are
+packed into a single shared memory block and each worker process of an InferenceExecutor maps that block instead of loading its own copy.
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Iterator, Mapping, NamedTuple, Optional, Tuple, Type
+
+from mtc_api_utils.base_model import MLBaseModel
+from mtc_api_utils.executor import InferenceExecutor
+
+_ALIGNMENT_BYTES = 64
+
+
+class _TensorLayout(NamedTuple):
+    offset: int
+    num_bytes: int
+    format: str
+    shape: Tuple[int, ...]
+    is_numpy: bool
+
+
+class SharedWeightsHandle(NamedTuple):
+    """ A picklable reference to a SharedWeights block, which is passed to worker processes in order to attach to it """
+    shm_name: str
+    layout: Dict[str, _TensorLayout]
+
+
+class SharedWeights(Mapping[str, Any]):
+    """
+    A read-only mapping of named weight buffers, which are stored in a single shared memory block.
+
+    Accepts any C-contiguous object supporting the buffer protocol, e.g. bytes, array.array or numpy arrays. Numpy arrays are returned as numpy arrays backed by
+    the shared memory, all other buffers as memoryviews with their original format and shape. Use create() in the process that loaded the model and attach() in
+    worker processes.
+    """
+
+    def __init__(self, shm: SharedMemory, layout: Dict[str, _TensorLayout], owner: bool):
+        self._shm = shm
+        self._layout = layout
+        self._owner = owner
+
+    @classmethod
+    def create(cls, weights: Mapping[str, Any]) -> SharedWeights:
+        layout: Dict[str, _TensorLayout] = {}
+        views: Dict[str, memoryview] = {}
+
+        offset = 0
+        for name, weight in weights.items():
+            view = memoryview(weight)
+            if not view.c_contiguous:
+                raise ValueError(f"Weight {name} is not C-contiguous and cannot be shared")
+
+            is_numpy = hasattr(weight, "dtype") and hasattr(weight, "shape")
+            layout[name] = _TensorLayout(
+                offset=offset,
+                num_bytes=view.nbytes,
+                format=weight.dtype.str if is_numpy else view.format,
+                shape=tuple(weight.shape) if is_numpy else view.shape,
+                is_numpy=is_numpy,
+            )
+            views[name] = view.cast("B")
+
+            offset += -(-view.nbytes // _ALIGNMENT_BYTES) * _ALIGNMENT_BYTES
+
+        shm = SharedMemory(create=True, size=max(offset, 1))
+        for name, view in views.items():
+            entry = layout[name]
+            shm.buf[entry.offset:entry.offset + entry.num_bytes] = view
+
+        return cls(shm=shm, layout=layout, owner=True)
+
+    @classmethod
+    def attach(cls, handle: SharedWeightsHandle) -> SharedWeights:
+        try:
+            # Python >= 3.13: Do not register the block with the resource tracker of the attaching process, the creating process owns it
+            shm = SharedMemory(name=handle.shm_name, track=False)
+        except TypeError:
+            shm = SharedMemory(name=handle.shm_name)
+
+        return cls(shm=shm, layout=handle.layout, owner=False)
+
+    @property
+    def handle(self) -> SharedWeightsHandle:
+        return SharedWeightsHandle(shm_name=self._shm.name, layout=self._layout)
+
+    @property
+    def num_bytes(self) -> int:
+        return self._shm.size
+
+    def __getitem__(self, name: str) -> Any:
+        entry = self._layout[name]
+        view = self._shm.buf[entry.offset:entry.offset + entry.num_bytes]
+
+        if entry.is_numpy:
+            import numpy as np
+            return np.frombuffer(view, dtype=np.dtype(entry.format)).reshape(entry.shape)
+
+        if entry.format == "B" and len(entry.shape) == 1:
+            return view
+        return view.cast(entry.format, entry.shape)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout)
+
+    def __len__(self) -> int:
+        return len(self._layout)
+
+    def copy(self) -> Dict[str, Any]:
+        """ Returns private copies of all weights, which remain valid once the shared memory block has been closed """
+        weights = {}
+
+        for name, weight in self.items():
+            if self._layout[name].is_numpy:
+                weights[name] = weight.copy()
+            else:
+                weights[name] = memoryview(bytearray(weight.cast("B"))).cast(weight.format, weight.shape)
+
+        return weights
+
+    def close(self) -> None:
+        """ Releases this process' mapping. The creating process additionally frees the shared memory block """
+        try:
+            self._shm.close()
+        except BufferError:
+            print("Shared weights are still referenced, the shared memory mapping is released once all references are gone")
+
+        if self._owner:
+            self._shm.unlink()
+
+
+# Per worker process state, set by _init_worker
+_worker_model: Optional[SharedWeightsModel] = None
+
+
+def _init_worker(model_cls: Type[SharedWeightsModel], handle: SharedWeightsHandle) -> None:
+    global _worker_model
+    _worker_model = model_cls.from_shared_weights(SharedWeights.attach(handle))
+
+
+def _worker_inference(*args, **kwargs) -> Any:
+    return _worker_model.inference(*args, **kwargs)
+
+
+def _worker_batch_inference(batch: list) -> list:
+    return _worker_model.batch_inference(batch)
+
+
+class SharedWeightsModel(MLBaseModel, ABC):
+    """
+    An MLBaseModel which serves inference from several worker processes that share a single copy of the model weights.
+
+    Implement export_weights() to return the weights loaded by init_model() and load_weights() to set up a model instance from the shared weights. Worker
+    instances are created without calling __init__() or init_model(), so load_weights() has to set all attributes required by inference(). start_workers()
+    also calls load_weights() on the model itself, such that it drops its private copy of the weights and uses the shared memory as well.
+
+    Example usage:
+        model = MyModel()
+        model.init_thread.join()
+        model.start_workers(num_workers=4)
+
+        @api.post("/api/inference")
+        async def inference(body: InferenceRequest):
+            return await model.run_inference(body.text)
+    """
+
+    shared_weights: Optional[SharedWeights] = None
+
+    @abstractmethod
+    def export_weights(self) -> Mapping[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_weights(self, weights: Mapping[str, Any]) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    def from_shared_weights(cls, weights: SharedWeights) -> SharedWeightsModel:
+        model = cls.__new__(cls)
+        model.shared_weights = weights
+        model.load_weights(weights)
+        return model
+
+    def start_workers(self, num_workers: int, max_queue_depth: int = 16, retry_after_seconds: int = 1) -> InferenceExecutor:
+        """ Moves the weights to shared memory and replaces the model's executor by a pool of num_workers processes. Requires the model to be initialized """
+        if not self.is_ready():
+            raise RuntimeError("The model has to be initialized before its weights can be shared with worker processes")
+
+        if self.shared_weights is not None:
+            raise RuntimeError("Workers have already been started")
+
+        self.shared_weights = SharedWeights.create(self.export_weights())
+        # Replace the private copy before forking workers, such that only one copy of the weights remains resident
+        self.load_weights(self.shared_weights)
+        print(f"Sharing {self.shared_weights.num_bytes / 2 ** 20:.1f} MiB of model weights with {num_workers} worker processes")
+
+        self.executor.shutdown(wait=False)
+        self.executor = InferenceExecutor(
+            max_concurrency=num_workers,
+            max_queue_depth=max_queue_depth,
+            use_processes=True,
+            retry_after_seconds=retry_after_seconds,
+            initializer=_init_worker,
+            initargs=(type(self), self.shared_weights.handle),
+        )
+
+        if self.batcher is not None:
+            self.batcher.batch_fn = _worker_batch_inference
+            self.batcher.executor = self.executor
+
+        return self.executor
+
+    def stop_workers(self) -> None:
+        if self.shared_weights is None:
+            return
+
+        self.executor.shutdown()
+        self.executor = InferenceExecutor()
+        self.load_weights(self.shared_weights.copy())
+        self.shared_weights.close()
+        self.shared_weights = None
+
+        if self.batcher is not None:
+            self.batcher.batch_fn = self.batch_inference
+            self.batcher.executor = self.executor
+
+    async def run_inference(self, *args, **kwargs) -> Any:
+        if self.shared_weights is None:
+            return await super().run_inference(*args, **kwargs)
+
+        return await self.executor.run(_worker_inference, *args, **kwargs)
+
+    def enable_batching(self, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        batcher = super().enable_batching(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        if self.shared_weights is not None:
+            batcher.batch_fn = _worker_batch_inference
+
+        return batcher
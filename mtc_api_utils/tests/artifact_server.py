@@ -0,0 +1,115 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import hashlib
+import re
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock
+from typing import Dict, List, Optional, Tuple
+
+_range_pattern = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class ArtifactServer:
+    """
+    A local HTTP server serving in-memory artifacts, used to test init_api without access to PolyBox.
+
+    Parameters:
+        * artifacts: Maps artifact names to their content. Artifacts are served at /<name>
+        * support_ranges: If false, Range headers are ignored and the full artifact is always returned
+        * abort_after_bytes: If set, the connection is closed after sending this many body bytes of a response, simulating an interrupted download
+    """
+
+    def __init__(self, artifacts: Dict[str, bytes], support_ranges: bool = True, abort_after_bytes: Optional[int] = None):
+        self.artifacts = artifacts
+        self.support_ranges = support_ranges
+        self.abort_after_bytes = abort_after_bytes
+
+        self.requests: List[Tuple[str, str, Optional[str]]] = []
+        self._lock = Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._create_handler())
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    @staticmethod
+    def etag(content: bytes) -> str:
+        return f'"{hashlib.md5(content).hexdigest()}"'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _create_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._respond(send_body=False)
+
+            def do_GET(self):
+                self._respond(send_body=True)
+
+            def _respond(self, send_body: bool):
+                range_header = self.headers.get("Range")
+                with server._lock:
+                    server.requests.append((self.command, self.path, range_header))
+
+                content = server.artifacts.get(self.path.lstrip("/"))
+                if content is None:
+                    self.send_response(HTTPStatus.NOT_FOUND)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                etag = server.etag(content)
+                start, end = 0, len(content) - 1
+                status = HTTPStatus.OK
+
+                if_range = self.headers.get("If-Range")
+                match = _range_pattern.fullmatch(range_header) if range_header else None
+                if server.support_ranges and match and (if_range is None or if_range == etag):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), end) if match.group(2) else end
+                    status = HTTPStatus.PARTIAL_CONTENT
+
+                body = content[start:end + 1]
+
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                if server.support_ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                if status == HTTPStatus.PARTIAL_CONTENT:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+                self.end_headers()
+
+                if not send_body:
+                    return
+
+                if server.abort_after_bytes is not None and server.abort_after_bytes < len(body):
+                    self.wfile.write(body[:server.abort_after_bytes])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    self.connection.close()
+                    return
+
+                self.wfile.write(body)
+
+        return Handler
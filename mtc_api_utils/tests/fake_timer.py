@@ -0,0 +1,12 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+
+class FakeTimer:
+    """ A manually advanced clock, which can be passed as timer to the caches, circuit breakers & load balancers under test. Set now to advance it """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
@@ -0,0 +1,130 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import base64
+import hashlib
+from contextlib import contextmanager, ExitStack
+from threading import Lock
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, Set
+from unittest.mock import patch
+
+import firebase_admin.auth as firebase_auth
+from firebase_admin._user_import import UserImportResult
+from firebase_admin._user_mgt import DeleteUsersResult, BatchDeleteAccountsResponse
+
+from mtc_api_utils.clients import firebase_client as firebase_client_module
+
+
+class FakeFirebaseAuth:
+    """
+    An in-memory fake of the firebase_admin.auth user management API, used to test FirebaseClient without access to a Firebase project.
+    Use patch() in order to replace the functions used by FirebaseClient. Calls are counted per function in num_calls.
+
+    Parameters:
+        * failing_uids: Operations on these users fail, simulating per user errors returned by firebase
+    """
+
+    def __init__(self, failing_uids: Optional[Set[str]] = None):
+        self.users: Dict[str, SimpleNamespace] = {}
+        self.failing_uids = failing_uids or set()
+        self.num_calls: Dict[str, int] = {}
+
+        self._lock = Lock()
+
+    @contextmanager
+    def patch(self) -> Iterator["FakeFirebaseAuth"]:
+        with ExitStack() as stack:
+            for name in ["import_users", "delete_users", "set_custom_user_claims", "get_user", "get_users", "get_user_by_email"]:
+                stack.enter_context(patch.object(firebase_client_module.firebase_auth, name, getattr(self, name)))
+            yield self
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.num_calls[name] = self.num_calls.get(name, 0) + 1
+
+    def import_users(self, users: List[firebase_auth.ImportUserRecord], hash_alg=None) -> UserImportResult:
+        self._count("import_users")
+        if len(users) > 1000:
+            raise ValueError("Users must be a non-empty list with no more than 1000 elements")
+
+        hash_config = hash_alg.to_dict() if hash_alg is not None else {}
+
+        # As firebase, the import does not check whether emails are unique
+        errors = []
+        with self._lock:
+            for index, record in enumerate(users):
+                record_dict = record.to_dict()
+
+                if record.uid in self.failing_uids:
+                    errors.append({"index": index, "message": f"Could not import user {record_dict.get('email')}"})
+                    continue
+
+                self.users[record.uid] = SimpleNamespace(
+                    uid=record.uid,
+                    email=record_dict.get("email"),
+                    custom_claims=record.custom_claims,
+                    password_hash=record_dict.get("passwordHash"),
+                    password_salt=record_dict.get("salt"),
+                    hash_config=hash_config,
+                )
+
+        return UserImportResult({"error": errors}, total=len(users))
+
+    def delete_users(self, uids: List[str]) -> DeleteUsersResult:
+        self._count("delete_users")
+        if len(uids) > 1000:
+            raise ValueError("`uids` paramter must have <= 1000 entries.")
+
+        errors = []
+        with self._lock:
+            for index, uid in enumerate(uids):
+                if uid in self.failing_uids:
+                    errors.append({"index": index, "message": f"Could not delete user {uid}"})
+                else:
+                    self.users.pop(uid, None)
+
+        return DeleteUsersResult(BatchDeleteAccountsResponse(errors), total=len(uids))
+
+    def set_custom_user_claims(self, uid: str, custom_claims: Optional[dict]) -> None:
+        self._count("set_custom_user_claims")
+        with self._lock:
+            if uid in self.failing_uids or uid not in self.users:
+                raise firebase_auth.UserNotFoundError(f"No user record found for the given identifier: {uid}")
+
+            self.users[uid].custom_claims = custom_claims
+
+    def get_user(self, uid: str) -> SimpleNamespace:
+        self._count("get_user")
+        with self._lock:
+            if uid not in self.users:
+                raise firebase_auth.UserNotFoundError(f"No user record found for the given identifier: {uid}")
+            return self.users[uid]
+
+    def get_users(self, identifiers: List[firebase_auth.UserIdentifier]) -> SimpleNamespace:
+        self._count("get_users")
+        if len(identifiers) > 100:
+            raise ValueError("`identifiers` parameter must have <= 100 entries.")
+
+        with self._lock:
+            emails = {identifier.email for identifier in identifiers if isinstance(identifier, firebase_auth.EmailIdentifier)}
+            uids = {identifier.uid for identifier in identifiers if isinstance(identifier, firebase_auth.UidIdentifier)}
+            return SimpleNamespace(users=[user for user in self.users.values() if user.email in emails or user.uid in uids])
+
+    def get_user_by_email(self, email: str) -> SimpleNamespace:
+        self._count("get_user_by_email")
+        with self._lock:
+            for user in self.users.values():
+                if user.email == email:
+                    return user
+        raise firebase_auth.UserNotFoundError(f"No user record found for the given email: {email}")
+
+    def check_password(self, email: str, password: str) -> bool:
+        """ Verifies a password against the imported PBKDF2-SHA256 hash, as firebase would on sign in """
+        user = self.get_user_by_email(email)
+        if user.hash_config.get("hashAlgorithm") != "PBKDF2_SHA256":
+            return False
+
+        salt = base64.urlsafe_b64decode(user.password_salt)
+        expected_hash = base64.urlsafe_b64decode(user.password_hash)
+        return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, user.hash_config["rounds"]) == expected_hash
@@ -1,9 +1,14 @@
+import asyncio
+import time
 import unittest
+from datetime import timedelta
 from http import HTTPStatus
 
-from httpx import HTTPStatusError
+from fastapi import FastAPI, HTTPException, Response
+from httpx import HTTPStatusError, AsyncClient
 
 from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.backoff import ExponentialBackoff
 
 
 class TestApiClient(unittest.IsolatedAsyncioTestCase):
@@ -28,3 +33,87 @@ class TestApiClient(unittest.IsolatedAsyncioTestCase):
             self.fail(msg="Expected request to fail with 404 NOT FOUND")
         except HTTPStatusError as e:
             self.assertEqual(HTTPStatus.NOT_FOUND, e.response.status_code)
+
+
+class TestExponentialBackoff(unittest.TestCase):
+
+    def test_delays(self):
+        backoff = ExponentialBackoff(initial_delay=timedelta(milliseconds=100), max_delay=timedelta(seconds=1), jitter=False)
+        delays = backoff.delays()
+
+        self.assertEqual([0.1, 0.2, 0.4, 0.8, 1.0, 1.0], [round(next(delays), 3) for _ in range(6)])
+        self.assertEqual(1.0, backoff.delay(10_000), msg="Expected large attempts not to overflow")
+
+    def test_jitter(self):
+        backoff = ExponentialBackoff(initial_delay=timedelta(seconds=1), random_fn=lambda: 0.5)
+        self.assertEqual(0.5, backoff.delay(0))
+        self.assertEqual(1.0, backoff.delay(1))
+
+
+class TestAsyncProbes(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.is_ready = False
+        self.num_readiness_probes = 0
+
+        app = FastAPI()
+
+        @app.get("/api/liveness")
+        async def liveness():
+            return Response()
+
+        @app.get("/api/readiness")
+        async def readiness():
+            self.num_readiness_probes += 1
+            if not self.is_ready:
+                raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+            return Response()
+
+        self.async_client = AsyncClient(app=app)
+        self.client = ApiClient(backend_url="http://test", async_client=self.async_client)
+
+    async def asyncTearDown(self) -> None:
+        await self.async_client.aclose()
+
+    async def test_probes(self):
+        _, is_live = await self.client.get_liveness_async()
+        self.assertTrue(is_live)
+
+        _, is_ready = await self.client.get_readiness_async()
+        self.assertFalse(is_ready)
+
+    async def test_unreachable_backend(self):
+        client = ApiClient(backend_url="http://127.0.0.1:9")
+
+        response, is_live = await client.get_liveness_async()
+        self.assertIsNone(response)
+        self.assertFalse(is_live)
+
+    async def test_wait_for_readiness(self):
+        asyncio.get_running_loop().call_later(0.3, lambda: setattr(self, "is_ready", True))
+
+        start = time.monotonic()
+        await self.client.wait_for_service_readiness_async(backoff=ExponentialBackoff(initial_delay=timedelta(milliseconds=10), jitter=False))
+
+        self.assertLess(time.monotonic() - start, 1, msg="Expected the wait to return shortly after the service became ready")
+        self.assertGreater(self.num_readiness_probes, 2)
+
+    async def test_wait_does_not_block_event_loop(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        with self.assertRaises(HTTPException) as context:
+            await self.client.wait_for_service_readiness_async(timeout=timedelta(milliseconds=300))
+        ticker.cancel()
+
+        self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, context.exception.status_code)
+        self.assertGreater(ticks, 10)
+
+    async def test_wait_for_liveness(self):
+        await self.client.wait_for_service_liveness_async(timeout=timedelta(seconds=1))
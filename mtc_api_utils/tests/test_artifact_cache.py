@@ -0,0 +1,122 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from mtc_api_utils.artifact_cache import ArtifactCache
+from mtc_api_utils.init_api import download_if_not_exists
+from mtc_api_utils.tests.artifact_server import ArtifactServer
+
+TEST_AUTH = ("user", "password")
+
+
+class TestArtifactCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = ArtifactCache(cache_dir=os.path.join(self.tmp_dir, "cache"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def service_dir(self, name: str) -> str:
+        return os.path.join(self.tmp_dir, name)
+
+    def test_shared_artifact(self):
+        artifact = os.urandom(4096)
+
+        with ArtifactServer({"model.bin": artifact}) as server:
+            path_a = download_if_not_exists(server.url("model.bin"), self.service_dir("service-a"), TEST_AUTH, cache=self.cache)
+            path_b = download_if_not_exists(server.url("model.bin"), self.service_dir("service-b"), TEST_AUTH, cache=self.cache)
+
+            get_requests = [request for request in server.requests if request[0] == "GET"]
+
+        self.assertEqual(1, len(get_requests), msg="Expected the artifact to be downloaded once and shared between services")
+        self.assertTrue(os.path.samefile(path_a, path_b))
+        with open(path_b, "rb") as f:
+            self.assertEqual(artifact, f.read())
+
+        self.assertEqual(1, len(self.cache.entries))
+        self.assertEqual(len(artifact), self.cache.total_size_bytes)
+
+    def test_upstream_change(self):
+        with ArtifactServer({"model.bin": b"version 1"}) as server:
+            file_path = download_if_not_exists(server.url("model.bin"), self.service_dir("service"), TEST_AUTH, cache=self.cache)
+
+            server.artifacts["model.bin"] = b"version 2"
+            download_if_not_exists(server.url("model.bin"), self.service_dir("service"), TEST_AUTH, cache=self.cache)
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(b"version 2", f.read())
+
+        self.assertEqual(2, len(self.cache.entries))
+
+    def test_tar_artifact(self):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tarball:
+            info = tarfile.TarInfo(name="test_model/weights.bin")
+            info.size = 3
+            tarball.addfile(info, io.BytesIO(b"abc"))
+
+        for stream_extract in [False, True]:
+            with self.subTest(stream_extract=stream_extract):
+                with ArtifactServer({"test_model.tar.gz": buffer.getvalue()}) as server:
+                    extracted_dir = download_if_not_exists(
+                        server.url("test_model.tar.gz"),
+                        self.service_dir("service"),
+                        TEST_AUTH,
+                        is_tar=True,
+                        stream_extract=stream_extract,
+                        cache=ArtifactCache(cache_dir=os.path.join(self.tmp_dir, f"cache-{stream_extract}")),
+                    )
+
+                self.assertEqual(os.path.join(self.service_dir("service"), "test_model"), extracted_dir)
+                self.assertTrue(os.path.islink(extracted_dir))
+                with open(os.path.join(extracted_dir, "weights.bin"), "rb") as f:
+                    self.assertEqual(b"abc", f.read())
+
+    def test_lru_eviction(self):
+        cache = ArtifactCache(cache_dir=os.path.join(self.tmp_dir, "small-cache"), max_size_bytes=2500)
+
+        def add_entry(name: str, size: int, is_dir: bool = False) -> str:
+            key = ArtifactCache.cache_key(name, version=None)
+            object_dir = cache.object_dir(key)
+            os.makedirs(object_dir)
+
+            object_path = os.path.join(object_dir, name)
+            file_path = os.path.join(object_path, "weights.bin") if is_dir else object_path
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "wb") as f:
+                f.write(b"0" * size)
+
+            cache.add(key, url=name, version=None, object_path=object_path)
+            return key
+
+        linked_dir_key = add_entry("linked-dir", 1000, is_dir=True)
+        cache.materialize(linked_dir_key, self.service_dir("linked-dir"))
+
+        old_key = add_entry("old", 1000)
+        cache.materialize(old_key, self.service_dir("old"))
+        new_key = add_entry("new", 1000)
+
+        self.assertEqual({linked_dir_key, new_key}, set(cache.entries.keys()), msg="Expected the least recently used, unlinked entry to be evicted")
+        self.assertFalse(os.path.exists(cache.object_dir(old_key)))
+        self.assertTrue(os.path.isfile(self.service_dir("old")), msg="Expected hard linked artifacts to survive eviction")
+        self.assertLessEqual(cache.total_size_bytes, 2500)
+
+        # An entry whose key is locked, e.g. between lookup & materialize, is not evicted
+        with cache.lock_key(new_key):
+            self.assertIsNotNone(cache.lookup(new_key))
+            newer_key = add_entry("newer", 1000)
+            cache.materialize(new_key, self.service_dir("new"))
+
+        self.assertIn(new_key, cache.entries)
+
+        self.assertEqual([newer_key], cache.evict())
+        with self.assertRaises(FileNotFoundError):
+            cache.materialize(newer_key, self.service_dir("newer"))
@@ -1,21 +1,26 @@
 #  SPDX-License-Identifier: Apache-2.0
 #  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
 
+import asyncio
+import statistics
+import time
 import unittest
 from datetime import datetime, timedelta
 from enum import Enum
 from http import HTTPStatus
 from multiprocessing import Process
 from time import sleep
-from typing import Dict, Tuple, Optional, Any
+from typing import Dict, Tuple, Optional, Any, List
 
 import uvicorn
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
 from firebase_admin.auth import UserNotFoundError
-from httpx import HTTPStatusError, Response, post, get
+from httpx import HTTPStatusError, Response, post, get, AsyncClient
 from pydantic import BaseModel
+from starlette.middleware.base import BaseHTTPMiddleware
 
-from mtc_api_utils.api import BaseApi, service_unavailable_exception
+from mtc_api_utils.api import BaseApi, service_unavailable_exception, DefaultRoute
 from mtc_api_utils.api_types import FirebaseUser
 from mtc_api_utils.assertions import assert_resp_raises
 from mtc_api_utils.clients.api_client import ApiClient
@@ -450,3 +455,163 @@ class TestBaseApi(unittest.TestCase):
 
         finally:
             api_process.terminate()
+
+
+class LegacyReadinessMiddleware(BaseHTTPMiddleware):
+    """ The former BaseHTTPMiddleware based readiness gate, kept as a baseline for the latency benchmark """
+
+    def __init__(self, app, base_api: BaseApi):
+        super().__init__(app)
+        self.base_api = base_api
+
+    async def dispatch(self, request, call_next):
+        if any([request.url.path.startswith(route.value) for route in DefaultRoute]) or await self.base_api.is_ready():
+            return await call_next(request)
+
+        return JSONResponse(
+            content=service_unavailable_exception.detail,
+            status_code=service_unavailable_exception.status_code,
+        )
+
+
+class TestReadinessMiddleware(unittest.IsolatedAsyncioTestCase):
+    BACKEND_URL = "http://testserver"
+
+    async def test_readiness_gate(self):
+        ready = False
+        api = BaseApi(is_ready=lambda: ready, config=TestConfig)
+
+        @api.get("/gated")
+        async def gated_route():
+            return "Success!"
+
+        async with AsyncClient(app=api, base_url=self.BACKEND_URL) as client:
+            resp = await client.get("/gated")
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, resp.status_code)
+            self.assertIn(service_unavailable_exception.detail, resp.text)
+
+            resp = await client.get(DefaultRoute.liveness.value)
+            self.assertEqual(HTTPStatus.OK, resp.status_code)
+
+            resp = await client.get(DefaultRoute.readiness.value)
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, resp.status_code)
+
+            ready = True
+            resp = await client.get("/gated")
+            self.assertEqual(HTTPStatus.OK, resp.status_code)
+            self.assertEqual("Success!", resp.json())
+
+    async def test_readiness_evaluated_once(self):
+        num_calls = 0
+
+        def is_ready() -> bool:
+            nonlocal num_calls
+            num_calls += 1
+            return False
+
+        api = BaseApi(is_ready=is_ready, config=TestConfig)
+
+        @api.get("/gated")
+        async def gated_route():
+            return "Success!"
+
+        async with AsyncClient(app=api, base_url=self.BACKEND_URL) as client:
+            resp = await client.get("/gated")
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, resp.status_code)
+            self.assertEqual(1, num_calls, msg="Expected is_ready to be evaluated once on the failure path")
+
+            api.mark_ready()
+            resp = await client.get(DefaultRoute.readiness.value)
+            self.assertEqual(HTTPStatus.OK, resp.status_code)
+            self.assertIn("True", resp.text)
+            self.assertEqual(1, num_calls, msg="Expected pinned readiness state to skip the is_ready probe")
+
+    async def test_readiness_cache_ttl(self):
+        num_calls = 0
+
+        def is_ready() -> bool:
+            nonlocal num_calls
+            num_calls += 1
+            return True
+
+        api = BaseApi(is_ready=is_ready, config=TestConfig, readiness_cache_ttl=timedelta(minutes=1))
+
+        @api.get("/gated")
+        async def gated_route():
+            return "Success!"
+
+        async with AsyncClient(app=api, base_url=self.BACKEND_URL) as client:
+            for _ in range(5):
+                resp = await client.get("/gated")
+                self.assertEqual(HTTPStatus.OK, resp.status_code)
+
+            resp = await client.get(DefaultRoute.readiness.value)
+            self.assertEqual(HTTPStatus.OK, resp.status_code)
+
+        self.assertEqual(1, num_calls)
+
+    async def test_streaming_and_background_tasks(self):
+        api = BaseApi(is_ready=lambda: True, config=TestConfig)
+        background_results = []
+
+        @api.get("/stream")
+        async def stream_route(background_tasks: BackgroundTasks):
+            async def chunks():
+                for i in range(3):
+                    yield f"chunk-{i}\n"
+
+            background_tasks.add_task(lambda: background_results.append("done"))
+            return StreamingResponse(chunks(), background=background_tasks, media_type="text/plain")
+
+        async with AsyncClient(app=api, base_url=self.BACKEND_URL) as client:
+            resp = await client.get("/stream")
+
+        self.assertEqual(HTTPStatus.OK, resp.status_code)
+        self.assertEqual("chunk-0\nchunk-1\nchunk-2\n", resp.text)
+        self.assertEqual(["done"], background_results)
+
+    async def test_benchmark_readiness_middleware(self):
+        """ Compares request latency of the legacy BaseHTTPMiddleware and the pure ASGI ReadinessMiddleware under concurrent load """
+        num_requests = 500
+        concurrency = 50
+
+        def create_api(legacy: bool) -> BaseApi:
+            api = BaseApi(is_ready=lambda: True, config=TestConfig, global_readiness_middleware_enabled=not legacy)
+            if legacy:
+                api.add_middleware(LegacyReadinessMiddleware, base_api=api)
+
+            @api.get("/inference")
+            async def inference():
+                return "Success!"
+
+            return api
+
+        async def measure(api: BaseApi) -> List[float]:
+            latencies = []
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async with AsyncClient(app=api, base_url=self.BACKEND_URL) as client:
+                async def timed_request():
+                    async with semaphore:
+                        start = time.perf_counter()
+                        resp = await client.get("/inference")
+                        latencies.append(time.perf_counter() - start)
+                        self.assertEqual(HTTPStatus.OK, resp.status_code)
+
+                await asyncio.gather(*[timed_request() for _ in range(num_requests)])
+
+            return latencies
+
+        results = {
+            "BaseHTTPMiddleware": await measure(create_api(legacy=True)),
+            "ReadinessMiddleware (ASGI)": await measure(create_api(legacy=False)),
+        }
+
+        for name, latencies in results.items():
+            print(
+                f"{name}: mean={statistics.mean(latencies) * 1000:.2f}ms, "
+                f"p99={statistics.quantiles(latencies, n=100)[98] * 1000:.2f}ms over {num_requests} requests with concurrency {concurrency}"
+            )
+
+        # A loose bound, the ASGI middleware is typically several times faster
+        self.assertLess(statistics.mean(results["ReadinessMiddleware (ASGI)"]), statistics.mean(results["BaseHTTPMiddleware"]))
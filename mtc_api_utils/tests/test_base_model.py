@@ -1,6 +1,7 @@
 #  SPDX-License-Identifier: Apache-2.0
 #  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
 
+import asyncio
 import unittest
 from time import sleep
 
@@ -47,3 +48,17 @@ class TestApiTypes(unittest.TestCase):
 
         sleep(1.5)
         self.assertTrue(model.is_ready(), msg="Expect model to be done with initialization")
+
+    def test_readiness_state(self):
+        class TestModel(MLBaseModel):
+            def init_model(self):
+                sleep(1)
+
+            def inference(self, *args, **kwargs) -> bool:
+                return True
+
+        model = TestModel()
+        self.assertFalse(asyncio.run(model.readiness.is_ready()), msg="Expected readiness state to be pinned to not ready during initialization")
+
+        model.init_thread.join()
+        self.assertTrue(asyncio.run(model.readiness.is_ready()), msg="Expected model to mark its readiness state as ready after initialization")
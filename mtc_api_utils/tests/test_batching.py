@@ -0,0 +1,125 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from mtc_api_utils.base_model import MLBaseModel
+from mtc_api_utils.batching import MicroBatcher
+
+# Simulated cost of a forward pass: A fixed overhead per call plus a small cost per item
+FORWARD_PASS_OVERHEAD_SECONDS = 0.01
+FORWARD_PASS_ITEM_SECONDS = 0.0005
+
+
+class TestModel(MLBaseModel):
+    def init_model(self):
+        pass
+
+    def inference(self, item: int) -> int:
+        return self.batch_inference([item])[0]
+
+    def batch_inference(self, batch: List[int]) -> List[int]:
+        time.sleep(FORWARD_PASS_OVERHEAD_SECONDS + FORWARD_PASS_ITEM_SECONDS * len(batch))
+        return [item * 2 for item in batch]
+
+
+class TestMicroBatcher(unittest.IsolatedAsyncioTestCase):
+
+    async def test_max_batch_size(self):
+        batches = []
+
+        def batch_fn(batch: List[int]) -> List[int]:
+            batches.append(batch)
+            return [item + 1 for item in batch]
+
+        batcher = MicroBatcher(batch_fn=batch_fn, max_batch_size=4, max_wait_ms=1000)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(8)])
+
+        self.assertEqual([i + 1 for i in range(8)], results)
+        self.assertEqual([[0, 1, 2, 3], [4, 5, 6, 7]], batches)
+        self.assertLess(time.perf_counter() - start, 1, msg="Expected full batches to be flushed without waiting for max_wait_ms")
+
+        metrics = batcher.metrics
+        self.assertEqual(2, metrics.num_batches)
+        self.assertEqual(8, metrics.num_items)
+        self.assertEqual(4, metrics.max_batch_size)
+        self.assertEqual({4: 2}, metrics.batch_size_histogram)
+
+    async def test_max_wait(self):
+        async def batch_fn(batch: List[str]) -> List[str]:
+            return [item.upper() for item in batch]
+
+        batcher = MicroBatcher(batch_fn=batch_fn, max_batch_size=100, max_wait_ms=50)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+
+        self.assertEqual(["A", "B"], results)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual(1, batcher.metrics.num_batches)
+        self.assertGreaterEqual(batcher.metrics.max_queue_wait_ms, 50)
+
+    async def test_batch_exception(self):
+        def batch_fn(batch: List[int]) -> List[int]:
+            raise RuntimeError("Inference failed")
+
+        batcher = MicroBatcher(batch_fn=batch_fn, max_batch_size=2, max_wait_ms=10)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+        # Batches after a failing batch are still processed
+        batcher.batch_fn = lambda batch: batch
+        self.assertEqual(3, await batcher.submit(3))
+
+    async def test_result_count_mismatch(self):
+        batcher = MicroBatcher(batch_fn=lambda batch: batch[:1], max_batch_size=2, max_wait_ms=10)
+
+        with self.assertRaises(ValueError):
+            await asyncio.gather(batcher.submit(1), batcher.submit(2))
+
+    async def test_model_batched_inference(self):
+        model = TestModel()
+        model.init_thread.join()
+
+        with self.assertRaises(RuntimeError):
+            await model.batched_inference(1)
+
+        model.enable_batching(max_batch_size=8, max_wait_ms=5)
+        results = await asyncio.gather(*[model.batched_inference(i) for i in range(16)])
+
+        self.assertEqual([i * 2 for i in range(16)], results)
+        self.assertLess(model.batcher.metrics.num_batches, 16)
+
+    async def test_benchmark_batching(self):
+        """ Compares throughput of per-request inference and micro-batched inference for concurrent requests """
+        num_requests = 128
+
+        model = TestModel()
+        model.init_thread.join()
+        batcher = model.enable_batching(max_batch_size=32, max_wait_ms=5)
+
+        # Like the batcher, the per-request baseline runs one forward pass at a time on a dedicated thread
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            start = time.perf_counter()
+            await asyncio.gather(*[loop.run_in_executor(executor, model.inference, i) for i in range(num_requests)])
+            per_request_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await asyncio.gather(*[model.batched_inference(i) for i in range(num_requests)])
+        batched_seconds = time.perf_counter() - start
+
+        print(
+            f"Per-request inference: {num_requests / per_request_seconds:.0f} requests/s, "
+            f"micro-batched inference: {num_requests / batched_seconds:.0f} requests/s, "
+            f"metrics: {batcher.metrics.json()}"
+        )
+        # A loose bound, batches of 32 items amortize the per-call overhead roughly 7 fold
+        self.assertGreaterEqual(per_request_seconds / batched_seconds, 3, msg="Expected micro-batching to at least triple the throughput")
@@ -0,0 +1,124 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import os
+import threading
+import time
+import unittest
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from httpx import AsyncClient
+
+from mtc_api_utils.api import BaseApi
+from mtc_api_utils.base_model import MLBaseModel
+from mtc_api_utils.executor import InferenceExecutor
+from mtc_api_utils.tests.config import TestConfig
+
+
+def get_pid(_: int) -> int:
+    return os.getpid()
+
+
+class SlowModel(MLBaseModel):
+    def init_model(self):
+        pass
+
+    def inference(self, seconds: float) -> str:
+        time.sleep(seconds)
+        return threading.current_thread().name
+
+
+class PidModel(MLBaseModel):
+    def init_model(self):
+        # Holds a lock like most real models, which cannot be pickled
+        self.lock = threading.Lock()
+        self.offset = 1
+
+    def inference(self, value: int) -> tuple:
+        with self.lock:
+            return value + self.offset, os.getpid()
+
+
+class TestInferenceExecutor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrency_limit(self):
+        executor = InferenceExecutor(max_concurrency=2, max_queue_depth=10)
+        running = 0
+        max_running = 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+
+        await asyncio.gather(*[executor.run(work) for _ in range(8)])
+
+        self.assertEqual(2, max_running)
+        self.assertEqual(0, executor.num_pending)
+        executor.shutdown()
+
+    async def test_queue_full(self):
+        executor = InferenceExecutor(max_concurrency=1, max_queue_depth=1, retry_after_seconds=3)
+
+        results = await asyncio.gather(*[executor.run(time.sleep, 0.1) for _ in range(4)], return_exceptions=True)
+        rejected = [result for result in results if isinstance(result, HTTPException)]
+
+        self.assertEqual(2, len(rejected), msg="Expected calls beyond max_concurrency + max_queue_depth to be rejected")
+        self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, rejected[0].status_code)
+        self.assertEqual("3", rejected[0].headers["Retry-After"])
+
+        # Capacity is released again once calls have finished
+        await executor.run(time.sleep, 0)
+        self.assertEqual(0, executor.num_pending)
+        executor.shutdown()
+
+    async def test_process_pool(self):
+        executor = InferenceExecutor(max_concurrency=2, use_processes=True)
+
+        pids = await asyncio.gather(*[executor.run(get_pid, i) for i in range(4)])
+
+        self.assertNotIn(os.getpid(), pids)
+        executor.shutdown()
+
+    async def test_model_run_inference_in_processes(self):
+        model = PidModel(executor=InferenceExecutor(max_concurrency=2, use_processes=True))
+        model.init_thread.join()
+
+        results = await asyncio.gather(*[model.run_inference(i) for i in range(4)])
+
+        self.assertEqual([1, 2, 3, 4], [value for value, _ in results])
+        self.assertNotIn(os.getpid(), [pid for _, pid in results])
+
+        model.enable_batching(max_batch_size=4)
+        batched_results = await asyncio.gather(*[model.batched_inference(i) for i in range(4)])
+        self.assertEqual([1, 2, 3, 4], [value for value, _ in batched_results])
+        model.executor.shutdown()
+
+    async def test_model_run_inference(self):
+        model = SlowModel(executor=InferenceExecutor(max_concurrency=1, max_queue_depth=0))
+        model.init_thread.join()
+
+        api = BaseApi(is_ready=model.readiness, config=TestConfig)
+
+        @api.get("/inference")
+        async def inference():
+            return await model.run_inference(0.2)
+
+        async with AsyncClient(app=api, base_url="http://testserver") as client:
+            responses = await asyncio.gather(client.get("/inference"), client.get("/inference"))
+
+        status_codes = sorted(resp.status_code for resp in responses)
+        self.assertEqual([HTTPStatus.OK, HTTPStatus.SERVICE_UNAVAILABLE], status_codes)
+
+        rejected = next(resp for resp in responses if resp.status_code == HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual("1", rejected.headers["Retry-After"])
+
+        accepted = next(resp for resp in responses if resp.status_code == HTTPStatus.OK)
+        self.assertNotEqual(threading.current_thread().name, accepted.json())
@@ -2,15 +2,24 @@
 #  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
 
 # Test firebase client with test project
+import json
+import time
 import unittest
 from http import HTTPStatus
 from os.path import isfile
+from types import SimpleNamespace
+from unittest.mock import patch
 
-from fastapi import HTTPException
+import firebase_admin
+from fastapi import HTTPException, FastAPI
 from firebase_admin.auth import UserNotFoundError
+from httpx import AsyncClient
 
-from mtc_api_utils.clients.firebase_client import FirebaseClient
+from mtc_api_utils.clients import firebase_client as firebase_client_module
+from mtc_api_utils.api_types import FirebaseUser, AuthenticationRole
+from mtc_api_utils.clients.firebase_client import FirebaseClient, firebase_user_auth
 from mtc_api_utils.tests.config import TestConfig
+from mtc_api_utils.tests.firebase_fake import FakeFirebaseAuth
 
 TEST_EMAIL = "unittests@test.ch"
 TEST_PW = "mtc-test-pw-321"
@@ -82,6 +91,288 @@ class TestFirebaseClientReadonly(unittest.TestCase):
         )
 
 
+class TestTokenCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = FirebaseClient(config=TestConfig)
+        self.client.token_cache.clear()
+
+        self.claims = {"email": TEST_EMAIL, TEST_ROLE: True, "exp": time.time() + 3600}
+        self.verify_patch = patch.object(firebase_client_module.firebase_auth, "verify_id_token", side_effect=lambda *args, **kwargs: dict(self.claims))
+        self.verify_id_token = self.verify_patch.start()
+
+    def tearDown(self) -> None:
+        self.verify_patch.stop()
+
+    def verify_token(self, access_token: str):
+        return FirebaseClient.verify_token(access_token, cache=self.client.token_cache, check_revoked=self.client.check_revoked)
+
+    def test_cached_verification(self):
+        for _ in range(3):
+            user = self.verify_token("token")
+            self.assertEqual(TEST_EMAIL, user.email)
+            self.assertIn(TEST_ROLE, user.roles)
+
+        self.verify_id_token.assert_called_once()
+
+        self.verify_token("other-token")
+        self.assertEqual(2, self.verify_id_token.call_count)
+
+    def test_cached_user_is_copied(self):
+        self.verify_token("token").roles.append("admin")
+        self.assertNotIn("admin", self.verify_token("token").roles)
+
+    def test_expired_token_is_not_cached(self):
+        self.claims["exp"] = time.time() - 1
+
+        self.verify_token("token")
+        self.verify_token("token")
+
+        self.assertEqual(2, self.verify_id_token.call_count)
+
+    def test_invalid_token_is_not_cached(self):
+        self.verify_id_token.side_effect = ValueError("invalid token")
+
+        for _ in range(2):
+            with self.assertRaises(HTTPException) as context:
+                self.verify_token("invalid-token")
+            self.assertEqual(HTTPStatus.UNAUTHORIZED, context.exception.status_code)
+
+        self.assertEqual(2, self.verify_id_token.call_count)
+
+    def test_invalidate_token(self):
+        self.verify_token("token")
+        self.client.invalidate_token("token")
+        self.verify_token("token")
+
+        self.assertEqual(2, self.verify_id_token.call_count)
+
+    def test_default_token_cache(self):
+        firebase_client_module.default_token_cache.clear()
+
+        for _ in range(2):
+            self.assertEqual(TEST_EMAIL, FirebaseClient.verify_token("token").email)
+
+        self.verify_id_token.assert_called_once()
+        with self.assertRaises(HTTPException):
+            FirebaseClient.verify_token(None)
+
+    def test_check_revoked(self):
+        self.client.check_revoked = True
+        self.verify_token("token")
+
+        self.assertTrue(self.verify_id_token.call_args.kwargs["check_revoked"])
+
+
+class TestUserAuthViews(unittest.TestCase):
+    def setUp(self) -> None:
+        self.user_auth = firebase_user_auth(config=TestConfig)
+
+    def test_role_views_share_client(self):
+        role_auth = self.user_auth.with_roles([TEST_ROLE], include_special_rules=False)
+        admin_auth = self.user_auth.admin_only()
+
+        self.assertIs(self.user_auth.firebase_client, role_auth.firebase_client)
+        self.assertIs(self.user_auth.firebase_client, admin_auth.firebase_client)
+
+        self.assertEqual(frozenset(), self.user_auth.roles, msg="Expected role views to leave the original instance unchanged")
+        self.assertEqual(frozenset([TEST_ROLE]), role_auth.roles)
+        self.assertEqual(frozenset([AuthenticationRole.admin.value]), admin_auth.roles)
+        self.assertTrue(AuthenticationRole.special_roles_with_access_privileges().issubset(self.user_auth.with_roles([TEST_ROLE]).roles))
+
+    def test_views_are_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.user_auth.roles = frozenset([TEST_ROLE])
+
+    def test_authorize(self):
+        role_auth = self.user_auth.with_roles([TEST_ROLE], include_special_rules=False)
+
+        user = FirebaseUser(email=TEST_EMAIL, roles=["other", TEST_ROLE])
+        self.assertIs(user, role_auth.authorize(user))
+        self.assertIs(user, self.user_auth.authorize(user), msg="Expected a view without roles to accept any authenticated user")
+
+        with self.assertRaises(HTTPException) as context:
+            role_auth.authorize(FirebaseUser(email=TEST_EMAIL, roles=["other"]))
+        self.assertEqual(HTTPStatus.FORBIDDEN, context.exception.status_code)
+
+
+class FakeListUsersPage:
+    """ Mimics firebase_admin's ListUsersPage for a list of fake user records """
+
+    def __init__(self, users: list, page_size: int, offset: int = 0, fetched_pages: list = None):
+        self.all_users = users
+        self.page_size = page_size
+        self.offset = offset
+        self.fetched_pages = fetched_pages if fetched_pages is not None else []
+        self.fetched_pages.append(offset)
+
+        self.users = users[offset:offset + page_size]
+
+    @property
+    def has_next_page(self) -> bool:
+        return self.offset + self.page_size < len(self.all_users)
+
+    def get_next_page(self):
+        if not self.has_next_page:
+            return None
+        return FakeListUsersPage(self.all_users, self.page_size, self.offset + self.page_size, self.fetched_pages)
+
+
+class TestListUsers(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        class AuthEnabledConfig(TestConfig):
+            auth_enabled = True
+
+        with patch.dict(firebase_admin._apps, {"[DEFAULT]": None}):
+            self.client = FirebaseClient(config=AuthEnabledConfig)
+
+        self.users = [SimpleNamespace(email=f"user-{i}@test.ch", custom_claims={TEST_ROLE: True} if i % 2 else None) for i in range(25)]
+        self.fetched_pages = []
+
+        def list_users(max_results: int = 1000):
+            return FakeListUsersPage(self.users, page_size=max_results, fetched_pages=self.fetched_pages)
+
+        self.list_users_patch = patch.object(firebase_client_module.firebase_auth, "list_users", side_effect=list_users)
+        self.list_users_patch.start()
+
+    def tearDown(self) -> None:
+        self.list_users_patch.stop()
+
+    def test_iter_users(self):
+        users = list(self.client.iter_users(page_size=10))
+
+        self.assertEqual([user.email for user in self.users], [user.email for user in users])
+        self.assertEqual([TEST_ROLE], users[1].roles)
+        self.assertEqual([], users[0].roles)
+        self.assertEqual([0, 10, 20], self.fetched_pages)
+
+    def test_iter_users_prefetches_next_page(self):
+        users = self.client.iter_users(page_size=10)
+        next(users)
+        time.sleep(0.1)
+
+        self.assertEqual([0, 10], self.fetched_pages, msg="Expected the next page to be fetched while the first page is consumed")
+        users.close()
+
+    async def test_iter_users_async(self):
+        emails = [user.email async for user in self.client.iter_users_async(page_size=10)]
+
+        self.assertEqual([user.email for user in self.users], emails)
+        self.assertEqual([0, 10, 20], self.fetched_pages)
+
+    async def test_stream_users(self):
+        app = FastAPI()
+
+        @app.get("/users")
+        def users():
+            return self.client.stream_users(page_size=10)
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.get("/users")
+
+        self.assertEqual(HTTPStatus.OK, response.status_code)
+        self.assertEqual("application/x-ndjson", response.headers["Content-Type"])
+
+        lines = response.text.splitlines()
+        self.assertEqual(len(self.users), len(lines))
+        self.assertEqual(self.users[0].email, json.loads(lines[0])["email"])
+
+    def test_disabled(self):
+        disabled_client = FirebaseClient(config=TestConfig)
+
+        with self.assertRaises(HTTPException):
+            disabled_client.stream_users()
+        with self.assertRaises(HTTPException):
+            next(disabled_client.iter_users())
+
+
+class TestBulkUsers(unittest.TestCase):
+    def setUp(self) -> None:
+        class AuthEnabledConfig(TestConfig):
+            auth_enabled = True
+
+        with patch.dict(firebase_admin._apps, {"[DEFAULT]": None}):
+            self.client = FirebaseClient(config=AuthEnabledConfig)
+
+        self.fake_auth = FakeFirebaseAuth()
+        self.fake_auth_patch = self.fake_auth.patch()
+        self.fake_auth_patch.__enter__()
+
+        self.rounds_patch = patch.object(firebase_client_module, "PASSWORD_HASH_ROUNDS", 1000)
+        self.rounds_patch.start()
+
+    def tearDown(self) -> None:
+        self.rounds_patch.stop()
+        self.fake_auth_patch.__exit__(None, None, None)
+
+    def create_users(self, num_users: int):
+        users = [FirebaseUser(email=f"user-{i}@test.ch", password=f"{TEST_PW}-{i}", roles=[TEST_ROLE]) for i in range(num_users)]
+        return self.client.create_users(users)
+
+    def test_create_users(self):
+        results = self.create_users(3)
+
+        self.assertEqual([f"user-{i}@test.ch" for i in range(3)], [result.email for result in results])
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual({"get_users": 1, "import_users": 1}, self.fake_auth.num_calls, msg="Expected a single lookup & batch import for all users")
+
+        user = self.fake_auth.get_user_by_email("user-1@test.ch")
+        self.assertEqual({TEST_ROLE: True}, user.custom_claims)
+        self.assertTrue(self.fake_auth.check_password("user-1@test.ch", f"{TEST_PW}-1"))
+        self.assertFalse(self.fake_auth.check_password("user-1@test.ch", TEST_PW))
+
+    def test_create_users_batches(self):
+        with patch.object(firebase_client_module, "BULK_BATCH_SIZE", 2):
+            results = self.create_users(5)
+
+        self.assertEqual(5, len(results))
+        self.assertEqual(3, self.fake_auth.num_calls["import_users"])
+
+    def test_create_users_partial_failure(self):
+        self.create_users(1)
+        results = self.create_users(2)
+
+        self.assertFalse(results[0].success, msg="Expected importing an existing email to fail")
+        self.assertIsNotNone(results[0].error)
+        self.assertTrue(results[1].success)
+        self.assertEqual(2, len(self.fake_auth.users), msg="Expected no duplicate account to be imported")
+
+    def test_create_users_duplicate_emails(self):
+        users = [FirebaseUser(email=email, password=TEST_PW, roles=[]) for email in ["a@test.ch", "b@test.ch", "A@test.ch"]]
+
+        results = self.client.create_users(users)
+
+        self.assertEqual([True, True, False], [result.success for result in results])
+        self.assertEqual(["a@test.ch", "b@test.ch", "A@test.ch"], [result.email for result in results])
+        self.assertEqual(2, len(self.fake_auth.users))
+
+    def test_update_users_roles(self):
+        uids = [result.uid for result in self.create_users(3)]
+        self.fake_auth.failing_uids = {uids[1]}
+
+        results = self.client.update_users_roles({uid: ["updated"] for uid in uids})
+
+        self.assertEqual(uids, [result.uid for result in results])
+        self.assertEqual([True, False, True], [result.success for result in results])
+        self.assertEqual({"updated": True}, self.fake_auth.get_user(uids[0]).custom_claims)
+
+    def test_delete_users(self):
+        uids = [result.uid for result in self.create_users(3)]
+        self.fake_auth.failing_uids = {uids[2]}
+
+        results = self.client.delete_users(uids)
+
+        self.assertEqual([True, True, False], [result.success for result in results])
+        self.assertEqual(1, self.fake_auth.num_calls["delete_users"])
+        self.assertEqual([uids[2]], list(self.fake_auth.users.keys()))
+
+    def test_disabled(self):
+        disabled_client = FirebaseClient(config=TestConfig)
+
+        self.assertEqual([], disabled_client.create_users([FirebaseUser(email=TEST_EMAIL, roles=[])]))
+        self.assertEqual([], disabled_client.delete_users(["uid"]))
+        self.assertEqual({}, self.fake_auth.num_calls)
+
+
 @unittest.skip("The current authentication scheme only allows firebase service accounts to verify existing accounts (auth readonly)")
 class TestFirebaseClient(unittest.TestCase):
     def setUp(self) -> None:
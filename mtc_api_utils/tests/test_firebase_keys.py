@@ -0,0 +1,219 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import datetime
+import time
+import unittest
+from http import HTTPStatus
+from types import SimpleNamespace
+from unittest.mock import patch, PropertyMock
+
+import firebase_admin
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import FastAPI, Depends, HTTPException
+from google.auth import crypt, jwt
+from httpx import AsyncClient, MockTransport, Request, Response
+
+from mtc_api_utils.api_types import FirebaseUser
+from mtc_api_utils.clients import firebase_client as firebase_client_module
+from mtc_api_utils.clients.firebase_client import FirebaseClient, firebase_user_auth
+from mtc_api_utils.clients.firebase_keys import FirebasePublicKeys, ID_TOKEN_ISSUER_PREFIX, parse_max_age
+from mtc_api_utils.tests.config import TestConfig
+from mtc_api_utils.tests.fake_timer import FakeTimer
+
+TEST_PROJECT_ID = "mtc-test"
+TEST_EMAIL = "unittests@test.ch"
+
+
+def create_signing_key(key_id: str):
+    """ Returns a signer and the matching self-signed x509 certificate, as published by Google for Firebase ID tokens """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.datetime.utcnow()
+
+    certificate = x509.CertificateBuilder() \
+        .subject_name(name) \
+        .issuer_name(name) \
+        .public_key(private_key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(now - datetime.timedelta(days=1)) \
+        .not_valid_after(now + datetime.timedelta(days=1)) \
+        .sign(private_key, hashes.SHA256())
+
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+
+    return signer, certificate.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+
+
+def create_token(signer, project_id: str = TEST_PROJECT_ID, expires_in: int = 3600, **claims) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": f"{ID_TOKEN_ISSUER_PREFIX}{project_id}",
+        "aud": project_id,
+        "sub": "test-uid",
+        "iat": now - 10,
+        "exp": now + expires_in,
+        "email": TEST_EMAIL,
+        **claims,
+    }
+    return jwt.encode(signer, payload).decode("utf-8")
+
+
+class CertServer:
+    """ Serves the given certificates like Google's certificate endpoint and counts requests """
+
+    def __init__(self, certs: dict, max_age: int = 3600):
+        self.certs = certs
+        self.max_age = max_age
+        self.num_requests = 0
+
+    def handler(self, request: Request) -> Response:
+        self.num_requests += 1
+        return Response(HTTPStatus.OK, json=self.certs, headers={"Cache-Control": f"public, max-age={self.max_age}, must-revalidate, no-transform"})
+
+    def client(self) -> AsyncClient:
+        return AsyncClient(transport=MockTransport(self.handler))
+
+
+class TestFirebasePublicKeys(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.signer, self.cert = create_signing_key("key-1")
+        self.server = CertServer({"key-1": self.cert})
+        self.timer = FakeTimer()
+        self.keys = FirebasePublicKeys(http_client=self.server.client(), timer=self.timer)
+
+    def test_parse_max_age(self):
+        self.assertEqual(19302, parse_max_age("public, max-age=19302, must-revalidate, no-transform"))
+        self.assertIsNone(parse_max_age("no-cache"))
+        self.assertIsNone(parse_max_age(None))
+
+    async def test_verify_id_token(self):
+        claims = await self.keys.verify_id_token(create_token(self.signer, admin=True), project_id=TEST_PROJECT_ID)
+
+        self.assertEqual(TEST_EMAIL, claims["email"])
+        self.assertTrue(claims["admin"])
+
+    async def test_invalid_tokens(self):
+        other_signer, _ = create_signing_key("key-1")
+
+        invalid_tokens = {
+            "wrong project": create_token(self.signer, project_id="other-project"),
+            "expired": create_token(self.signer, expires_in=-10),
+            "wrong signature": create_token(other_signer),
+        }
+
+        for reason, token in invalid_tokens.items():
+            with self.subTest(reason=reason), self.assertRaises(ValueError):
+                await self.keys.verify_id_token(token, project_id=TEST_PROJECT_ID)
+
+    async def test_keys_are_cached(self):
+        token = create_token(self.signer)
+        await asyncio.gather(*[self.keys.verify_id_token(token, project_id=TEST_PROJECT_ID) for _ in range(10)])
+
+        self.assertEqual(1, self.server.num_requests, msg="Expected concurrent verifications to share a single key fetch")
+
+    async def test_background_refresh(self):
+        token = create_token(self.signer)
+        await self.keys.verify_id_token(token, project_id=TEST_PROJECT_ID)
+
+        # Keys are about to expire: the current keys are used while they are refreshed in the background
+        self.timer.now = self.server.max_age - 60
+        await self.keys.verify_id_token(token, project_id=TEST_PROJECT_ID)
+        self.assertEqual(1, self.server.num_requests)
+
+        await asyncio.sleep(0.01)
+        self.assertEqual(2, self.server.num_requests)
+        self.assertEqual(self.timer.now + self.server.max_age, self.keys.expires_at)
+
+    async def test_key_rotation(self):
+        await self.keys.get_certs()
+
+        rotated_signer, rotated_cert = create_signing_key("key-2")
+        self.server.certs = {"key-1": self.cert, "key-2": rotated_cert}
+
+        self.timer.now = 60
+        claims = await self.keys.verify_id_token(create_token(rotated_signer), project_id=TEST_PROJECT_ID)
+        self.assertEqual(TEST_EMAIL, claims["email"])
+
+        # Unknown keys do not trigger more than one refresh per min_refresh_interval
+        unknown_signer, _ = create_signing_key("key-3")
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                await self.keys.verify_id_token(create_token(unknown_signer), project_id=TEST_PROJECT_ID)
+
+        self.assertEqual(2, self.server.num_requests)
+
+        self.timer.now += self.keys.min_refresh_interval
+        with self.assertRaises(ValueError):
+            await self.keys.verify_id_token(create_token(unknown_signer), project_id=TEST_PROJECT_ID)
+        self.assertEqual(3, self.server.num_requests)
+
+
+class TestAsyncFirebaseUserAuth(unittest.IsolatedAsyncioTestCase):
+
+    async def test_async_dependency(self):
+        class AuthEnabledConfig(TestConfig):
+            auth_enabled = True
+
+        signer, cert = create_signing_key("key-1")
+        server = CertServer({"key-1": cert})
+        keys = FirebasePublicKeys(http_client=server.client())
+
+        with patch.dict(firebase_admin._apps, {"[DEFAULT]": None}), \
+                patch.object(FirebaseClient, "project_id", new_callable=PropertyMock, return_value=TEST_PROJECT_ID):
+            user_auth = firebase_user_auth(config=AuthEnabledConfig, use_async=True)
+            user_auth.firebase_client.public_keys = keys
+
+            app = FastAPI()
+
+            @app.get("/authenticated")
+            async def authenticated(user: FirebaseUser = Depends(user_auth)):
+                return user
+
+            @app.get("/admin")
+            async def admin(user: FirebaseUser = Depends(user_auth.admin_only())):
+                return user
+
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                headers = {"Authorization": f"Bearer {create_token(signer, viewer=True)}"}
+
+                response = await client.get("/authenticated", headers=headers)
+                self.assertEqual(HTTPStatus.OK, response.status_code)
+                self.assertEqual(TEST_EMAIL, response.json()["email"])
+                self.assertEqual(["viewer"], response.json()["roles"])
+
+                response = await client.get("/admin", headers=headers)
+                self.assertEqual(HTTPStatus.FORBIDDEN, response.status_code)
+
+                response = await client.get("/authenticated", headers={"Authorization": "Bearer invalid-token"})
+                self.assertEqual(HTTPStatus.UNAUTHORIZED, response.status_code)
+
+    async def test_check_revoked(self):
+        signer, cert = create_signing_key("key-1")
+        keys = FirebasePublicKeys(http_client=CertServer({"key-1": cert}).client())
+        token = create_token(signer)
+
+        with patch.object(FirebaseClient, "project_id", new_callable=PropertyMock, return_value=TEST_PROJECT_ID):
+            client = FirebaseClient(config=TestConfig, public_keys=keys)
+            client.check_revoked = True
+
+            valid_after = (int(time.time()) - 3600) * 1000
+            user_record = SimpleNamespace(disabled=False, tokens_valid_after_timestamp=valid_after)
+
+            with patch.object(firebase_client_module.firebase_auth, "get_user", return_value=user_record) as get_user, \
+                    patch.object(firebase_client_module.firebase_auth, "verify_id_token") as verify_id_token:
+                self.assertEqual(TEST_EMAIL, (await client.verify_token_async(token)).email)
+
+                get_user.assert_called_once_with("test-uid")
+                verify_id_token.assert_not_called()
+
+                user_record.tokens_valid_after_timestamp = int(time.time()) * 1000
+                client.invalidate_token(token)
+                with self.assertRaises(HTTPException):
+                    await client.verify_token_async(token)
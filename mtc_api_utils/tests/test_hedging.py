@@ -0,0 +1,112 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Dict, List
+
+import httpx
+from httpx import AsyncClient
+
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.hedging import Hedger, HedgingPolicy, LatencyHistogram, rewrite_url
+
+REPLICA_URLS = ["http://replica-0:5000", "http://replica-1:5000"]
+TEST_POLICY = HedgingPolicy(default_delay=timedelta(milliseconds=20), max_hedge_ratio=1.0)
+
+
+class FakeReplicas:
+    """ A transport answering requests to each replica host after the given delay in seconds """
+
+    def __init__(self, delays: Dict[str, float]):
+        self.delays = delays
+        self.requested_hosts: List[str] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requested_hosts.append(request.url.host)
+        await asyncio.sleep(self.delays[request.url.host])
+        return httpx.Response(HTTPStatus.OK, json={"host": request.url.host, "path": request.url.path}, request=request)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentile(self):
+        histogram = LatencyHistogram(window_size=100)
+        self.assertIsNone(histogram.percentile(95))
+
+        for latency in range(1, 101):
+            histogram.record(latency / 1000)
+
+        self.assertEqual(0.05, histogram.percentile(50))
+        self.assertEqual(0.095, histogram.percentile(95))
+        self.assertEqual(0.1, histogram.percentile(100))
+
+    def test_window(self):
+        histogram = LatencyHistogram(window_size=10)
+        for latency in range(20):
+            histogram.record(latency)
+
+        self.assertEqual(10, len(histogram))
+        self.assertEqual(10, histogram.percentile(1))
+
+    def test_rewrite_url(self):
+        self.assertEqual("http://replica-0:5000/api/inference", rewrite_url("http://model-api:5000/api/inference", "http://model-api:5000", REPLICA_URLS[0]))
+        self.assertEqual("http://other-api/api", rewrite_url("http://other-api/api", "http://model-api:5000", REPLICA_URLS[0]))
+
+
+class TestHedger(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.replicas = FakeReplicas({"model-api": 0.01, "replica-0": 0.5, "replica-1": 0.01})
+        self.async_client = AsyncClient(transport=httpx.MockTransport(self.replicas))
+
+    async def asyncTearDown(self) -> None:
+        await self.async_client.aclose()
+
+    async def test_hedges_slow_replica(self):
+        hedger = Hedger(REPLICA_URLS, policy=TEST_POLICY)
+
+        start = time.monotonic()
+        response = await hedger.request(lambda replica_url: self.async_client.get(f"{replica_url}/api/inference"))
+
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual("replica-1", response.json()["host"])
+        self.assertEqual((1, 1, 1), (hedger.num_requests, hedger.num_hedges, hedger.num_hedge_wins))
+
+    async def test_fast_replica_is_not_hedged(self):
+        hedger = Hedger(list(reversed(REPLICA_URLS)), policy=TEST_POLICY)
+
+        response = await hedger.request(lambda replica_url: self.async_client.get(f"{replica_url}/api/inference"))
+
+        self.assertEqual("replica-1", response.json()["host"])
+        self.assertEqual(0, hedger.num_hedges)
+        self.assertEqual(["replica-1"], self.replicas.requested_hosts)
+
+    async def test_hedge_rate_is_capped(self):
+        hedger = Hedger(REPLICA_URLS, policy=HedgingPolicy(default_delay=timedelta(milliseconds=20), max_hedge_ratio=0))
+
+        response = await hedger.request(lambda replica_url: self.async_client.get(f"{replica_url}/api/inference"))
+
+        self.assertEqual("replica-0", response.json()["host"])
+        self.assertEqual(0, hedger.num_hedges)
+
+    async def test_delay_follows_latency_percentile(self):
+        hedger = Hedger(REPLICA_URLS, policy=HedgingPolicy(percentile=90, min_samples=10, default_delay=timedelta(milliseconds=100)))
+        self.assertEqual(0.1, hedger.delay(REPLICA_URLS[0]))
+
+        for latency in range(1, 11):
+            hedger.histograms["http://replica-0:5000"].record(latency / 100)
+
+        self.assertEqual(0.09, hedger.delay(REPLICA_URLS[0]))
+
+    async def test_api_client_hedging(self):
+        client = ApiClient(backend_url="http://model-api:5000", async_client=self.async_client, replica_urls=REPLICA_URLS, hedging=TEST_POLICY)
+
+        response = await client.request_async("GET", "http://model-api:5000/api/inference")
+        self.assertEqual({"host": "replica-1", "path": "/api/inference"}, response.json())
+
+        response = await client.request_async("POST", "http://model-api:5000/api/inference", json={})
+        self.assertEqual(1, client.hedger.num_requests, msg="Expected POST requests not to be hedged")
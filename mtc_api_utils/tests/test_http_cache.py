@@ -0,0 +1,219 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import os
+import tempfile
+import unittest
+from email.utils import formatdate
+from http import HTTPStatus
+from typing import Dict, List
+
+import httpx
+from httpx import AsyncClient, Client
+
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.http_cache import DISK_ENTRIES_DIR, HttpCache, parse_cache_control
+from mtc_api_utils.tests.fake_timer import FakeTimer
+
+BACKEND_URL = "http://test"
+
+
+class FakeResource:
+    """ A transport serving a single versioned resource with the given headers, answering conditional requests with 304 Not Modified """
+
+    def __init__(self, headers: Dict[str, str], content: bytes = b'{"languages": ["de", "en"]}'):
+        self.headers = headers
+        self.content = content
+        self.version = "1"
+        self.requests: List[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        etag = f'"{self.version}"'
+
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(HTTPStatus.NOT_MODIFIED, headers={**self.headers, "ETag": etag}, request=request)
+        return httpx.Response(HTTPStatus.OK, headers={**self.headers, "ETag": etag}, content=self.content + self.version.encode(), request=request)
+
+
+class TestHttpCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.timer = FakeTimer(now=1_700_000_000.0)
+
+    def api_client(self, resource: FakeResource, cache: HttpCache) -> ApiClient:
+        return ApiClient(
+            backend_url=BACKEND_URL,
+            http_client=Client(transport=httpx.MockTransport(resource)),
+            async_client=AsyncClient(transport=httpx.MockTransport(resource)),
+            http_cache=cache,
+        )
+
+    def test_parse_cache_control(self):
+        self.assertEqual({"max-age": "60", "no-cache": None, "private": None}, parse_cache_control('max-age="60", No-Cache, private'))
+
+    def test_fresh_responses_are_cached(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+        cache = HttpCache(timer=self.timer)
+        client = self.api_client(resource, cache)
+
+        responses = [client.request("GET", f"{BACKEND_URL}/api/languages") for _ in range(3)]
+
+        self.assertEqual(1, len(resource.requests))
+        self.assertEqual([responses[0].content] * 3, [response.content for response in responses])
+        self.assertEqual((2, 0, 1), (cache.hits, cache.revalidated, cache.misses))
+
+    def test_params_are_part_of_the_key(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+        client = self.api_client(resource, HttpCache(timer=self.timer))
+
+        for params in [{"q": "a"}, {"q": "b"}, {"q": "a"}]:
+            response = client.request("GET", f"{BACKEND_URL}/api/languages", params=params)
+            self.assertEqual(f"q={params['q']}", response.request.url.query.decode())
+
+        self.assertEqual(["q=a", "q=b"], [request.url.query.decode() for request in resource.requests])
+
+    def test_cached_responses_have_a_request(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+        client = self.api_client(resource, HttpCache(timer=self.timer))
+
+        client.request("GET", f"{BACKEND_URL}/api/languages")
+        response = client.request("GET", f"{BACKEND_URL}/api/languages")
+
+        response.raise_for_status()
+        self.assertEqual(f"{BACKEND_URL}/api/languages", str(response.url))
+        self.assertEqual(1, len(resource.requests))
+
+    def test_stale_responses_are_revalidated(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+        cache = HttpCache(timer=self.timer)
+        client = self.api_client(resource, cache)
+
+        client.request("GET", f"{BACKEND_URL}/api/languages")
+        self.timer.now += 61
+
+        response = client.request("GET", f"{BACKEND_URL}/api/languages")
+        self.assertEqual(HTTPStatus.OK, response.status_code)
+        self.assertEqual(b'{"languages": ["de", "en"]}1', response.content)
+        self.assertEqual('"1"', resource.requests[-1].headers["if-none-match"])
+        self.assertEqual(1, cache.revalidated)
+
+        client.request("GET", f"{BACKEND_URL}/api/languages")
+        self.assertEqual(2, len(resource.requests), msg="Expected the revalidated response to be fresh again")
+
+        self.timer.now += 61
+        resource.version = "2"
+        response = client.request("GET", f"{BACKEND_URL}/api/languages")
+        self.assertEqual(b'{"languages": ["de", "en"]}2', response.content)
+
+    def test_no_store_and_no_cache(self):
+        resource = FakeResource({"Cache-Control": "no-store"})
+        cache = HttpCache(timer=self.timer)
+        client = self.api_client(resource, cache)
+
+        client.request("GET", f"{BACKEND_URL}/api/languages")
+        client.request("GET", f"{BACKEND_URL}/api/languages")
+        self.assertNotIn("if-none-match", resource.requests[-1].headers)
+
+        resource.headers = {"Cache-Control": "no-cache"}
+        client.request("GET", f"{BACKEND_URL}/api/other")
+        client.request("GET", f"{BACKEND_URL}/api/other")
+        self.assertIn("if-none-match", resource.requests[-1].headers, msg="Expected no-cache responses to be stored, but always revalidated")
+        self.assertEqual(4, len(resource.requests))
+
+    def test_expires_and_heuristic_freshness(self):
+        cache = HttpCache(timer=self.timer)
+        date = formatdate(self.timer.now, usegmt=True)
+
+        headers = httpx.Headers({"Date": date, "Expires": formatdate(self.timer.now + 30, usegmt=True)})
+        self.assertEqual(30, cache.freshness_lifetime(headers, self.timer.now))
+
+        headers = httpx.Headers({"Date": date, "Last-Modified": formatdate(self.timer.now - 1000, usegmt=True)})
+        self.assertEqual(100, cache.freshness_lifetime(headers, self.timer.now))
+
+        headers = httpx.Headers({"Cache-Control": "max-age=60", "Age": "20", "Expires": "0"})
+        self.assertEqual(40, cache.freshness_lifetime(headers, self.timer.now))
+
+    def test_authorization_is_part_of_the_key(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+        client = self.api_client(resource, HttpCache(timer=self.timer))
+
+        client.request("GET", f"{BACKEND_URL}/api/languages", headers=client.get_headers(access_token="a"))
+        client.request("GET", f"{BACKEND_URL}/api/languages", headers=client.get_headers(access_token="b"))
+
+        self.assertEqual(2, len(resource.requests))
+
+    def test_max_bytes(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"}, content=b"x" * 100)
+        cache = HttpCache(max_bytes=300, timer=self.timer)
+        client = self.api_client(resource, cache)
+
+        for index in range(5):
+            client.request("GET", f"{BACKEND_URL}/api/{index}")
+
+        client.request("GET", f"{BACKEND_URL}/api/0")
+        self.assertEqual(6, len(resource.requests), msg="Expected the least recently used response to be evicted")
+
+    def test_disk_store(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.api_client(resource, HttpCache(cache_dir=cache_dir, timer=self.timer)).request("GET", f"{BACKEND_URL}/api/languages")
+            self.assertEqual([DISK_ENTRIES_DIR], os.listdir(cache_dir))
+            self.assertEqual(2, len(os.listdir(os.path.join(cache_dir, DISK_ENTRIES_DIR))))
+
+            cache = HttpCache(cache_dir=cache_dir, timer=self.timer)
+            response = self.api_client(resource, cache).request("GET", f"{BACKEND_URL}/api/languages")
+
+        self.assertEqual(1, len(resource.requests))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(b'{"languages": ["de", "en"]}1', response.content)
+
+    def test_disk_store_is_bounded(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"}, content=b"x" * 100)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with open(os.path.join(cache_dir, "settings.json"), "w") as file:
+                file.write("{}" * 1000)
+
+            cache = HttpCache(cache_dir=cache_dir, max_disk_bytes=1000, timer=self.timer)
+            client = self.api_client(resource, cache)
+
+            for index in range(5):
+                client.request("GET", f"{BACKEND_URL}/api/{index}")
+                # Spread the modification times, since they may otherwise be equal on coarse grained file systems
+                meta_path = os.path.join(cache.entries_dir, f"{HttpCache.cache_key(f'{BACKEND_URL}/api/{index}', httpx.Headers())}.json")
+                os.utime(meta_path, (self.timer.now + index, self.timer.now + index))
+
+            entry_files = os.listdir(cache.entries_dir)
+            self.assertLessEqual(sum(os.path.getsize(os.path.join(cache.entries_dir, file_name)) for file_name in entry_files), 1000)
+            self.assertLess(len(entry_files), 10)
+            self.assertIn("settings.json", os.listdir(cache_dir), msg="Expected files outside of the cache's entries directory not to be evicted")
+            self.assertIsNone(HttpCache(cache_dir=cache_dir, timer=self.timer).lookup(HttpCache.cache_key(f"{BACKEND_URL}/api/0", httpx.Headers())))
+
+    def test_clear_only_removes_cache_files(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for file_name in ["README.md", "settings.json"]:
+                with open(os.path.join(cache_dir, file_name), "w") as file:
+                    file.write("{}")
+
+            cache = HttpCache(cache_dir=cache_dir, timer=self.timer)
+            self.api_client(resource, cache).request("GET", f"{BACKEND_URL}/api/languages")
+            cache.clear()
+
+            self.assertEqual(sorted(["README.md", "settings.json", DISK_ENTRIES_DIR]), sorted(os.listdir(cache_dir)))
+            self.assertEqual([], os.listdir(cache.entries_dir))
+
+    async def test_async_and_parallel_get(self):
+        resource = FakeResource({"Cache-Control": "max-age=60"})
+        cache = HttpCache(timer=self.timer)
+        client = self.api_client(resource, cache)
+
+        await client.request_async("GET", f"{BACKEND_URL}/api/languages", headers=client.get_headers(access_token="token"))
+        responses = await client.parallel_get(urls=[f"{BACKEND_URL}/api/languages", f"{BACKEND_URL}/api/other"], access_token="token")
+
+        self.assertEqual(2, len(resource.requests))
+        self.assertTrue(all(response.status_code == HTTPStatus.OK for response in responses.values()))
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
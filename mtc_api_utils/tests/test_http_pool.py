@@ -0,0 +1,100 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import unittest
+from datetime import timedelta
+
+from httpx import AsyncClient, Client
+
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.http_pool import HttpClientPool, backend_key
+from mtc_api_utils.tests.artifact_server import ArtifactServer
+
+
+class TestHttpClientPool(unittest.TestCase):
+
+    def test_backend_key(self):
+        self.assertEqual("http://model-api:5000", backend_key("http://model-api:5000/api/inference?x=1"))
+        self.assertEqual("https://github.com", backend_key("https://github.com"))
+
+    def test_clients_per_backend(self):
+        with HttpClientPool() as pool:
+            client = pool.client("http://model-api:5000/api/status")
+
+            self.assertIs(client, pool.client("http://model-api:5000/api/readiness"))
+            self.assertIsNot(client, pool.client("http://other-api:5000"))
+
+        self.assertTrue(client.is_closed, msg="Expected the pool to close its clients on exit")
+
+    def test_limits(self):
+        pool = HttpClientPool(max_connections=7, max_keepalive_connections=3, keepalive_expiry=timedelta(seconds=10))
+
+        self.assertEqual(7, pool.limits.max_connections)
+        self.assertEqual(3, pool.limits.max_keepalive_connections)
+        self.assertEqual(10, pool.limits.keepalive_expiry)
+        pool.close()
+
+    def test_http2_requires_h2(self):
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            with self.assertRaises(ImportError):
+                HttpClientPool(http2=True)
+        else:
+            HttpClientPool(http2=True).close()
+
+    def test_async_clients_per_event_loop(self):
+        pool = HttpClientPool()
+
+        async def get_client():
+            client = pool.async_client("http://model-api:5000")
+            self.assertIs(client, pool.async_client("http://model-api:5000/api/status"))
+            return client
+
+        first_loop_client = asyncio.run(get_client())
+        second_loop_client = asyncio.run(get_client())
+
+        self.assertIsNot(first_loop_client, second_loop_client)
+
+    def test_async_context_manager(self):
+        async def use_pool():
+            async with HttpClientPool() as pool:
+                client = pool.async_client("http://model-api:5000")
+            return client
+
+        self.assertTrue(asyncio.run(use_pool()).is_closed)
+
+    def test_connection_reuse(self):
+        with ArtifactServer({"status": b"{}"}) as server, HttpClientPool() as pool:
+            api_clients = [ApiClient(backend_url=server.base_url, client_pool=pool) for _ in range(3)]
+            self.assertEqual(1, len({id(api_client.http_client) for api_client in api_clients}))
+
+            for api_client in api_clients:
+                api_client.http_client.get(server.url("status")).raise_for_status()
+
+    def test_explicit_client(self):
+        with Client() as http_client:
+            api_client = ApiClient(backend_url="http://model-api:5000", http_client=http_client)
+            self.assertIs(http_client, api_client.http_client)
+
+    def test_assign_clients(self):
+        with HttpClientPool() as pool, Client() as http_client:
+            api_client = ApiClient(backend_url="http://model-api:5000", client_pool=pool)
+
+            api_client.http_client = http_client
+            self.assertIs(http_client, api_client.http_client)
+
+            api_client.http_client = None
+            self.assertIs(pool.client("http://model-api:5000"), api_client.http_client)
+
+            async_client = AsyncClient()
+            api_client.async_client = async_client
+            self.assertIs(async_client, api_client.async_client)
+
+    def test_async_client_outside_of_event_loop(self):
+        pool = HttpClientPool()
+        client = ApiClient(backend_url="http://model-api:5000", client_pool=pool).async_client
+
+        self.assertIsInstance(client, AsyncClient)
+        self.assertIsNot(client, pool.async_client("http://model-api:5000"), msg="Expected clients created outside of an event loop not to be pooled")
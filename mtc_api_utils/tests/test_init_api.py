@@ -1,14 +1,27 @@
 #  SPDX-License-Identifier: Apache-2.0
 #  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
 
+import hashlib
+import io
 import os
 import shutil
+import tarfile
+import tempfile
+import time
 import unittest
+from unittest.mock import patch
 
-from mtc_api_utils.init_api import download_if_not_exists, stem_tar_filename
+from httpx import HTTPError
+
+from mtc_api_utils import init_api
+from mtc_api_utils.init_api import download_if_not_exists, stem_tar_filename, split_byte_ranges, part_file_paths, artifact_exists, \
+    DownloadManifest, ArtifactSpec, download_all_if_not_exist, TransferMonitor, Checksum, ArtifactIntegrityError, digest_file_path, verify_artifact
+from mtc_api_utils.tests.artifact_server import ArtifactServer
 from mtc_api_utils.tests.config import TestConfig
 
 TEST_DOWNLOAD_DIR = "/tmp/test/download"
+TEST_AUTH = ("user", "password")
+TEST_PART_BYTES = 1024
 
 
 class TestInitApi(unittest.TestCase):
@@ -48,3 +61,344 @@ class TestInitApi(unittest.TestCase):
         self.assertTrue(os.path.isdir(download_dir))
 
         shutil.rmtree(download_dir)
+
+
+class TestLocalDownloads(unittest.TestCase):
+    """
+    Tests downloads against a local artifact server
+    """
+
+    artifact = os.urandom(10 * TEST_PART_BYTES + 123)
+
+    def setUp(self) -> None:
+        self.download_dir = tempfile.mkdtemp()
+        self.part_bytes_patch = patch.object(init_api, "RANGE_PART_BYTES", TEST_PART_BYTES)
+        self.part_bytes_patch.start()
+
+    def tearDown(self) -> None:
+        self.part_bytes_patch.stop()
+        shutil.rmtree(self.download_dir)
+
+    def test_split_byte_ranges(self):
+        self.assertEqual([(0, 9), (10, 19), (20, 24)], split_byte_ranges(25, 10))
+        self.assertEqual([(0, 9)], split_byte_ranges(10, 10))
+        self.assertEqual([], split_byte_ranges(0, 10))
+
+    def test_parallel_download(self):
+        with ArtifactServer({"model.bin": self.artifact}) as server:
+            file_path = download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, num_connections=4)
+
+            range_requests = [request for request in server.requests if request[0] == "GET"]
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+        self.assertEqual(11, len(range_requests))
+        self.assertTrue(all(range_header is not None for _, _, range_header in range_requests))
+
+    def test_parallel_download_fallback(self):
+        with ArtifactServer({"model.bin": self.artifact}, support_ranges=False) as server:
+            file_path = download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, num_connections=4)
+
+            get_requests = [request for request in server.requests if request[0] == "GET"]
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+        self.assertEqual(1, len(get_requests), msg="Expected a single stream download if ranges are not supported")
+
+    def test_range_fallback_progress(self):
+        with ArtifactServer({"model.bin": self.artifact}) as server, TransferMonitor() as monitor:
+            info = init_api.probe_artifact(server.url("model.bin"), TEST_AUTH)
+
+            # The server stops answering range requests after the artifact has been probed
+            server.support_ranges = False
+            file_path = init_api.download_artifact_with_progress(
+                server.url("model.bin"), os.path.join(self.download_dir, "model.bin"), TEST_AUTH, num_connections=4, info=info, monitor=monitor,
+            )
+
+            self.assertEqual(len(self.artifact), monitor._progress.total, msg="Expected the size of the artifact to be counted once")
+            self.assertEqual(len(self.artifact), monitor._progress.n)
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+    def test_resume_stream_download(self):
+        abort_after_bytes = 3 * TEST_PART_BYTES
+
+        with ArtifactServer({"model.bin": self.artifact}, abort_after_bytes=abort_after_bytes) as server:
+            with self.assertRaises(HTTPError):
+                download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH)
+
+            file_path = os.path.join(self.download_dir, "model.bin")
+            part_path, manifest_path = part_file_paths(file_path)
+            self.assertFalse(artifact_exists(file_path), msg="Expected an interrupted download to not be treated as an existing artifact")
+            self.assertEqual(abort_after_bytes, os.path.getsize(part_path))
+            self.assertTrue(os.path.isfile(manifest_path))
+
+            server.abort_after_bytes = None
+            server.requests.clear()
+            download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH)
+
+            get_requests = [request for request in server.requests if request[0] == "GET"]
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+        self.assertEqual([f"bytes={abort_after_bytes}-"], [range_header for _, _, range_header in get_requests])
+        self.assertFalse(os.path.exists(part_path))
+        self.assertFalse(os.path.exists(manifest_path))
+
+    def test_resume_parallel_download(self):
+        file_path = os.path.join(self.download_dir, "model.bin")
+        part_path, manifest_path = part_file_paths(file_path)
+
+        with ArtifactServer({"model.bin": self.artifact}) as server:
+            # Simulate a download which was interrupted after completing the first two ranges
+            completed_ranges = [(0, TEST_PART_BYTES - 1), (TEST_PART_BYTES, 2 * TEST_PART_BYTES - 1)]
+            with open(part_path, "wb") as part_file:
+                part_file.truncate(len(self.artifact))
+                part_file.write(self.artifact[:2 * TEST_PART_BYTES])
+
+            DownloadManifest(
+                url=server.url("model.bin"),
+                total_bytes=len(self.artifact),
+                etag=server.etag(self.artifact),
+                last_modified=None,
+                mode="ranges",
+                part_bytes=TEST_PART_BYTES,
+                completed_ranges=completed_ranges,
+            ).save(manifest_path)
+
+            download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, num_connections=2)
+
+            range_headers = [range_header for method, _, range_header in server.requests if method == "GET"]
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+        self.assertEqual(9, len(range_headers), msg="Expected only the missing ranges to be downloaded")
+        self.assertNotIn(f"bytes=0-{TEST_PART_BYTES - 1}", range_headers)
+
+    def test_changed_artifact_restarts_download(self):
+        with ArtifactServer({"model.bin": self.artifact}, abort_after_bytes=TEST_PART_BYTES) as server:
+            with self.assertRaises(HTTPError):
+                download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH)
+
+            updated_artifact = os.urandom(len(self.artifact))
+            server.artifacts["model.bin"] = updated_artifact
+            server.abort_after_bytes = None
+            file_path = download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH)
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(updated_artifact, f.read())
+
+    @staticmethod
+    def create_tarball(mode: str, files: dict) -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode=mode) as tarball:
+            for name, content in files.items():
+                info = tarfile.TarInfo(name=name)
+                info.size = len(content)
+                tarball.addfile(info, io.BytesIO(content))
+
+        return buffer.getvalue()
+
+    def test_stream_extract(self):
+        files = {"test_model/weights.bin": self.artifact, "test_model/config.json": b"{}"}
+
+        for extension, mode in [("tar.gz", "w:gz"), ("tar.xz", "w:xz"), ("tar", "w")]:
+            with self.subTest(extension=extension):
+                artifact_name = f"test_model.{extension}"
+                with ArtifactServer({artifact_name: self.create_tarball(mode, files)}) as server:
+                    extracted_dir = download_if_not_exists(server.url(artifact_name), self.download_dir, TEST_AUTH, is_tar=True, stream_extract=True)
+
+                self.assertEqual(os.path.join(self.download_dir, "test_model"), extracted_dir)
+                with open(os.path.join(extracted_dir, "weights.bin"), "rb") as f:
+                    self.assertEqual(self.artifact, f.read())
+
+                self.assertEqual(["test_model"], os.listdir(self.download_dir), msg="Expected neither the tarball nor temporary files to remain on disk")
+                shutil.rmtree(extracted_dir)
+
+    def test_stream_extract_zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            self.skipTest("Optional zstandard package is not installed")
+
+        tarball = self.create_tarball("w", {"test_model/weights.bin": self.artifact})
+        with ArtifactServer({"test_model.tar.zst": zstandard.ZstdCompressor().compress(tarball)}) as server:
+            extracted_dir = download_if_not_exists(server.url("test_model.tar.zst"), self.download_dir, TEST_AUTH, is_tar=True, stream_extract=True)
+
+        with open(os.path.join(extracted_dir, "weights.bin"), "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+    def test_stream_extract_interrupted(self):
+        tarball = self.create_tarball("w", {"test_model/weights.bin": self.artifact})
+
+        with ArtifactServer({"test_model.tar": tarball}, abort_after_bytes=len(tarball) // 2) as server:
+            with self.assertRaises(HTTPError):
+                download_if_not_exists(server.url("test_model.tar"), self.download_dir, TEST_AUTH, is_tar=True, stream_extract=True)
+
+        self.assertEqual([], os.listdir(self.download_dir), msg="Expected partially extracted files to be removed")
+
+    def test_extract_interrupted(self):
+        tarball = self.create_tarball("w", {"test_model/config.json": b"{}", "test_model/weights.bin": self.artifact})
+
+        # The tarball is truncated within the second member, such that extraction fails after the first member has been extracted
+        with ArtifactServer({"test_model.tar": tarball[:len(tarball) // 2]}) as server:
+            with self.assertRaises(tarfile.ReadError):
+                download_if_not_exists(server.url("test_model.tar"), self.download_dir, TEST_AUTH, is_tar=True)
+
+        self.assertNotIn("test_model", os.listdir(self.download_dir), msg="Expected partially extracted files not to be moved into place")
+        self.assertFalse(artifact_exists(os.path.join(self.download_dir, "test_model"), is_tar=True))
+
+    def test_download_all(self):
+        artifacts = {f"artifact-{i}.bin": os.urandom(2 * TEST_PART_BYTES) for i in range(4)}
+
+        with ArtifactServer(artifacts) as server:
+            specs = [ArtifactSpec(artifact_url=server.url(name), download_dir=self.download_dir) for name in artifacts.keys()]
+            paths = download_all_if_not_exist(specs, TEST_AUTH, max_concurrency=4)
+
+        self.assertEqual([os.path.join(self.download_dir, name) for name in artifacts.keys()], paths)
+        for file_path, content in zip(paths, artifacts.values()):
+            with open(file_path, "rb") as f:
+                self.assertEqual(content, f.read())
+
+    def test_download_all_failure(self):
+        with ArtifactServer({"model.bin": self.artifact}) as server:
+            specs = [
+                ArtifactSpec(artifact_url=server.url("model.bin"), download_dir=self.download_dir),
+                ArtifactSpec(artifact_url=server.url("missing.bin"), download_dir=self.download_dir),
+            ]
+
+            with self.assertRaises(HTTPError):
+                download_all_if_not_exist(specs, TEST_AUTH)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.download_dir, "model.bin")), msg="Expected other downloads to complete despite the failure")
+
+    def test_bandwidth_cap(self):
+        max_bytes_per_second = 20 * TEST_PART_BYTES
+
+        with ArtifactServer({"model.bin": self.artifact}) as server:
+            start = time.monotonic()
+            download_all_if_not_exist([ArtifactSpec(server.url("model.bin"), self.download_dir)], TEST_AUTH, max_bytes_per_second=max_bytes_per_second)
+            duration = time.monotonic() - start
+
+        self.assertGreaterEqual(duration, len(self.artifact) / max_bytes_per_second * 0.8)
+
+    def test_transfer_monitor(self):
+        with TransferMonitor() as monitor:
+            monitor.add_total(100)
+            monitor.add_total(50)
+            monitor.update(120)
+
+            self.assertEqual(150, monitor._progress.total)
+            self.assertEqual(120, monitor._progress.n)
+
+    def sha256(self, content: bytes) -> str:
+        return f"sha256:{hashlib.sha256(content).hexdigest()}"
+
+    def test_parse_checksum(self):
+        self.assertEqual(Checksum("sha256", "abcd"), Checksum.parse("SHA256:ABCD"))
+        self.assertEqual(Checksum("blake2b", "abcd"), Checksum.parse("blake2b:abcd"))
+
+        with self.assertRaises(ValueError):
+            Checksum.parse("abcd")
+        with self.assertRaises(ValueError):
+            Checksum.parse("unknown:abcd")
+
+    def test_checksum(self):
+        for num_connections in [1, 4]:
+            with self.subTest(num_connections=num_connections), ArtifactServer({"model.bin": self.artifact}) as server:
+                file_path = download_if_not_exists(
+                    server.url("model.bin"), self.download_dir, TEST_AUTH, num_connections=num_connections, checksum=self.sha256(self.artifact),
+                )
+
+                with open(file_path, "rb") as f:
+                    self.assertEqual(self.artifact, f.read())
+                self.assertTrue(os.path.isfile(digest_file_path(file_path)))
+
+                os.remove(file_path)
+
+    def test_checksum_mismatch(self):
+        with ArtifactServer({"model.bin": self.artifact}) as server:
+            with self.assertRaises(ArtifactIntegrityError):
+                download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, checksum=self.sha256(b"other content"))
+
+        self.assertEqual([], os.listdir(self.download_dir), msg="Expected the corrupt download to be discarded")
+
+    def test_checksum_resumed_stream_download(self):
+        with ArtifactServer({"model.bin": self.artifact}, abort_after_bytes=3 * TEST_PART_BYTES) as server:
+            with self.assertRaises(HTTPError):
+                download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, checksum=self.sha256(self.artifact))
+
+            server.abort_after_bytes = None
+            file_path = download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, checksum=self.sha256(self.artifact))
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+    def test_stream_extract_checksum(self):
+        tarball = self.create_tarball("w:gz", {"test_model/weights.bin": self.artifact})
+
+        with ArtifactServer({"test_model.tar.gz": tarball}) as server:
+            with self.assertRaises(ArtifactIntegrityError):
+                download_if_not_exists(
+                    server.url("test_model.tar.gz"), self.download_dir, TEST_AUTH, is_tar=True, stream_extract=True, checksum=self.sha256(b"other content"),
+                )
+            self.assertEqual([], os.listdir(self.download_dir), msg="Expected the extracted files of a corrupt artifact to be discarded")
+
+            extracted_dir = download_if_not_exists(
+                server.url("test_model.tar.gz"), self.download_dir, TEST_AUTH, is_tar=True, stream_extract=True, checksum=self.sha256(tarball),
+            )
+
+        with open(os.path.join(extracted_dir, "weights.bin"), "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+        self.assertEqual(["test_model"], os.listdir(self.download_dir))
+
+    def test_extract_checksum(self):
+        tarball = self.create_tarball("w:gz", {"test_model/weights.bin": self.artifact})
+
+        with ArtifactServer({"test_model.tar.gz": tarball}) as server:
+            extracted_dir = download_if_not_exists(server.url("test_model.tar.gz"), self.download_dir, TEST_AUTH, is_tar=True, checksum=self.sha256(tarball))
+
+        with open(os.path.join(extracted_dir, "weights.bin"), "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+        self.assertEqual(["test_model"], os.listdir(self.download_dir), msg="Expected neither the tarball nor its digest file to remain on disk")
+
+    def test_fast_verify(self):
+        checksum = self.sha256(self.artifact)
+
+        with ArtifactServer({"model.bin": self.artifact}) as server:
+            file_path = download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, checksum=checksum)
+
+            with patch.object(init_api, "hash_file", wraps=init_api.hash_file) as hash_file:
+                self.assertTrue(verify_artifact(file_path, Checksum.parse(checksum)))
+                hash_file.assert_not_called()
+
+                self.assertTrue(verify_artifact(file_path, Checksum.parse(checksum), full_verify=True))
+                hash_file.assert_called_once()
+
+            # Corrupt the artifact in place, which changes its mtime
+            with open(file_path, "r+b") as f:
+                f.write(b"corrupt")
+            self.assertFalse(verify_artifact(file_path, Checksum.parse(checksum)))
+
+            server.requests.clear()
+            download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, checksum=checksum)
+            self.assertTrue(any(method == "GET" for method, _, _ in server.requests), msg="Expected a corrupt artifact to be downloaded again")
+
+        with open(file_path, "rb") as f:
+            self.assertEqual(self.artifact, f.read())
+
+    def test_xxhash_checksum(self):
+        try:
+            import xxhash
+        except ImportError:
+            self.skipTest("Optional xxhash package is not installed")
+
+        with ArtifactServer({"model.bin": self.artifact}) as server:
+            file_path = download_if_not_exists(server.url("model.bin"), self.download_dir, TEST_AUTH, checksum=f"xxh3_64:{xxhash.xxh3_64_hexdigest(self.artifact)}")
+
+        self.assertTrue(os.path.isfile(file_path))
@@ -0,0 +1,133 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import random
+import unittest
+from collections import Counter
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Dict
+
+import httpx
+from httpx import AsyncClient, Client
+
+from mtc_api_utils.api_types import ApiStatus
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.load_balancing import BalancingStrategy, ReplicaSet
+from mtc_api_utils.tests.fake_timer import FakeTimer
+
+REPLICA_URLS = ["http://replica-0:5000", "http://replica-1:5000", "http://replica-2:5000"]
+
+
+def api_status(readiness: bool = True, gpu_enabled: bool = False) -> ApiStatus:
+    return ApiStatus(readiness=readiness, gpu_supported=gpu_enabled, gpu_enabled=gpu_enabled)
+
+
+class TestReplicaSet(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.timer = FakeTimer()
+
+    def replica_set(self, strategy: BalancingStrategy, **kwargs) -> ReplicaSet:
+        return ReplicaSet(REPLICA_URLS, strategy=strategy, timer=self.timer, rng=random.Random(0), **kwargs)
+
+    def test_least_outstanding(self):
+        replica_set = self.replica_set(BalancingStrategy.least_outstanding)
+
+        with replica_set.track(replica_set.replicas[REPLICA_URLS[0]]), replica_set.track(replica_set.replicas[REPLICA_URLS[1]]):
+            self.assertEqual(REPLICA_URLS[2], replica_set.choose().url)
+
+    def test_power_of_two_avoids_loaded_replica(self):
+        replica_set = self.replica_set(BalancingStrategy.power_of_two)
+        replica_set.replicas[REPLICA_URLS[0]].outstanding = 10
+
+        chosen = Counter(replica_set.choose().url for _ in range(300))
+
+        self.assertEqual(0, chosen[REPLICA_URLS[0]])
+        self.assertGreater(chosen[REPLICA_URLS[1]], 100)
+        self.assertGreater(chosen[REPLICA_URLS[2]], 100)
+
+    def test_gpu_weight(self):
+        replica_set = self.replica_set(BalancingStrategy.least_outstanding, gpu_weight=4.0)
+        replica_set.update_status(REPLICA_URLS[0], api_status(gpu_enabled=True))
+
+        replica = replica_set.replicas[REPLICA_URLS[0]]
+        replica.outstanding = 2
+        self.assertEqual(REPLICA_URLS[0], replica_set.choose().url, msg="Expected the GPU replica to take four times the load")
+
+        replica.outstanding = 4
+        self.assertNotEqual(REPLICA_URLS[0], replica_set.choose().url)
+
+    def test_passive_ejection(self):
+        replica_set = self.replica_set(BalancingStrategy.least_outstanding, ejection_threshold=2, ejection_duration=timedelta(seconds=10))
+        replica = replica_set.replicas[REPLICA_URLS[0]]
+        error = httpx.ConnectError("Connection refused")
+
+        replica_set.record(replica, None, error)
+        self.assertIn(replica, replica_set.available())
+
+        replica_set.record(replica, None, error)
+        self.assertNotIn(replica, replica_set.available())
+        self.assertNotIn(REPLICA_URLS[0], {replica_set.choose().url for _ in range(20)})
+
+        self.timer.now += 10
+        self.assertIn(replica, replica_set.available())
+
+    def test_not_ready_replica_is_ejected(self):
+        replica_set = self.replica_set(BalancingStrategy.least_outstanding)
+
+        replica_set.update_status(REPLICA_URLS[0], api_status(readiness=False))
+        replica_set.update_status(REPLICA_URLS[1], None)
+        self.assertEqual([REPLICA_URLS[2]], [replica.url for replica in replica_set.available()])
+
+        replica_set.update_status(REPLICA_URLS[0], api_status(readiness=True))
+        self.assertEqual(2, len(replica_set.available()))
+
+    def test_all_ejected_falls_back_to_all_replicas(self):
+        replica_set = self.replica_set(BalancingStrategy.power_of_two)
+        for url in REPLICA_URLS:
+            replica_set.update_status(url, None)
+
+        self.assertIn(replica_set.choose().url, REPLICA_URLS)
+
+
+class TestBalancedApiClient(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.statuses: Dict[str, ApiStatus] = {
+            "replica-0": api_status(gpu_enabled=True),
+            "replica-1": api_status(readiness=False),
+        }
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "replica-2":
+                raise httpx.ConnectError("Connection refused", request=request)
+            if request.url.path == "/api/status":
+                return httpx.Response(HTTPStatus.OK, json=self.statuses[request.url.host].dict(), request=request)
+            return httpx.Response(HTTPStatus.OK, json={"host": request.url.host, "path": request.url.path}, request=request)
+
+        self.replica_set = ReplicaSet(REPLICA_URLS, strategy=BalancingStrategy.least_outstanding)
+        self.client = ApiClient(
+            backend_url="http://model-api:5000",
+            http_client=Client(transport=httpx.MockTransport(handler)),
+            async_client=AsyncClient(transport=httpx.MockTransport(handler)),
+            replica_set=self.replica_set,
+        )
+
+    async def test_refresh_replicas(self):
+        statuses = await self.client.refresh_replicas_async()
+
+        self.assertIsNone(statuses[REPLICA_URLS[2]])
+        self.assertEqual(4.0, self.replica_set.replicas[REPLICA_URLS[0]].weight)
+        self.assertEqual([REPLICA_URLS[0]], [replica.url for replica in self.replica_set.available()])
+
+        response = await self.client.request_async("GET", "http://model-api:5000/api/inference")
+        self.assertEqual({"host": "replica-0", "path": "/api/inference"}, response.json())
+
+    def test_urls_are_rewritten_to_replica(self):
+        self.replica_set.update_status(REPLICA_URLS[1], None)
+        self.replica_set.update_status(REPLICA_URLS[2], None)
+
+        response = self.client.request("POST", "http://model-api:5000/api/inference", json={})
+        self.assertEqual({"host": "replica-0", "path": "/api/inference"}, response.json())
+        self.assertEqual(0, self.replica_set.replicas[REPLICA_URLS[0]].outstanding)
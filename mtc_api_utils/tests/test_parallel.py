@@ -0,0 +1,150 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import unittest
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Any, Dict
+
+import httpx
+from fastapi import FastAPI, HTTPException, Response
+from httpx import AsyncClient, HTTPStatusError
+
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.backoff import ExponentialBackoff
+from mtc_api_utils.clients.parallel import ParallelRequester, RequestSpec
+
+TEST_BACKOFF = ExponentialBackoff(initial_delay=timedelta(milliseconds=1), jitter=False)
+
+
+class TestParallelRequests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.num_started = 0
+        self.num_flaky_calls = 0
+
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            self.num_started += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            # Later items complete first
+            await asyncio.sleep(0.01 * (10 - item_id))
+            self.in_flight -= 1
+
+            if item_id == 404:
+                raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+            return {"item_id": item_id}
+
+        @app.get("/flaky")
+        async def flaky():
+            self.num_flaky_calls += 1
+            if self.num_flaky_calls < 3:
+                raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+            return Response()
+
+        @app.post("/echo")
+        async def echo(body: Dict[str, Any]):
+            return body
+
+        self.async_client = AsyncClient(app=app, base_url="http://test")
+        self.client = ApiClient(backend_url="http://test", async_client=self.async_client)
+
+    async def asyncTearDown(self) -> None:
+        await self.async_client.aclose()
+
+    async def test_max_concurrency(self):
+        urls = [f"http://test/items/{item_id}" for item_id in range(10)]
+
+        responses = await self.client.parallel_get(urls=urls, max_concurrency=3)
+
+        self.assertEqual(urls, list(responses.keys()))
+        self.assertTrue(all(response.status_code == HTTPStatus.OK for response in responses.values()))
+        self.assertEqual(3, self.max_in_flight)
+
+    async def test_iter_results_as_completed(self):
+        requester = ParallelRequester(client=self.async_client)
+        requests = [RequestSpec(url=f"http://test/items/{item_id}") for item_id in range(5)]
+
+        indices = [result.index async for result in requester.iter_results(requests)]
+        self.assertEqual([4, 3, 2, 1, 0], indices)
+
+    async def test_iter_results_cancels_pending(self):
+        requester = ParallelRequester(client=self.async_client, max_concurrency=2)
+        requests = [RequestSpec(url=f"http://test/items/{item_id}") for item_id in range(10)]
+
+        results = requester.iter_results(requests)
+        first = await results.__anext__()
+        await results.aclose()
+        num_started = self.num_started
+        await asyncio.sleep(0.15)
+
+        self.assertTrue(first.ok)
+        self.assertEqual(num_started, self.num_started, msg="Expected no requests to start after the iteration was stopped")
+        self.assertLess(self.num_started, 10)
+
+    async def test_retries(self):
+        requester = ParallelRequester(client=self.async_client, retries=2, backoff=TEST_BACKOFF)
+
+        result, = (await requester.run([RequestSpec(url="http://test/flaky")])).results
+
+        self.assertTrue(result.ok)
+        self.assertEqual(3, result.attempts)
+
+    async def test_post_is_not_retried(self):
+        transport = httpx.MockTransport(lambda request: httpx.Response(HTTPStatus.SERVICE_UNAVAILABLE))
+        async with AsyncClient(transport=transport) as client:
+            requester = ParallelRequester(client=client, retries=3, backoff=TEST_BACKOFF)
+            result, = (await requester.run([RequestSpec(url="http://test/echo", method="POST", json={})])).results
+
+        self.assertEqual(1, result.attempts)
+
+    async def test_parallel_post(self):
+        bodies = [{"text": f"sentence {index}"} for index in range(5)]
+
+        results = await self.client.parallel_post(url="http://test/echo", bodies=bodies, raise_for_status=True)
+
+        self.assertEqual({}, results.errors)
+        self.assertEqual(bodies, [result.response.json() for result in results.results])
+
+    async def test_per_url_errors(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/timeout":
+                raise httpx.ReadTimeout("Timed out", request=request)
+            if request.url.path == "/missing":
+                return httpx.Response(HTTPStatus.NOT_FOUND, request=request)
+            return httpx.Response(HTTPStatus.OK, request=request)
+
+        async with AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            requester = ParallelRequester(client=client, raise_for_status=True, retries=1, backoff=TEST_BACKOFF)
+            results = await requester.run([RequestSpec(url=f"http://test/{path}") for path in ["ok", "timeout", "missing"]])
+
+        self.assertIsNone(results.responses["http://test/timeout"])
+        self.assertEqual(2, results.results[1].attempts)
+        self.assertIsInstance(results.errors["http://test/timeout"], httpx.ReadTimeout)
+        self.assertIsInstance(results.errors["http://test/missing"], HTTPStatusError)
+        self.assertNotIn("http://test/ok", results.errors)
+
+    async def test_parallel_get_raise_for_status_on_failed_request(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("Connection refused", request=request)
+
+        async with AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api_client = ApiClient(backend_url="http://test", async_client=client)
+
+            responses = await api_client.parallel_get(urls=["http://test/a", "http://test/b"])
+            self.assertEqual({"http://test/a": None, "http://test/b": None}, responses)
+
+            with self.assertRaises(httpx.ConnectError):
+                await api_client.parallel_get(urls=["http://test/a"], raise_for_status=True)
+
+    async def test_parallel_get_raise_for_status(self):
+        with self.assertRaises(HTTPStatusError) as context:
+            await self.client.parallel_get(urls=["http://test/items/1", "http://test/items/404"], raise_for_status=True)
+
+        self.assertEqual(HTTPStatus.NOT_FOUND, context.exception.response.status_code)
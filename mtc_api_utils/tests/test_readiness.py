@@ -0,0 +1,96 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import unittest
+from datetime import timedelta
+
+from mtc_api_utils.readiness import ReadinessState
+
+
+class TestReadinessState(unittest.IsolatedAsyncioTestCase):
+
+    async def test_push_based_state(self):
+        state = ReadinessState()
+        self.assertFalse(await state.is_ready(), msg="Expected a state without probe to start out as not ready")
+
+        state.mark_ready()
+        self.assertTrue(await state.is_ready())
+
+        state.mark_not_ready()
+        self.assertFalse(await state.is_ready())
+
+    async def test_ttl_cache(self):
+        num_calls = 0
+
+        def probe() -> bool:
+            nonlocal num_calls
+            num_calls += 1
+            return True
+
+        state = ReadinessState(probe=probe, ttl=timedelta(seconds=60))
+        for _ in range(10):
+            self.assertTrue(await state.is_ready())
+        self.assertEqual(1, num_calls)
+
+        state.invalidate()
+        self.assertTrue(await state.is_ready())
+        self.assertEqual(2, num_calls)
+
+        uncached_state = ReadinessState(probe=probe)
+        for _ in range(10):
+            await uncached_state.is_ready()
+        self.assertEqual(12, num_calls)
+
+    async def test_pinned_state_skips_probe(self):
+        def probe() -> bool:
+            raise AssertionError("Probe should not be evaluated while the state is pinned")
+
+        state = ReadinessState(probe=probe)
+        state.mark_not_ready()
+        self.assertFalse(await state.is_ready())
+
+        state.mark_ready()
+        self.assertTrue(await state.is_ready())
+
+    async def test_single_flight(self):
+        num_calls = 0
+
+        async def probe() -> bool:
+            nonlocal num_calls
+            num_calls += 1
+            await asyncio.sleep(0.1)
+            return True
+
+        state = ReadinessState(probe=probe)
+        results = await asyncio.gather(*[state.is_ready() for _ in range(20)])
+
+        self.assertTrue(all(results))
+        self.assertEqual(1, num_calls, msg="Expected concurrent callers to share a single probe evaluation")
+
+    async def test_probe_exception(self):
+        async def probe() -> bool:
+            await asyncio.sleep(0.1)
+            raise RuntimeError("Probe failed")
+
+        state = ReadinessState(probe=probe)
+        results = await asyncio.gather(*[state.is_ready() for _ in range(3)], return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    async def test_cancelled_caller_does_not_cancel_followers(self):
+        async def probe() -> bool:
+            await asyncio.sleep(0.1)
+            return True
+
+        state = ReadinessState(probe=probe)
+        first = asyncio.ensure_future(state.is_ready())
+        await asyncio.sleep(0)
+        followers = asyncio.gather(*[state.is_ready() for _ in range(2)])
+        await asyncio.sleep(0)
+
+        first.cancel()
+
+        self.assertEqual([True, True], await followers)
+        with self.assertRaises(asyncio.CancelledError):
+            await first
@@ -0,0 +1,211 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import unittest
+from datetime import timedelta
+from http import HTTPStatus
+from typing import List
+
+import httpx
+from httpx import AsyncClient, Client
+
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.backoff import ExponentialBackoff
+from mtc_api_utils.clients.resilience import (
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    CircuitState,
+    RetryBudget,
+    RetryPolicy,
+)
+from mtc_api_utils.tests.fake_timer import FakeTimer
+
+NO_BACKOFF = ExponentialBackoff(initial_delay=timedelta(0), jitter=False)
+
+
+class FakeBackend:
+    """ Responds with the given status codes in order, repeating the last one. A status code of None raises a ConnectError """
+
+    def __init__(self, status_codes: List[HTTPStatus]):
+        self.status_codes = status_codes
+        self.num_requests = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        status_code = self.status_codes[min(self.num_requests, len(self.status_codes) - 1)]
+        self.num_requests += 1
+
+        if status_code is None:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(status_code, request=request)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.timer = FakeTimer()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=timedelta(seconds=10), timer=self.timer)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(CircuitState.closed, self.breaker.state, msg="Expected a success to reset the failure count")
+
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(CircuitState.open, self.breaker.state)
+
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_request()
+
+    def test_half_open_probe(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+        self.timer.now += 10
+        self.assertEqual(CircuitState.half_open, self.breaker.state)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request(), msg="Expected only one probe while half open")
+
+        self.breaker.record_failure()
+        self.assertEqual(CircuitState.open, self.breaker.state)
+
+        self.timer.now += 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(CircuitState.closed, self.breaker.state)
+
+    def test_registry_shares_breakers_per_backend(self):
+        registry = CircuitBreakerRegistry()
+
+        self.assertIs(registry.breaker("http://model-api:5000/api/a"), registry.breaker("http://model-api:5000/api/b"))
+        self.assertIsNot(registry.breaker("http://model-api:5000"), registry.breaker("http://other-api:5000"))
+
+
+class TestRetryBudget(unittest.TestCase):
+
+    def test_budget(self):
+        timer = FakeTimer()
+        budget = RetryBudget(ratio=0.5, min_retries=1, window=timedelta(seconds=10), timer=timer)
+
+        for _ in range(4):
+            budget.record_request()
+
+        self.assertEqual([True, True, True, False], [budget.try_acquire_retry() for _ in range(4)])
+
+        timer.now += 10
+        self.assertTrue(budget.try_acquire_retry(), msg="Expected retries outside of the window to be forgotten")
+
+
+class TestResilientApiClient(unittest.IsolatedAsyncioTestCase):
+
+    def api_client(self, backend: FakeBackend, **kwargs) -> ApiClient:
+        return ApiClient(
+            backend_url="http://test",
+            http_client=Client(transport=httpx.MockTransport(backend)),
+            async_client=AsyncClient(transport=httpx.MockTransport(backend)),
+            **kwargs,
+        )
+
+    def test_retries_idempotent_requests(self):
+        backend = FakeBackend([None, HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.OK])
+        client = self.api_client(backend, retry_policy=RetryPolicy(max_retries=2, backoff=NO_BACKOFF))
+
+        response = client.request("GET", "http://test/items")
+
+        self.assertEqual(HTTPStatus.OK, response.status_code)
+        self.assertEqual(3, backend.num_requests)
+
+    def test_does_not_retry_post(self):
+        backend = FakeBackend([None, HTTPStatus.OK])
+        client = self.api_client(backend, retry_policy=RetryPolicy(backoff=NO_BACKOFF))
+
+        with self.assertRaises(httpx.ConnectError):
+            client.request("POST", "http://test/inference", json={})
+        self.assertEqual(1, backend.num_requests)
+
+        response = client.request("POST", "http://test/inference", json={}, idempotent=True)
+        self.assertEqual(HTTPStatus.OK, response.status_code)
+
+    def test_retry_budget(self):
+        backend = FakeBackend([HTTPStatus.SERVICE_UNAVAILABLE])
+        policy = RetryPolicy(max_retries=3, backoff=NO_BACKOFF, budget=RetryBudget(ratio=0, min_retries=2))
+        client = self.api_client(backend, retry_policy=policy)
+
+        for _ in range(3):
+            response = client.request("GET", "http://test/items")
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, response.status_code)
+
+        self.assertEqual(5, backend.num_requests, msg="Expected only two retries in total")
+
+    async def test_circuit_breaker_fails_fast(self):
+        timer = FakeTimer()
+        backend = FakeBackend([None, None, HTTPStatus.OK])
+        breakers = CircuitBreakerRegistry(lambda: CircuitBreaker(failure_threshold=2, reset_timeout=timedelta(seconds=10), timer=timer))
+        client = self.api_client(backend, circuit_breakers=breakers)
+
+        for _ in range(2):
+            with self.assertRaises(httpx.ConnectError):
+                await client.request_async("GET", "http://test/items")
+
+        with self.assertRaises(CircuitOpenError):
+            await client.request_async("GET", "http://test/items")
+        self.assertEqual(2, backend.num_requests, msg="Expected no request to be sent while the circuit is open")
+
+        _, is_live = await client.get_liveness_async()
+        self.assertTrue(is_live, msg="Expected probes to bypass the circuit breaker")
+
+        timer.now += 10
+        response = await client.request_async("GET", "http://test/items")
+        self.assertEqual(HTTPStatus.OK, response.status_code)
+        self.assertEqual(CircuitState.closed, client.circuit_breaker.state)
+
+    async def test_open_circuit_is_not_retried(self):
+        backend = FakeBackend([None])
+        breakers = CircuitBreakerRegistry(lambda: CircuitBreaker(failure_threshold=1))
+        client = self.api_client(backend, retry_policy=RetryPolicy(max_retries=5, backoff=NO_BACKOFF), circuit_breakers=breakers)
+
+        with self.assertRaises(CircuitOpenError):
+            await client.request_async("GET", "http://test/items")
+        self.assertEqual(1, backend.num_requests)
+
+    async def test_parallel_requests(self):
+        backend = FakeBackend([None, HTTPStatus.OK])
+        breakers = CircuitBreakerRegistry(lambda: CircuitBreaker(failure_threshold=2))
+        client = self.api_client(backend, retry_policy=RetryPolicy(max_retries=1, backoff=NO_BACKOFF), circuit_breakers=breakers)
+
+        responses = await client.parallel_get(urls=["http://test/items"])
+        self.assertEqual(HTTPStatus.OK, responses["http://test/items"].status_code, msg="Expected parallel requests to be retried using retry_policy")
+
+        client.circuit_breaker.record_failure()
+        client.circuit_breaker.record_failure()
+        results = await client.parallel_post(url="http://test/inference", bodies=[{}, {}])
+
+        self.assertTrue(all(isinstance(result.error, CircuitOpenError) for result in results.results))
+        self.assertEqual(2, backend.num_requests, msg="Expected no request to be sent while the circuit is open")
+
+    async def test_cancellation_is_not_a_failure(self):
+        timer = FakeTimer()
+        breakers = CircuitBreakerRegistry(lambda: CircuitBreaker(failure_threshold=2, reset_timeout=timedelta(seconds=10), timer=timer))
+
+        async def slow_backend(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(1)
+            return httpx.Response(HTTPStatus.OK, request=request)
+
+        client = ApiClient(backend_url="http://test", async_client=AsyncClient(transport=httpx.MockTransport(slow_backend)), circuit_breakers=breakers)
+
+        for _ in range(3):
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.request_async("GET", "http://test/items"), timeout=0.01)
+        self.assertEqual(CircuitState.closed, client.circuit_breaker.state, msg="Expected timeouts of the caller not to open the circuit")
+
+        client.circuit_breaker.record_failure()
+        client.circuit_breaker.record_failure()
+        timer.now += 10
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.request_async("GET", "http://test/items"), timeout=0.01)
+        self.assertTrue(client.circuit_breaker.allow_request(), msg="Expected a cancelled probe to release its slot")
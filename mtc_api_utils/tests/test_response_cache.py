@@ -0,0 +1,159 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import threading
+import unittest
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Dict, List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Header
+from httpx import AsyncClient
+
+from mtc_api_utils.api_types import ApiType, FirebaseUser
+from mtc_api_utils.response_cache import ResponseCache
+from mtc_api_utils.tests.fake_timer import FakeTimer
+
+
+class EmbeddingRequest(ApiType):
+    text: str
+    options: Dict[str, int] = {}
+
+
+class EmbeddingResponse(ApiType):
+    embedding: List[float]
+
+
+def get_user(x_user: str = Header(default="default@mtc.ch")) -> FirebaseUser:
+    return FirebaseUser(email=x_user, roles=[])
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.timer = FakeTimer()
+        self.cache = ResponseCache(ttl=timedelta(minutes=1), timer=self.timer)
+        self.num_calls: Dict[str, int] = {}
+        self.threads: List[threading.Thread] = []
+
+        app = FastAPI()
+
+        @app.post("/api/embedding")
+        @self.cache.cached()
+        async def embedding(body: EmbeddingRequest) -> EmbeddingResponse:
+            self.count("embedding")
+            await asyncio.sleep(0.05)
+
+            if body.text == "fail":
+                raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
+            return EmbeddingResponse(embedding=[len(body.text), self.num_calls["embedding"]])
+
+        @app.get("/api/classify")
+        @self.cache.cached()
+        def classify(text: str) -> Dict[str, str]:
+            self.count("classify")
+            self.threads.append(threading.current_thread())
+            return {"label": text.upper()}
+
+        @app.post("/api/user-embedding")
+        @self.cache.cached(per_user=True)
+        async def user_embedding(body: EmbeddingRequest, user: FirebaseUser = Depends(get_user)) -> Dict[str, str]:
+            self.count("user_embedding")
+            return {"user": user.email, "text": body.text}
+
+        @app.get("/api/lookup")
+        @self.cache.cached()
+        async def lookup(text: str) -> Optional[str]:
+            self.count("lookup")
+            return None
+
+        self.client = AsyncClient(app=app, base_url="http://test")
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+
+    def count(self, name: str) -> None:
+        self.num_calls[name] = self.num_calls.get(name, 0) + 1
+
+    async def test_canonical_body(self):
+        first = await self.client.post("/api/embedding", content='{"text": "hello", "options": {"a": 1, "b": 2}}')
+        second = await self.client.post("/api/embedding", content='{"options":{"b":2,"a":1},"text":"hello"}')
+        other = await self.client.post("/api/embedding", json={"text": "world"})
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual({"embedding": [5.0, 1.0]}, first.json())
+        self.assertEqual(2, self.num_calls["embedding"])
+        self.assertEqual(HTTPStatus.OK, other.status_code)
+
+        metrics = self.cache.metrics
+        self.assertEqual((1, 2, 2), (metrics.hits, metrics.misses, metrics.num_entries))
+        self.assertGreater(metrics.num_bytes, 0)
+
+    async def test_ttl(self):
+        await self.client.post("/api/embedding", json={"text": "hello"})
+        self.timer.now += 61
+        response = await self.client.post("/api/embedding", json={"text": "hello"})
+
+        self.assertEqual({"embedding": [5.0, 2.0]}, response.json())
+
+    async def test_coalesces_concurrent_requests(self):
+        responses = await asyncio.gather(*[self.client.post("/api/embedding", json={"text": "hello"}) for _ in range(5)])
+
+        self.assertEqual(1, self.num_calls["embedding"])
+        self.assertTrue(all(response.json() == {"embedding": [5.0, 1.0]} for response in responses))
+        self.assertEqual(4, self.cache.metrics.coalesced)
+
+    async def test_errors_are_not_cached(self):
+        responses = await asyncio.gather(*[self.client.post("/api/embedding", json={"text": "fail"}) for _ in range(2)])
+        response = await self.client.post("/api/embedding", json={"text": "fail"})
+
+        self.assertTrue(all(r.status_code == HTTPStatus.UNPROCESSABLE_ENTITY for r in responses + [response]))
+        self.assertEqual(2, self.num_calls["embedding"], msg="Expected coalesced requests to share the error, but later requests to run again")
+        self.assertEqual(0, self.cache.metrics.num_entries)
+
+    async def test_sync_endpoint_runs_in_threadpool(self):
+        for text in ["a", "a", "b"]:
+            response = await self.client.get("/api/classify", params={"text": text})
+            self.assertEqual({"label": text.upper()}, response.json())
+
+        self.assertEqual(2, self.num_calls["classify"])
+        self.assertNotIn(threading.main_thread(), self.threads)
+
+    async def test_none_is_cached(self):
+        for _ in range(2):
+            response = await self.client.get("/api/lookup", params={"text": "unknown"})
+            self.assertIsNone(response.json())
+
+        self.assertEqual(1, self.num_calls["lookup"])
+        self.assertEqual(1, self.cache.metrics.hits)
+
+    async def test_per_user(self):
+        for user in ["a@mtc.ch", "b@mtc.ch", "a@mtc.ch"]:
+            response = await self.client.post("/api/user-embedding", json={"text": "hello"}, headers={"x-user": user})
+            self.assertEqual(user, response.json()["user"])
+
+        self.assertEqual(2, self.num_calls["user_embedding"])
+
+    def test_per_user_requires_user_parameter(self):
+        with self.assertRaises(ValueError):
+            @self.cache.cached(per_user=True)
+            def endpoint(body: EmbeddingRequest) -> EmbeddingResponse:
+                pass
+
+    async def test_max_bytes(self):
+        cache = ResponseCache(max_bytes=100, timer=self.timer)
+        app = FastAPI()
+
+        @app.get("/api/text")
+        @cache.cached()
+        async def text(length: int) -> Dict[str, str]:
+            self.count("text")
+            return {"text": "x" * length}
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            for length in [40, 200, 200, 40]:
+                await client.get("/api/text", params={"length": length})
+
+        self.assertEqual(3, self.num_calls["text"], msg="Expected responses larger than max_bytes not to be cached")
+        self.assertEqual(1, cache.metrics.num_entries)
@@ -0,0 +1,92 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from http import HTTPStatus
+
+from fastapi import FastAPI, HTTPException, Response
+from httpx import AsyncClient
+
+from mtc_api_utils.clients.api_client import ApiClient
+from mtc_api_utils.clients.backoff import ExponentialBackoff
+from mtc_api_utils.clients.service_group import ServiceGroup, ReadinessPolicy
+
+TEST_BACKOFF = ExponentialBackoff(initial_delay=timedelta(milliseconds=10), max_delay=timedelta(milliseconds=50), jitter=False)
+
+
+class FakeService:
+    """ An in-process service, which becomes ready after ready_after seconds. If ready_after is None, it never becomes ready """
+
+    def __init__(self, ready_after: float = None, probe_delay: float = 0.0):
+        self.ready_at = time.monotonic() + ready_after if ready_after is not None else None
+        self.probe_delay = probe_delay
+
+        app = FastAPI()
+
+        @app.get("/api/readiness")
+        async def readiness():
+            await asyncio.sleep(self.probe_delay)
+            if self.ready_at is None or time.monotonic() < self.ready_at:
+                raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+            return Response()
+
+        self.async_client = AsyncClient(app=app)
+
+    def api_client(self, name: str) -> ApiClient:
+        return ApiClient(backend_url=f"http://{name}", async_client=self.async_client)
+
+
+class TestServiceGroup(unittest.IsolatedAsyncioTestCase):
+
+    def create_group(self, **services: FakeService) -> ServiceGroup:
+        return ServiceGroup({name: service.api_client(name) for name, service in services.items()})
+
+    async def test_probe_all(self):
+        group = self.create_group(ready=FakeService(ready_after=0, probe_delay=0.05), not_ready=FakeService())
+
+        status = await group.probe_all()
+
+        self.assertTrue(status.services["ready"].is_ready)
+        self.assertTrue(status.services["not_ready"].is_live)
+        self.assertFalse(status.services["not_ready"].is_ready)
+        self.assertGreaterEqual(status.services["ready"].latency_ms, 50)
+        self.assertEqual(1, status.num_ready)
+        self.assertEqual(["not_ready"], status.not_ready)
+
+    async def test_wait_for_all_concurrently(self):
+        group = self.create_group(**{f"service-{i}": FakeService(ready_after=0.3) for i in range(10)})
+
+        start = time.monotonic()
+        status = await group.wait_until_ready(backoff=TEST_BACKOFF, timeout=timedelta(seconds=5))
+
+        self.assertEqual(10, status.num_ready)
+        self.assertLess(time.monotonic() - start, 1, msg="Expected waiting to take as long as the slowest service, not the sum of all services")
+
+    async def test_wait_for_any(self):
+        group = self.create_group(fast=FakeService(ready_after=0.1), never=FakeService())
+
+        status = await group.wait_until_ready(policy=ReadinessPolicy.any, backoff=TEST_BACKOFF, timeout=timedelta(seconds=5))
+
+        self.assertEqual(["never"], status.not_ready)
+
+    async def test_wait_for_at_least(self):
+        group = self.create_group(a=FakeService(ready_after=0), b=FakeService(ready_after=0.1), c=FakeService())
+
+        status = await group.wait_until_ready(policy=ReadinessPolicy.at_least, min_ready=2, backoff=TEST_BACKOFF, timeout=timedelta(seconds=5))
+        self.assertEqual(2, status.num_ready)
+
+        with self.assertRaises(ValueError):
+            await group.wait_until_ready(policy=ReadinessPolicy.at_least, min_ready=4)
+
+    async def test_timeout(self):
+        group = self.create_group(ready=FakeService(ready_after=0), never=FakeService())
+
+        with self.assertRaises(HTTPException) as context:
+            await group.wait_until_ready(backoff=TEST_BACKOFF, timeout=timedelta(milliseconds=200))
+
+        self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, context.exception.status_code)
+        self.assertIn("never", context.exception.detail)
+        self.assertGreater(group.statuses["never"].num_probes, 1)
@@ -0,0 +1,91 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import asyncio
+import os
+import unittest
+from array import array
+from typing import Mapping, Any, Tuple
+
+from mtc_api_utils.shared_model import SharedWeights, SharedWeightsModel
+
+NUM_WEIGHTS = 1000
+
+
+class LinearModel(SharedWeightsModel):
+    weights = None
+    bias = None
+
+    def init_model(self):
+        self.weights = array("d", range(NUM_WEIGHTS))
+        self.bias = b"\x01"
+
+    def export_weights(self) -> Mapping[str, Any]:
+        return {"weights": self.weights, "bias": self.bias}
+
+    def load_weights(self, weights: Mapping[str, Any]) -> None:
+        self.weights = weights["weights"]
+        self.bias = weights["bias"]
+
+    def inference(self, factor: float) -> Tuple[int, float]:
+        return os.getpid(), factor * sum(self.weights) + self.bias[0]
+
+
+class TestSharedWeights(unittest.TestCase):
+
+    def test_create_and_attach(self):
+        weights = {
+            "floats": array("d", [0.5, 1.5, 2.5]),
+            "ints": array("i", [1, 2, 3, 4, 5]),
+            "bytes": b"abc",
+        }
+
+        shared = SharedWeights.create(weights)
+        try:
+            attached = SharedWeights.attach(shared.handle)
+
+            self.assertEqual(set(weights.keys()), set(attached.keys()))
+            self.assertEqual([0.5, 1.5, 2.5], attached["floats"].tolist())
+            self.assertEqual([1, 2, 3, 4, 5], attached["ints"].tolist())
+            self.assertEqual(b"abc", attached["bytes"].tobytes())
+
+            # Both mappings are backed by the same memory
+            shared["ints"][0] = 42
+            self.assertEqual(42, attached["ints"][0])
+
+            attached.close()
+        finally:
+            shared.close()
+
+
+class TestSharedWeightsModel(unittest.IsolatedAsyncioTestCase):
+
+    async def test_process_workers(self):
+        model = LinearModel()
+        model.init_thread.join()
+
+        model.start_workers(num_workers=2)
+        try:
+            self.assertIsInstance(model.weights, memoryview, msg="Expected the model to drop its private copy of the weights")
+
+            expected = 2 * sum(range(NUM_WEIGHTS)) + 1
+            results = await asyncio.gather(*[model.run_inference(2) for _ in range(8)])
+
+            for pid, result in results:
+                self.assertNotEqual(os.getpid(), pid, msg="Expected inference to run in a worker process")
+                self.assertEqual(expected, result)
+
+            # Workers read the weights from shared memory rather than from a copy
+            model.shared_weights["weights"][0] = 1000
+            _, result = await model.run_inference(1)
+            self.assertEqual(sum(range(NUM_WEIGHTS)) + 1000 + 1, result)
+
+            batcher = model.enable_batching(max_batch_size=4, max_wait_ms=5)
+            results = await asyncio.gather(*[batcher.submit(1) for _ in range(4)])
+            self.assertTrue(all(pid != os.getpid() for pid, _ in results))
+
+        finally:
+            model.stop_workers()
+
+        _, result = await model.run_inference(1)
+        self.assertEqual(sum(range(NUM_WEIGHTS)) + 1000 + 1, result, msg="Expected the model to keep a copy of the shared weights")
@@ -0,0 +1,95 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+import unittest
+from datetime import timedelta
+
+from mtc_api_utils.tests.fake_timer import FakeTimer
+from mtc_api_utils.ttl_cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.timer = FakeTimer()
+
+    def test_lru_eviction(self):
+        cache = TTLCache(max_entries=2, timer=self.timer)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        self.assertEqual(1, cache.get("a"))  # Marks "a" as recently used
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"), msg="Expected the least recently used entry to be evicted")
+        self.assertEqual(1, cache.get("a"))
+        self.assertEqual(3, cache.get("c"))
+        self.assertEqual(2, len(cache))
+
+    def test_ttl(self):
+        cache = TTLCache(ttl=timedelta(seconds=10), timer=self.timer)
+        cache.set("default", 1)
+        cache.set("short", 2, ttl=timedelta(seconds=5))
+        cache.set("long", 3, ttl=timedelta(seconds=60))
+
+        self.timer.now = 6
+        self.assertIsNone(cache.get("short"))
+        self.assertEqual(1, cache.get("default"))
+        self.assertEqual(3, cache.get("long"))
+
+        self.timer.now = 10
+        self.assertIsNone(cache.get("default"))
+        self.assertIsNone(cache.get("long"), msg="Expected the cache's ttl to cap the ttl of individual entries")
+
+    def test_non_positive_ttl(self):
+        cache = TTLCache(timer=self.timer)
+        cache.set("expired", 1, ttl=timedelta(seconds=-1))
+
+        self.assertNotIn("expired", cache)
+        self.assertEqual(0, len(cache))
+
+    def test_hit_miss_counters(self):
+        cache = TTLCache(timer=self.timer)
+        cache.set("a", 1)
+
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_default(self):
+        cache = TTLCache(timer=self.timer)
+        cache.set("none", None)
+        missing = object()
+
+        self.assertIsNone(cache.get("none", missing))
+        self.assertIs(missing, cache.get("other", missing))
+
+    def test_pop_and_clear(self):
+        cache = TTLCache(timer=self.timer)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        self.assertEqual(1, cache.pop("a"))
+        self.assertIsNone(cache.pop("a"))
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+    def test_max_bytes(self):
+        cache = TTLCache(timer=self.timer, max_bytes=10, size_fn=len)
+        cache.set("a", b"1234")
+        cache.set("b", b"1234")
+        cache.get("a")
+
+        cache.set("c", b"1234")
+        self.assertEqual(["a", "c"], [key for key in ["a", "b", "c"] if key in cache], msg="Expected the least recently used entry to be evicted")
+        self.assertEqual(8, cache.num_bytes)
+
+        cache.set("d", b"12345678901")
+        self.assertNotIn("d", cache, msg="Expected values larger than max_bytes not to be stored")
+
+        cache.set("a", b"1")
+        self.assertEqual(5, cache.num_bytes)
@@ -0,0 +1,118 @@
+#  SPDX-License-Identifier: Apache-2.0
+#  © 2023 ETH Zurich and other contributors, see AUTHORS.txt for details
+
+from __future__ import annotations
+
+import sys
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from threading import Lock
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar, Union
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+D = TypeVar("D")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    A thread safe cache holding at most max_entries entries, which evicts the least recently used entry once it is full. Entries expire after ttl, or after
+    the shorter ttl passed along with an individual entry, e.g. the remaining lifetime of an access token.
+
+    If max_bytes is set, least recently used entries are also evicted while the total size of all entries, as computed by size_fn, exceeds max_bytes. Values
+    larger than max_bytes are not stored.
+
+    Example usage:
+        cache = TTLCache(max_entries=1024, ttl=timedelta(minutes=5))
+        cache.set(key, value, ttl=timedelta(seconds=token_expires_in))
+
+        value = cache.get(key)  # None once the entry has expired or has been evicted
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 1024,
+            ttl: Optional[timedelta] = None,
+            timer: Callable[[], float] = time.monotonic,
+            max_bytes: Optional[int] = None,
+            size_fn: Callable[[V], int] = sys.getsizeof,
+    ):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._timer = timer
+        self._size_fn = size_fn
+        self._entries: OrderedDict[K, Tuple[V, Optional[float], int]] = OrderedDict()
+        self._lock = Lock()
+
+    def _remove(self, key: K) -> Optional[Tuple[V, Optional[float], int]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.num_bytes -= entry[2]
+
+        return entry
+
+    def get(self, key: K, default: D = None) -> Union[V, D]:
+        """ Returns the value stored for key and marks it as recently used, or default if there is no such entry or it has expired """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[1] is not None and entry[1] <= self._timer():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: K, value: V, ttl: Optional[timedelta] = None) -> None:
+        """ Stores value for the shorter of ttl and the cache's ttl. Values with a non-positive lifetime are not stored """
+        ttls = [t.total_seconds() for t in (self.ttl, ttl) if t is not None]
+        ttl_seconds = min(ttls) if ttls else None
+
+        size = self._size_fn(value) if self.max_bytes is not None else 0
+
+        with self._lock:
+            self._remove(key)
+
+            if ttl_seconds is not None and ttl_seconds <= 0:
+                return
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, self._timer() + ttl_seconds if ttl_seconds is not None else None, size)
+            self.num_bytes += size
+
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.num_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._remove(key)
+
+        return entry[0] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.num_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > self._timer())